@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+#
+# Benchmarks and synthetic captures for nfsiostat_plotter_v4.py
+#
+# Generates synthetic nfsiostat output and times the hot paths of
+# nfsiostat_plotter_v4.py on it: parsing, timestamp conversion, the
+# summary statistics, anomaly detection, each kind of figure (per file
+# system and combined) and the HTML report. Each size runs in a fresh
+# Python process so its peak RSS is its own.
+#
+# [laytonjb ~]$ ./nfsiostat_bench.py
+#
+# runs the default sizes (mounts x samples). Other options:
+#
+#   --sizes 1x3600,10x3600    sizes to run (mounts x samples)
+#   --clock ampm|24h          time stamps as "04/10/2014 01:02:03 PM"
+#                             (en_US locale, default) or "04/10/14 13:02:03"
+#                             (C locale)
+#   --json FILE               also write the results to FILE
+#   --compare FILE            compare with the results of an earlier run
+#                             and flag stages that got slower
+#   --threshold PCT           slow-down flagged by --compare (default 20)
+#   --sweep ROWS              only time the parser with the same number of
+#                             data rows for 1 to 1000 mounts (the rows/s
+#                             should not depend on the number of mounts)
+#   --generate FILE           write a synthetic capture to FILE (use with
+#                             --mounts, --samples and --clock) and stop
+#
+
+from __future__ import print_function, division
+
+import sys
+import os
+import time
+import random
+import json
+import shutil
+import tempfile
+import subprocess
+import argparse
+try:
+   from cStringIO import StringIO
+except ImportError:
+   from io import StringIO
+
+import nfsiostat_plotter_v4 as nfsiostat
+
+
+# Sizes (mounts, samples) run by default
+default_sizes = [(1, 3600), (10, 3600), (100, 1000), (10, 86400)];
+
+# Figure kinds of the report, by image name (without the loop number)
+figure_kinds = ["app_read_write", "app_read_write_dir", "app_read_write_svr", "app_ops"];
+
+
+
+def synthetic_capture(nmounts, nsamples, clock="ampm"):
+   #
+   # Returns nfsiostat output (a string) with nsamples timestamps, each
+   # with one data row for every one of the nmounts file systems
+   #
+   # nmounts = number of NFS mounts
+   # nsamples = number of timestamps (1 second apart)
+   # clock = "ampm" for "MM/DD/YYYY HH:MM:SS AM" time stamps (en_US
+   #         locale) or "24h" for "MM/DD/YY HH:MM:SS" (C locale)
+   #
+   out = [];
+   if (clock == "24h"):
+      date = "04/10/14";
+   else:
+      date = "04/10/2014";
+   # end if
+   out.append("Linux 3.10.0-123.el7.x86_64 (benchhost) " + date + " _x86_64_ (8 CPU)\n");
+   out.append("\n");
+   header = "Filesystem:           rMB_nor/s    wMB_nor/s    rMB_dir/s    wMB_dir/s    rMB_svr/s    wMB_svr/s     ops/s    rops/s    wops/s\n";
+   for i in range(0, nsamples):
+      hour = (i // 3600) % 24;
+      if (clock == "24h"):
+         out.append("%s %02d:%02d:%02d\n" % (date, hour, (i // 60) % 60, i % 60));
+      else:
+         meridian = "AM";
+         if (hour >= 12):
+            meridian = "PM";
+         # end if
+         out.append("%s %02d:%02d:%02d %s\n" % (date, (hour + 11) % 12 + 1, (i // 60) % 60,
+                                                i % 60, meridian));
+      # end if
+      out.append(header);
+      for k in range(0, nmounts):
+         out.append("server%d:/export/home%d\n" % (k, k));
+         values = ["%.2f" % (random.random() * 100.0) for j in range(0, 9)];
+         out.append("                          " + "  ".join(values) + "\n");
+      # end for
+      out.append("\n");
+   # end for
+   return "".join(out);
+
+# end def
+
+
+
+def bench_parser(nmounts, nrows):
+   #
+   # Times nfsiostat.read_nfsiostat() on a synthetic capture of about nrows
+   # data rows spread over nmounts file systems. Returns (rows, seconds).
+   #
+   nsamples = max(1, nrows // nmounts);
+   text = synthetic_capture(nmounts, nsamples);
+   start = time.time();
+   capture = nfsiostat.read_nfsiostat(StringIO(text));
+   elapsed = time.time() - start;
+   if (len(capture["fs_data_list"]) != nmounts):
+      print("Error: expected ",nmounts," file systems, found ",len(capture["fs_data_list"]));
+      sys.exit(1);
+   # end if
+   return (capture["rows"], elapsed);
+
+# end def
+
+
+
+def bench_case(nmounts, nsamples, clock):
+   #
+   # Runs every stage on one synthetic capture and returns the list of
+   # results, one dictionary per stage:
+   #   stage = name of the stage
+   #   seconds = time of the stage
+   #   count, unit = amount of work (e.g. 3600 "rows"), for the throughput
+   #   rss = peak RSS of the process after the stage (MB)
+   #
+   random.seed(0);
+   text = synthetic_capture(nmounts, nsamples, clock);
+   results = [];
+
+   def record(stage, start, count, unit):
+      results.append( {"stage": stage, "seconds": time.time() - start, "count": count,
+                       "unit": unit, "rss": nfsiostat.peak_rss_mb()} );
+   # end def
+
+   start = time.time();
+   capture = nfsiostat.read_nfsiostat(StringIO(text));
+   record("parse", start, capture["rows"], "rows");
+
+   # the same capture with the row by row tokenizer
+   tokenizer = nfsiostat.parse_tokenizer;
+   nfsiostat.parse_tokenizer = "python";
+   start = time.time();
+   nfsiostat.read_nfsiostat(StringIO(text));
+   record("parse python", start, capture["rows"], "rows");
+   nfsiostat.parse_tokenizer = tokenizer;
+   del text;
+
+   start = time.time();
+   nfsiostat.timestamp_cache.clear();
+   nfsiostat.capture_timestamps(capture);
+   record("timestamps", start, len(capture["timestamps"]), "stamps");
+
+   x_seconds = capture["timestamps"] - capture["timestamps"][0];
+   start = time.time();
+   summary = nfsiostat.summarize_capture(capture);
+   nfsiostat.summary_html(summary);
+   record("summary", start, capture["rows"], "rows");
+
+   start = time.time();
+   anomalies = nfsiostat.detect_anomalies(capture, x_seconds);
+   nfsiostat.anomaly_html(anomalies);
+   record("anomalies", start, capture["rows"], "rows");
+
+   # Figures: the per file system figures of the first mount, then the
+   # combined figures of all mounts (heatmaps with more than
+   # combined_max_lines mounts), each kind timed on its own
+   times = {};
+   def figure_time(filename, seconds):
+      times[os.path.basename(filename).rstrip("0123456789")] = seconds;
+   # end def
+   nfsiostat.figure_timing_hook = figure_time;
+   dirname = tempfile.mkdtemp(prefix="nfsiostat_bench");
+   try:
+      first = dict(capture);
+      first["fs_data_list"] = capture["fs_data_list"][0:1];
+      for (combined_plots, label, nlines) in [(0, "figure", 1), (1, "combined", nmounts)]:
+         times.clear();
+         shutil.rmtree(dirname);
+         os.makedirs(dirname);
+         sample = [first, capture][combined_plots];
+         start = time.time();
+         nfsiostat.render_report("bench", sample, x_seconds, None, combined_plots, dirname, 1,
+                                 anomalies=anomalies);
+         total = time.time() - start;
+         for kind in figure_kinds:
+            results.append( {"stage": label + " " + kind, "seconds": times.get(kind, 0.0),
+                             "count": nsamples * nlines, "unit": "points",
+                             "rss": nfsiostat.peak_rss_mb()} );
+         # end for
+
+         # HTML: the same report again, now with every figure reused
+         # from dirname/sections, so only the report itself is written
+         start = time.time();
+         nfsiostat.render_report("bench", sample, x_seconds, None, combined_plots, dirname, 1,
+                                 anomalies=anomalies);
+         record(label + " html", start, os.path.getsize(os.path.join(dirname, "report.html")),
+                "bytes");
+         results.append( {"stage": label + " report", "seconds": total, "count": len(figure_kinds),
+                          "unit": "figures", "rss": nfsiostat.peak_rss_mb()} );
+      # end for
+   finally:
+      nfsiostat.figure_timing_hook = None;
+      shutil.rmtree(dirname, True);
+   # end try
+   return results;
+
+# end def
+
+
+
+def run_case(nmounts, nsamples, clock):
+   #
+   # Runs bench_case() in a new Python process (so the peak RSS is that of
+   # the case alone) and returns its results
+   #
+   args = [sys.executable, os.path.abspath(__file__), "--case",
+           "%dx%d" % (nmounts, nsamples), "--clock", clock];
+   output = subprocess.check_output(args);
+   return json.loads(output.decode("utf-8").strip().split("\n")[-1]);
+
+# end def
+
+
+
+def parse_sizes(text):
+   #
+   # Returns the list of (mounts, samples) of "MxS,MxS,..."
+   #
+   sizes = [];
+   for item in text.split(","):
+      (nmounts, nsamples) = item.lower().split("x");
+      sizes.append( (int(nmounts), int(nsamples)) );
+   # end for
+   return sizes;
+
+# end def
+
+
+
+def print_results(size, results, baseline, threshold):
+   #
+   # Prints the results of one size, compared with baseline (dictionary
+   # of stage -> seconds of an earlier run, or None). Returns the number
+   # of stages more than threshold percent slower than the baseline.
+   #
+   nslower = 0;
+   print(" ");
+   print("%d mounts x %d samples" % size);
+   print("   %-32s %9s %14s %12s %10s" % ("stage", "seconds", "throughput", "", "peak RSS"));
+   for result in results:
+      rate = result["count"] / max(result["seconds"], 1e-9);
+      line = "   %-32s %9.3f %14.0f %12s %8.1f MB" % (result["stage"], result["seconds"], rate,
+                                                     result["unit"] + "/s", result["rss"]);
+      if ( (baseline is not None) and (result["stage"] in baseline) ):
+         before = baseline[result["stage"]];
+         change = 100.0 * (result["seconds"] - before) / max(before, 1e-9);
+         line = line + "  %+6.0f%%" % change;
+         if ( (change > threshold) and (result["seconds"] - before > 0.01) ):
+            line = line + "  SLOWER";
+            nslower = nslower + 1;
+         # end if
+      # end if
+      print(line);
+   # end for
+   return nslower;
+
+# end def
+
+
+
+if __name__ == '__main__':
+   parser = argparse.ArgumentParser(description="Benchmarks of nfsiostat_plotter_v4.py");
+   parser.add_argument("--sizes", default=",".join(["%dx%d" % size for size in default_sizes]),
+                       help="sizes to run, mounts x samples (default %(default)s)");
+   parser.add_argument("--clock", choices=["ampm", "24h"], default="ampm",
+                       help="time stamp format of the synthetic captures");
+   parser.add_argument("--json", default="", help="write the results to this file");
+   parser.add_argument("--compare", default="",
+                       help="results (--json) of an earlier run to compare with");
+   parser.add_argument("--threshold", type=float, default=20.0,
+                       help="percent slow-down flagged by --compare (default 20)");
+   parser.add_argument("--sweep", type=int, default=0, metavar="ROWS",
+                       help="only time the parser for 1 to 1000 mounts with ROWS data rows");
+   parser.add_argument("--generate", default="", metavar="FILE",
+                       help="write a synthetic capture to FILE and stop");
+   parser.add_argument("--mounts", type=int, default=4, help="mounts of --generate");
+   parser.add_argument("--samples", type=int, default=3600, help="samples of --generate");
+   parser.add_argument("--case", default="", help=argparse.SUPPRESS);
+   options = parser.parse_args();
+
+   if (len(options.generate) > 0):
+      random.seed(0);
+      output_file = open(options.generate, 'w');
+      output_file.write(synthetic_capture(options.mounts, options.samples, options.clock));
+      output_file.close();
+      sys.exit();
+   # end if
+
+   if (len(options.case) > 0):
+      # One size, in the process started by run_case()
+      (nmounts, nsamples) = parse_sizes(options.case)[0];
+      print(json.dumps(bench_case(nmounts, nsamples, options.clock)));
+      sys.exit();
+   # end if
+
+   if (options.sweep > 0):
+      random.seed(0);
+      print("%8s %10s %10s %12s" % ("mounts", "rows", "seconds", "rows/s"));
+      for nmounts in [1, 10, 100, 1000]:
+         (rows, elapsed) = bench_parser(nmounts, options.sweep);
+         print("%8d %10d %10.3f %12.0f" % (nmounts, rows, elapsed, rows / max(elapsed, 1e-9)));
+      # end for
+      print("peak RSS %.1f MB" % nfsiostat.peak_rss_mb());
+      sys.exit();
+   # end if
+
+   baselines = {};
+   if (len(options.compare) > 0):
+      compare_file = open(options.compare, 'r');
+      for run in json.load(compare_file)["runs"]:
+         baselines[(run["mounts"], run["samples"])] = dict([(result["stage"], result["seconds"])
+                                                            for result in run["results"]]);
+      # end for
+      compare_file.close();
+   # end if
+
+   print("nfsiostat_plotter benchmark (%s time stamps)" % options.clock);
+   runs = [];
+   nslower = 0;
+   for size in parse_sizes(options.sizes):
+      results = run_case(size[0], size[1], options.clock);
+      runs.append( {"mounts": size[0], "samples": size[1], "results": results} );
+      nslower = nslower + print_results(size, results, baselines.get(size), options.threshold);
+   # end for
+
+   if (len(options.json) > 0):
+      json_file = open(options.json, 'w');
+      json.dump({"clock": options.clock, "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+                 "runs": runs}, json_file, indent=1);
+      json_file.close();
+   # end if
+   if (nslower > 0):
+      print(" ");
+      print("%d stages are more than %.0f%% slower than %s" % (nslower, options.threshold,
+                                                               options.compare));
+      sys.exit(1);
+   # end if
+
+# end
@@ -1,4 +1,4 @@
-#!/usr/bin/python
+#!/usr/bin/env python3
 #
 # Enhanced data plotter for nfsiostat output. April 10, 2014
 #
@@ -40,17 +40,22 @@
 # If you want to get CPU usage information then you have to run iostat along
 # with nfsiostat. Then you first process the iostat output using the
 # iostat_plotter.py code which produces a Python Pickle file. The pickle
-# is then used as input to nfsiostat_plotter_v4.py. If you don't do this
+# is then used as input to nfsiostat_plotter_v4.py (it is converted to
+# the memory-mappable directory "iostat_data"). If you don't do this
 # you won't get CPU usage information (Note: this is because nfsiostat does
 # not gather CPU usage).
 #
+# nfsiostat_plotter_v4.py runs on Python 3 (and still on Python 2.7).
+#
+
+from __future__ import print_function, division
 
 import sys
 try:
    import shlex                      # Needed for splitting input lines
 except ImportError:
-   print "Cannot import shlex module - this is needed for this application.";
-   print "Exiting..."
+   print("Cannot import shlex module - this is needed for this application.");
+   print("Exiting...")
    sys.exit();
 
 try:
@@ -58,109 +63,601 @@ try:
    time_var = 1
 except ImportError:
    time_var = 0;
-   print "Cannot import time module - this is needed for this application.";
-   print "Exiting..."
+   print("Cannot import time module - this is needed for this application.");
+   print("Exiting...")
    sys.exit();
 
 try:
    import matplotlib.pyplot as plt;   # Needed for plots
+   from matplotlib.figure import Figure
+   from matplotlib.backends.backend_agg import FigureCanvasAgg
    matplotlib_var = 1
 except ImportError:
    matplotlib_var = 0;
-   print "Cannot import matplotlib module - this is needed for this application.";
-   print "Exiting..."
+   print("Cannot import matplotlib module - this is needed for this application.");
+   print("Exiting...")
+   sys.exit();
+
+try:
+   import numpy                       # Needed for the columnar fs data store
+except ImportError:
+   print("Cannot import numpy module - this is needed for this application.");
+   print("Exiting...")
    sys.exit();
 
 try:
    import os                          # Needed for mkdir
 except ImportError:
-   print "Cannot import os module - this is needed for this application.";
-   print "Exiting..."
+   print("Cannot import os module - this is needed for this application.");
+   print("Exiting...")
+   sys.exit();
+
+try:
+   import json                        # Needed for the parsed-capture cache
+   import hashlib
+   import shutil
+   import glob                        # Needed for batch (multi-host) mode
+   import csv                         # Needed for the summary statistics file
+   import base64                      # Needed for the interactive report
+   import string                      # Needed for the report templates
+   import argparse                    # Needed for the command line options
+   import fnmatch                     # Needed for the mount filter
+except ImportError:
+   print("Cannot import json, hashlib, shutil, glob, csv, base64, string, argparse or fnmatch module - this is needed for this application.");
+   print("Exiting...")
    sys.exit();
 
 try:
    import pickle                      # Needed for pickle
    pickle_success = 1;
 except ImportError:
-   print "Cannot import pickle module - this is not needed for this application.";
-   print "Continuing to process";
+   print("Cannot import pickle module - this is not needed for this application.");
+   print("Continuing to process");
    pickle_success = 0;
 
+try:
+   import multiprocessing             # Needed for parallel plot rendering
+   multiprocessing_success = 1;
+except ImportError:
+   multiprocessing_success = 0;       # Plots are rendered serially
+
+try:
+   import resource                    # Needed for peak memory (RSS) reporting
+   resource_success = 1;
+except ImportError:
+   resource_success = 0;              # Not available on all platforms
+
 
 
 
 
 # ------------------------------
 
+# Names of the per file system series, in the column order of nfsiostat
+fs_fields = ["rMB_nor", "wMB_nor", "rMB_dir", "wMB_dir", "rMB_svr", "wMB_svr",
+             "ops", "rops", "wops"];
+
+
 
 def help_out():
    # prints out help information and stops
-   print " ";
-   print "This application creates a short HTML based report from nfsiostat";
-   print "output (part of the sysstat tools). The report includes plots that";
-   print "help analyze the output. This version relies on sysstat tools version";
-   print "10.x. Many distributions such as CentOS or Red Hat use sysstat version";
-   print "9.x. If this is the case, please upgrade your sysstat tools. This is ";
-   print "not a difficult task but be sure you install over the previous version.";
-   print " ";
-   print "To run the application first gather the nfsiostat information using: ";
-   print "the following example.";
-   print " ";
-   print "[laytonjb ~]$ nfsiostat -h -m -t 1 100 > nfsiostat.out ";
-   print " ";
-   print "where \"1 100\" tells nfsiostat to use \"1\" second intervals and ";
-   print "\"100\" means to gather data for 100 internvals (or 100 seconds in this";
-   print "case). The output from nfsiostat is send to a file which is ";
-   print "\"nfsiostat.out\". You can name the file anything you want but be sure ";
-   print "note the name of the file.";
-   print " ";
-   print "Then to run nfsiostat_plotter using the nfsiostat output file, the command is, ";
-   print " ";
-   print "[laytonjb ~]$ ./nfsiostat_plotter_v4.py nfsiostat.out ";
-   print " ";
-   print "where \"nfsiostat.out\" is the output from nfsiostat. The code is written ";
-   print "in Python (obviously) and uses the shlex, time, os, and matplotlib ";
-   print "modules. Be sure this libraries are installed on your system.";
-   print " ";
-   print "You can run nfsiostat_plotter in one of two ways. The first way creates ";
-   print "the set of plots for each NFS file system mounted on the node. In this ";
-   print "version of nfsiostat_plotter, four plots are created, so if you have ";
-   print "two NFS mounts on the node, then you will ahve a total of eight plots.";
-   print " ";
-   print "The other way to run nfsiostat_plotter is to combine the results for each";
-   print "NFS file system in the plots. This means you will have only four plots";
-   print "in the HTML report even if you have more than one NFS mount. You run this ";
-   print "with the following command:";
-   print " ";
-   print "[laytonjb ~]$ ./nfsiostat_plotter_v4.py -c nfsiostat.out ";
-   print " ";
-   print "The option \"-c\" tells nfsiostat_plotter to \"combine\" the NFS";
-   print "mount point results into a single plot. Currently, you can analyze about";
-   print "four NFS mount points. With more than four NFS mounts, the legend labels";
-   print "run into each other.";
-   print " ";
-   print "When nfsiostat_plotter is done it will create a subdirectory \"HTML_REPORT\" ";
-   print "that contains the plots and an html file \"report.html\". Open that ";
-   print "html file in a browser or word processor and you will see the plots ";
-   print "and a small write-up about them. Feel free to modify the code but ";
-   print "please send back changes. ";
-   print " ";
-   print "Nfsiostat does not collect CPU usage. If you want to plot CPU usage along";
-   print "with NFS usage, you nede to run \"iostat\" when you run \"nfsiostat\". ";
-   print "Once \"iostat\" is done you process the data using \"iostat_plotter.py\". ";
-   print "This code produces a pickle called \"iostat_file.pickle\". This is used by ";
-   print "\"nfsiostat_plotter_v4.py\" as input. If the file exists then the plots ";
-   print "will include CPU usage data. If it doesn't exist then the plots will not ";
-   print "plot CPU usage, only NFS usage.";
-   print " ";
+   print(" ");
+   print("This application creates a short HTML based report from nfsiostat");
+   print("output (part of the sysstat tools). The report includes plots that");
+   print("help analyze the output. This version relies on sysstat tools version");
+   print("10.x. Many distributions such as CentOS or Red Hat use sysstat version");
+   print("9.x. If this is the case, please upgrade your sysstat tools. This is ");
+   print("not a difficult task but be sure you install over the previous version.");
+   print(" ");
+   print("To run the application first gather the nfsiostat information using: ");
+   print("the following example.");
+   print(" ");
+   print("[laytonjb ~]$ nfsiostat -h -m -t 1 100 > nfsiostat.out ");
+   print(" ");
+   print("where \"1 100\" tells nfsiostat to use \"1\" second intervals and ");
+   print("\"100\" means to gather data for 100 internvals (or 100 seconds in this");
+   print("case). The output from nfsiostat is send to a file which is ");
+   print("\"nfsiostat.out\". You can name the file anything you want but be sure ");
+   print("note the name of the file.");
+   print(" ");
+   print("Then to run nfsiostat_plotter using the nfsiostat output file, the command is, ");
+   print(" ");
+   print("[laytonjb ~]$ ./nfsiostat_plotter_v4.py nfsiostat.out ");
+   print(" ");
+   print("where \"nfsiostat.out\" is the output from nfsiostat. The code is written ");
+   print("in Python (obviously) and uses the shlex, time, os, and matplotlib ");
+   print("modules. Be sure this libraries are installed on your system.");
+   print(" ");
+   print("You can run nfsiostat_plotter in one of two ways. The first way creates ");
+   print("the set of plots for each NFS file system mounted on the node. In this ");
+   print("version of nfsiostat_plotter, four plots are created, so if you have ");
+   print("two NFS mounts on the node, then you will ahve a total of eight plots.");
+   print(" ");
+   print("The other way to run nfsiostat_plotter is to combine the results for each");
+   print("NFS file system in the plots. This means you will have only four plots");
+   print("in the HTML report even if you have more than one NFS mount. You run this ");
+   print("with the following command:");
+   print(" ");
+   print("[laytonjb ~]$ ./nfsiostat_plotter_v4.py -c nfsiostat.out ");
+   print(" ");
+   print("The option \"-c\" tells nfsiostat_plotter to \"combine\" the NFS");
+   print("mount point results into a single plot. Up to four NFS mount points are");
+   print("drawn as lines. With more than four NFS mounts, each");
+   print("series is drawn as a heatmap instead (one row per mount, busiest at the");
+   print("top) and the five busiest mounts are also plotted as lines, so \"-c\"");
+   print("works for servers with hundreds of mounts.");
+   print(" ");
+   print("The plots can be rendered in parallel by a pool of worker processes");
+   print("with the option \"-j\" followed by the number of workers, for example");
+   print(" ");
+   print("[laytonjb ~]$ ./nfsiostat_plotter_v4.py -j8 nfsiostat.out ");
+   print(" ");
+   print("A plain \"-j\" uses one worker per core. The report is the same as");
+   print("when the plots are rendered one after another. A plain \"-j\" (like");
+   print("\"-f\" and \"-align\" below) takes the next argument as its value, so put");
+   print("it after the file name or give the value, e.g. \"-j0\".");
+   print(" ");
+   print("To process the captures of many hosts at once, use \"-b\" (batch) with");
+   print("a directory or a quoted glob instead of a file name:");
+   print(" ");
+   print("[laytonjb ~]$ ./nfsiostat_plotter_v4.py -b \"/data/nfsiostat/*.out\" ");
+   print(" ");
+   print("Each host gets its own report in \"HTML_REPORT/<host>/report.html\" and");
+   print("\"HTML_REPORT/index.html\" lists all hosts. The host name is the file");
+   print("name without extension. The hosts are processed by one worker per core");
+   print("(or the number given with \"-j\"), and the report of a host whose");
+   print("capture and options did not change since the last run is kept as is.");
+   print("Batch reports do not include iostat CPU data.");
+   print(" ");
+   print("The report starts with summary statistics of each series of each file");
+   print("system (min, max, mean, median, 95th and 99th percentile, standard");
+   print("deviation and the total amount of data moved) and the busiest");
+   print("intervals. They are also written to \"HTML_REPORT/stats.csv\" and");
+   print("\"HTML_REPORT/stats.json\".");
+   print(" ");
+   print("With \"-i\" an interactive report is written instead: \"report.html\"");
+   print("contains the data itself and draws the charts in the browser, where");
+   print("they can be zoomed (mouse wheel) and panned (drag) without running");
+   print("nfsiostat_plotter again. No PNG files are made, so long captures and");
+   print("many file systems are much faster to report.");
+   print(" ");
+   print("The report also lists anomalies of ops/s, rMB_svr and wMB_svr and shades");
+   print("them in the figures: spikes (red), samples more than 4 standard deviations");
+   print("above the mean of the 60 samples before them, and saturation (orange),");
+   print("30 or more samples that stay flat near the top of the series. Use");
+   print("\"-z\" followed by a number to change the spike threshold, for example");
+   print("\"-z6\", and \"-noanomaly\" to turn the detection off.");
+   print(" ");
+   print("The option \"-t\" prints the time spent on each figure.");
+   print(" ");
+   print("Long captures can be reduced before plotting with \"-r\" followed by");
+   print("the maximum number of points per line, for example \"-r2000\". By");
+   print("default the minimum and maximum of each time bucket are kept, so short");
+   print("spikes stay visible. With \"-lttb\" the largest-triangle-three-buckets");
+   print("method is used instead, and \"-s\" adds the minimum and maximum of each");
+   print("bucket to it to keep spikes.");
+   print(" ");
+   print("To watch a capture while nfsiostat is still writing it, use \"-f\"");
+   print("(follow), optionally with the refresh interval in seconds (default 10):");
+   print(" ");
+   print("[laytonjb ~]$ nfsiostat -h -m -t 1 > nfsiostat.out & ");
+   print("[laytonjb ~]$ ./nfsiostat_plotter_v4.py -f30 nfsiostat.out ");
+   print(" ");
+   print("Only the new part of the file is read on each refresh and only the");
+   print("figures of file systems with new data are redrawn. Plots are reduced");
+   print("to 2000 points per line unless \"-r\" is given. The new samples are");
+   print("added to min/max buckets and to the anomaly detection, so a refresh");
+   print("takes about the same time however long the capture gets.");
+   print(" ");
+   print("The parsed data is saved in the subdirectory \"NFSIOSTAT_CACHE\". When");
+   print("the same capture (same size, time stamp and content) is plotted again,");
+   print("for example with different options, the data is read from there");
+   print("instead of parsing the file again. Use \"-nocache\" to turn this off.");
+   print(" ");
+   print("The data rows are converted to numbers in blocks with numpy. Use");
+   print("\"--tokenizer python\" to convert them row by row instead.");
+   print(" ");
+   print("When nfsiostat_plotter is done it will create a subdirectory \"HTML_REPORT\" ");
+   print("that contains the plots and an html file \"report.html\". Open that ");
+   print("html file in a browser or word processor and you will see the plots ");
+   print("and a small write-up about them. Feel free to modify the code but ");
+   print("please send back changes. ");
+   print(" ");
+   print("Nfsiostat does not collect CPU usage. If you want to plot CPU usage along");
+   print("with NFS usage, you nede to run \"iostat\" when you run \"nfsiostat\". ");
+   print("Once \"iostat\" is done you process the data using \"iostat_plotter.py\". ");
+   print("This code produces a pickle called \"iostat_file.pickle\". This is used by ");
+   print("\"nfsiostat_plotter_v4.py\" as input. If the file exists then the plots ");
+   print("will include CPU usage data. If it doesn't exist then the plots will not ");
+   print("plot CPU usage, only NFS usage. The pickle is converted into the ");
+   print("subdirectory \"iostat_data\" (one .npy file per series), which is read ");
+   print("instead of the pickle until the pickle changes. The nfsiostat data is ");
+   print("written to \"nfsiostat_data\" in the same format, in the directory of ");
+   print("the nfsiostat output file.");
+   print(" ");
+   print("By default the CPU usage is plotted on the iostat time axis. With");
+   print("\"-align\" both captures are put on a common time grid using their");
+   print("absolute time stamps (nearest sample; \"-align=linear\" interpolates),");
+   print("the CPU plots share the nfsiostat time axis, and the report lists the");
+   print("correlation between CPU usage and each nfsiostat series.");
+   print(" ");
+   print("Instead of running nfsiostat and reading its output, nfsiostat_plotter");
+   print("can sample /proc/self/mountstats itself with \"--collect\" followed by");
+   print("the interval in seconds, for \"--count\" snapshots (or until Ctrl-C):");
+   print(" ");
+   print("[laytonjb ~]$ ./nfsiostat_plotter_v4.py --collect 1 --count 3600 nfsiostat_capture ");
+   print(" ");
+   print("The rates of each NFS mount (the same series as nfsiostat -m) are");
+   print("computed from the counter differences and saved in the capture");
+   print("directory \"nfsiostat_capture\" without any text output, and the report");
+   print("is made from it. Give the directory instead of a file name to report it");
+   print("again later. \"--mountstats\" reads another mountstats file, or a");
+   print("directory of recorded snapshots (one file per sample, in name order).");
+   print(" ");
+   print("The report can be limited to part of a capture: \"--start\" and \"--end\"");
+   print("give a time window in seconds from the start of the capture, \"--mount\"");
+   print("a pattern of the file systems to keep and \"--figures\" the figures to");
+   print("draw, for example");
+   print(" ");
+   print("[laytonjb ~]$ ./nfsiostat_plotter_v4.py --start 3600 --end 7200 --mount \"server1:*\" --figures svr,ops nfsiostat.out ");
+   print(" ");
+   print("Data outside the window or of other mounts is skipped while reading");
+   print("the capture (and reading stops at the end of the window), so this is");
+   print("much faster than reporting the whole capture. Such a partial capture is");
+   print("not saved in \"NFSIOSTAT_CACHE\"; if the whole capture is already");
+   print("there, the selection is taken from it instead.");
+   print(" ");
+   print("With \"-\" (or no file name) the capture is read from standard input,");
+   print("\"-o\" sets the report directory, \"--format svg\" and \"--dpi\" the");
+   print("image files, and \"--iostat\" the iostat pickle (or iostat_data");
+   print("directory). All options:");
+   print(" ");
+   option_parser().print_help();
+   print(" ");
+
+# end def
+
+
+
+
+# Reduction of long series before plotting (see reduce_series())
+#   max_points = maximum number of points per line (0 = plot every point)
+#   method = "minmax" (min and max of each bucket) or "lttb"
+#            (largest triangle three buckets)
+#   keep_spikes = 1 to also keep the min and max of each bucket with "lttb"
+plot_reduce = {"max_points": 0, "method": "minmax", "keep_spikes": 0};
+
+# Image files of the figures (see save_figure())
+#   format = "png" or "svg"
+#   dpi = resolution in dots per inch (0 = the matplotlib default)
+report_images = {"format": "png", "dpi": 0};
+
+
+
+def reduce_minmax(x, y, max_points):
+   #
+   # Splits the series into max_points/2 buckets and keeps the smallest
+   # and largest value of each bucket (in time order). Returns indices.
+   #
+   n = len(y);
+   nbuckets = max(1, max_points // 2);
+   size = -(-n // nbuckets);                   # ceil(n / nbuckets)
+   nbuckets = -(-n // size);
+   padded = numpy.empty(nbuckets * size);
+   padded[0:n] = y;
+   padded[n:] = numpy.nan;
+   padded = padded.reshape(nbuckets, size);
+   offset = numpy.arange(nbuckets) * size;
+   # the last bucket may be padded, so use nan-aware arg functions
+   imin = offset + numpy.nanargmin(padded, axis=1);
+   imax = offset + numpy.nanargmax(padded, axis=1);
+   return numpy.unique(numpy.concatenate( (imin, imax) ));
+   
+# end def
+
+
+
+def reduce_lttb(x, y, max_points, keep_spikes):
+   #
+   # Largest triangle three buckets: keeps the first and last point and,
+   # from each of max_points-2 buckets, the point forming the largest
+   # triangle with the point kept from the previous bucket and the mean of
+   # the next bucket. Returns indices.
+   #
+   n = len(y);
+   nbuckets = max(1, max_points - 2);
+   edges = (numpy.arange(nbuckets + 1) * (n - 2) // nbuckets) + 1;
+   keep = numpy.empty(nbuckets + 2, dtype=int);
+   keep[0] = 0;
+   keep[-1] = n - 1;
+   extra = [];
+   a = 0;
+   for i in range(0, nbuckets):
+      lo = edges[i];
+      hi = edges[i+1];
+      if (i < nbuckets-1):
+         x_next = x[hi:edges[i+2]].mean();
+         y_next = y[hi:edges[i+2]].mean();
+      else:
+         x_next = x[n-1];
+         y_next = y[n-1];
+      # end if
+      area = numpy.abs( (x[a] - x_next) * (y[lo:hi] - y[a]) -
+                        (x[a] - x[lo:hi]) * (y_next - y[a]) );
+      a = lo + int(numpy.argmax(area));
+      keep[i+1] = a;
+      if (keep_spikes == 1):
+         extra.append(lo + int(numpy.argmin(y[lo:hi])));
+         extra.append(lo + int(numpy.argmax(y[lo:hi])));
+      # end if
+   # end for
+   if (len(extra) > 0):
+      return numpy.unique(numpy.concatenate( (keep, extra) ));
+   # end if
+   return keep;
+   
+# end def
+
+
+
+def reduce_series(x, y):
+   #
+   # Returns (x, y) reduced to about plot_reduce["max_points"] points while
+   # keeping the shape of the series. Short series, and series whose x and
+   # y do not match in length, are returned unchanged.
+   #
+   max_points = plot_reduce["max_points"];
+   if ( (max_points <= 0) or (len(y) <= max_points) or (len(x) != len(y)) ):
+      return (x, y);
+   # end if
+   x = numpy.asarray(x, dtype=float);
+   y = numpy.asarray(y, dtype=float);
+   if (plot_reduce["method"] == "lttb"):
+      keep = reduce_lttb(x, y, max_points, plot_reduce["keep_spikes"]);
+   else:
+      keep = reduce_minmax(x, y, max_points);
+   # end if
+   return (x[keep], y[keep]);
+   
+# end def
+
+
+
+def plot_reduced(ax, x, y, style, label):
+   #
+   # ax.plot() of the reduced series (used by the combined plots)
+   #
+   (x, y) = reduce_series(x, y);
+   ax.plot(x, y, style, label=label);
+   
+# end def
+
+
+
+# Figures reused by Three_Chart() and Two_Chart(), one per chart kind
+chart_templates = {};
+
+# Function called as figure_timing_hook(filename, seconds) after each
+# figure is written by plot_job() (None = no timing)
+figure_timing_hook = None;
+
+
+
+def print_figure_time(filename, seconds):
+   #
+   # Timing hook that prints the time spent on a figure
+   #
+   print("   %s: %.3f s" % (filename, seconds));
+   
+# end def
+
+
+
+# Regions flagged by detect_anomalies() for each file system, shaded on
+# the figures (set by render_report())
+plot_anomalies = {};
+
+# Shading color of each kind of region
+anomaly_colors = {"spike": "red", "saturation": "orange"};
+
+
+
+def anomaly_spans(fs_items):
+   #
+   # Returns the list of (x0, x1, color) regions to shade on a figure of
+   # the file systems fs_items
+   #
+   spans = [];
+   for item in fs_items:
+      for region in plot_anomalies.get(item["fs"], []):
+         spans.append( (region["x0"], region["x1"], anomaly_colors[region["kind"]]) );
+      # end for
+   # end for
+   return spans;
+   
+# end def
+
+
+
+def annotate_axes(axes, spans):
+   #
+   # Shades the regions spans (see anomaly_spans()) on each of axes and
+   # returns the list of patches added
+   #
+   patches = [];
+   if (spans is None):
+      return patches;
+   # end if
+   for ax in axes:
+      for (x0, x1, color) in spans:
+         patches.append(ax.axvspan(x0, x1, facecolor=color, alpha=0.25, linewidth=0));
+      # end for
+   # end for
+   return patches;
+   
+# end def
+
+
+
+def image_file(filename):
+   #
+   # Returns the name of the image file of a figure; filename is given
+   # without extension
+   #
+   return filename + "." + report_images["format"];
+   
+# end def
+
+
+
+def save_figure(fig, filename):
+   #
+   # Saves figure fig in the format and resolution of report_images
+   #
+   if (report_images["dpi"] > 0):
+      fig.savefig(image_file(filename), dpi=report_images["dpi"]);
+   else:
+      fig.savefig(image_file(filename));
+   # end if
+   
+# end def
+
+
+
+def chart_build(fig, styles, labels, ylabels, xlabel, fsize, flegsize,
+                box_expansion):
+   #
+   # Adds vertically stacked panels with one (empty) line, a legend and
+   # 1 x-axis label at the bottom to figure fig using the Figure/Axes API.
+   # Returns the list of lines so the data can be swapped later.
+   #
+   # styles = line style of each panel (top to bottom), e.g. "ro-"
+   # labels = data label of each panel
+   # ylabels = y-axis label of each panel
+   # xlabel = x-axis label (only on bottom panel)
+   # fsize = font size for tick labels
+   # flegsize = font size for legend labels
+   # box_expansion = expansion factor on legend box
+   #
+   lines = [];
+   npanels = len(styles);
+   for i in range(0, npanels):
+      ax = fig.add_subplot(npanels, 1, i+1);
+      line, = ax.plot([], [], styles[i], label=labels[i]);
+      lines.append(line);
+      ax.grid();
+      if (i == 0):
+         ax.set_ylabel(ylabels[i], fontsize=6);     # Use a 6 pt font for top y-axis label
+         ax.tick_params(labelsize=6);
+      else:
+         ax.set_ylabel(ylabels[i], fontsize=fsize);
+         ax.tick_params(labelsize=fsize);
+      # end if
+      if (i < npanels-1):
+         ax.set_xlabel(" ");                       # Only the bottom plot has an x-axis label
+         ax.set_xticklabels([]);
+      else:
+         ax.set_xlabel(xlabel);
+      # end if
+      
+      # Legend
+      box = ax.get_position();
+      ax.set_position([box.x0, box.y0, box.width * box_expansion, box.height]);
+      leg = ax.legend(bbox_to_anchor=(1.01, 1), loc=2, borderaxespad=0., labelspacing=0,
+                      borderpad=0.15, handletextpad=0.2);
+      leg.get_frame().set_facecolor("0.80");       # Make legend box have a gray background
+      for t in leg.get_texts():
+         t.set_fontsize(flegsize);
+      # end for
+   # end for
+   return lines;
+   
+# end def
+
+
+
+def chart_render(xy, styles, labels, ylabels, xlabel, fsize, flegsize,
+                 filename, box_expansion, spans=None):
+   #
+   # Plots the (x, y) pairs in xy into stacked panels. The figure of each
+   # chart kind (styles, labels, fonts, ...) is built once and kept in
+   # chart_templates; later calls only swap the line data. If filename is
+   # empty the plot is displayed instead.
+   #
+   # spans = list of (x0, x1, color) regions shaded on every panel (see
+   #         anomaly_spans()); they are removed again after saving so the
+   #         template is clean for the next call
+   #
+   if (len(filename) == 0):
+      fig = plt.figure();
+      lines = chart_build(fig, styles, labels, ylabels, xlabel, fsize, flegsize,
+                          box_expansion);
+   else:
+      key = (tuple(styles), tuple(labels), tuple(ylabels), xlabel, fsize, flegsize,
+             box_expansion);
+      if key not in chart_templates:
+         fig = Figure();
+         FigureCanvasAgg(fig);
+         lines = chart_build(fig, styles, labels, ylabels, xlabel, fsize, flegsize,
+                             box_expansion);
+         chart_templates[key] = (fig, lines);
+      # end if
+      (fig, lines) = chart_templates[key];
+   # end if
+   
+   for i in range(0, len(lines)):
+      (x, y) = reduce_series(xy[i][0], xy[i][1]);
+      lines[i].set_data(x, y);
+      ax = lines[i].axes;
+      ax.relim();
+      ax.autoscale_view();
+   # end for
+   patches = annotate_axes([line.axes for line in lines], spans);
+   
+   chart_save(fig, filename);
+   for patch in patches:
+      patch.remove();
+   # end for
+   
+# end def
 
+
+
+def chart_figure(filename):
+   #
+   # Returns a new figure for the combined (all file systems) plots: an
+   # Agg-backed Figure that is not registered with pyplot when saving to
+   # filename, so plot workers never touch the pyplot global state, or a
+   # pyplot figure if filename is empty and the plot is displayed
+   #
+   if (len(filename) == 0):
+      return plt.figure();
+   # end if
+   fig = Figure();
+   FigureCanvasAgg(fig);
+   return fig;
+   
 # end def
 
 
 
+def chart_save(fig, filename):
+   #
+   # Either saves fig to filename or displays it to the screen (the time is
+   # measured by plot_job())
+   #
+   if (len(filename) == 0):
+      plt.show();
+   else:
+      save_figure(fig, filename);
+   # end if
+   
+# end def
+
+
 
 def Three_Chart(x1, y1, x2, y2, x3, y3, xlabel, ylabel1, ylabel2, ylabel3, 
-                d1, d2, d3, fsize, flegsize, filename, box_expansion):
+                d1, d2, d3, fsize, flegsize, filename, box_expansion, spans=None):
    #
    # Creates 3 vertical subplots with legends and 1 x-axis label at the
    #   the bottom
@@ -182,87 +679,18 @@ def Three_Chart(x1, y1, x2, y2, x3, y3, xlabel, ylabel1, ylabel2, ylabel3,
    # flegsize = font size for legend labels
    # filename = name of file for plot output
    # box_expansion = expansion factor on legend box
+   # spans = regions to shade (see chart_render())
    #
-   
-   # Top plot
-   ax1 = plt.subplot(311);                 # Define top plot using subplot function
-   plt.plot(x1,y1, "ro-", label=d1);       # Plot the first data set with a red line wiht "o" as a symbol
-   plt.grid();
-   plt.xlabel(" ");                        # Don't put an x-axis label since it's the top plot
-   plt.ylabel(ylabel1, fontsize=6);        # Use a 6 pt font for y-axis label
-   ax1.set_xticklabels([]);                # get x-axis tick label
-   
-   # Legend
-   box = ax1.get_position()
-   ax1.set_position([box.x0, box.y0, box.width * box_expansion, box.height])  
-   leg1 = plt.legend(bbox_to_anchor=(1.01, 1), loc=2, borderaxespad=0., labelspacing=0, 
-                     borderpad=0.15, handletextpad=0.2);
-   frame1 = leg1.get_frame();
-   frame1.set_facecolor("0.80");            # Make legend box have a gray background
-   for t in leg1.get_texts():
-      t.set_fontsize(flegsize);             # Change the font size of the legend text to 10 pt.
-   # end for
-   
-   plt.xticks(fontsize=6);
-   plt.yticks(fontsize=6);
-   
-   # Middle plot
-   ax2 = plt.subplot(312);
-   plt.plot(x2,y2, "bo-", label=d2);
-   plt.grid();
-   plt.xlabel(" ");
-   plt.ylabel(ylabel2, fontsize=fsize);
-   ax2.set_xticklabels([]);
-   
-   # Legend
-   box = ax2.get_position();
-   ax2.set_position([box.x0, box.y0, box.width * box_expansion, box.height]);
-   leg2 = plt.legend(bbox_to_anchor=(1.01, 1), loc=2, borderaxespad=0., labelspacing=0, 
-                     borderpad=0.15, handletextpad=0.2);
-   frame2 = leg2.get_frame();
-   frame2.set_facecolor("0.80");
-   for t in leg2.get_texts():
-      t.set_fontsize(flegsize);
-   # end for
-   
-   plt.xticks(fontsize=fsize);
-   plt.yticks(fontsize=fsize);
-   
-   # Bottom plot
-   ax3 = plt.subplot(313);
-   plt.plot(x3,y3, "go-", label=d3);
-   plt.grid();
-   plt.xlabel(xlabel);
-   plt.ylabel(ylabel3, fontsize=fsize);
-   
-   # Legend
-   box = ax3.get_position()
-   ax3.set_position([box.x0, box.y0, box.width * box_expansion, box.height])
-   leg3 = plt.legend(bbox_to_anchor=(1.01, 1), loc=2, borderaxespad=0., labelspacing=0, 
-                     borderpad=0.15, handletextpad=0.2);
-   frame3 = leg3.get_frame();
-   frame3.set_facecolor("0.80");
-   for t in leg3.get_texts():
-      t.set_fontsize(flegsize);
-   # end for
-   
-   plt.xticks(fontsize=fsize);
-   plt.yticks(fontsize=fsize);
-   
-   # Either save the plot to a file or display it to the screen
-   if (len(filename) == 0):
-      plt.show();
-   else:
-      plt.savefig(filename);
-      plt.close();
-   # end if
+   chart_render([(x1, y1), (x2, y2), (x3, y3)], ["ro-", "bo-", "go-"],
+                [d1, d2, d3], [ylabel1, ylabel2, ylabel3], xlabel, fsize, flegsize,
+                filename, box_expansion, spans);
    
 # end def
 
 
 
 def Two_Chart(x1, y1, x2, y2, xlabel, ylabel1, ylabel2, d1, d2, fsize, 
-              flegsize, filename, box_expansion):
+              flegsize, filename, box_expansion, spans=None):
    #
    # Creates 2 vertical subplots with legends and 1 x-axis label at the
    #   the bottom
@@ -280,89 +708,147 @@ def Two_Chart(x1, y1, x2, y2, xlabel, ylabel1, ylabel2, d1, d2, fsize,
    # flegsize = font size for legend labels
    # filename = name of file for plot output
    # box_expansion = expansion factor on legend box
+   # spans = regions to shade (see chart_render())
    #
+   chart_render([(x1, y1), (x2, y2)], ["ro-", "go-"], [d1, d2], [ylabel1, ylabel2],
+                xlabel, fsize, flegsize, filename, box_expansion, spans);
    
-   # Top plot
-   ax1 = plt.subplot(211);                 # Define top plot using subplot function
-   plt.plot(x1,y1, "ro-", label=d1);       # Plot the first data set with a red line with "o" as a symbol
-   plt.grid();
-   plt.xlabel(" ");                        # Don't put an x-axis label since it's the top plot
-   plt.ylabel(ylabel1, fontsize=6);        # Use a 6 pt font for y-axis label
-   ax1.set_xticklabels([]);                # get x-axis tick label
-   
-   # Legend
-   box = ax1.get_position()
-   ax1.set_position([box.x0, box.y0, box.width * box_expansion, box.height])  
-   leg1 = plt.legend(bbox_to_anchor=(1.01, 1), loc=2, borderaxespad=0., labelspacing=0, 
-                     borderpad=0.15, handletextpad=0.2);
-   frame1 = leg1.get_frame();
-   frame1.set_facecolor("0.80");           # Make legend box have a gray background
-   for t in leg1.get_texts():
-      t.set_fontsize(flegsize);            # Change the font size of the legend text to flegsize
+# end def
+
+
+
+# Combined plots with more than combined_max_lines file systems are drawn
+# as heatmaps (see plot_heatmap()) instead of one line per file system,
+# with the heatmap_top_k busiest file systems also drawn as lines
+combined_max_lines = 4;
+heatmap_top_k = 5;
+
+# Number of time columns of a heatmap (about one per pixel)
+heatmap_columns = 800;
+
+# Series of each figure, and their heatmap labels
+heatmap_series = {"plot1": ["rMB_nor", "wMB_nor"], "plot1a": ["rMB_nor", "wMB_nor"],
+                  "plot2": ["rMB_dir", "wMB_dir"], "plot2a": ["rMB_dir", "wMB_dir"],
+                  "plot3": ["rMB_svr", "wMB_svr"], "plot3a": ["rMB_svr", "wMB_svr"],
+                  "plot4": ["ops", "rops", "wops"]};
+heatmap_labels = {"rMB_nor": "Read (MB/s) \n read(2)", "wMB_nor": "Write (MB/s) \n write(2)",
+                  "rMB_dir": "Read (MB/s) \n O_DIRECT", "wMB_dir": "Write (MB/s) \n O_DIRECT",
+                  "rMB_svr": "Read (MB/s) \n NFS READ", "wMB_svr": "Write (MB/s) \n NFS WRITE",
+                  "ops": "ops/s", "rops": "Read ops/s", "wops": "Write ops/s"};
+
+
+
+def heatmap_matrix(x_seconds, fs_data_list, name, columns):
+   #
+   # Returns (matrix, x edges): the mean of series name of each file
+   # system (rows) in each of at most columns equal time buckets
+   #
+   n = len(x_seconds);
+   columns = max(1, min(columns, n));
+   edges = numpy.linspace(0, n, columns + 1).astype(numpy.int64);
+   starts = edges[:-1];
+   counts = numpy.diff(edges);
+   matrix = numpy.zeros( (len(fs_data_list), columns) );
+   for i in range(0, len(fs_data_list)):
+      y = numpy.asarray(fs_data_list[i][name][0:n], dtype=numpy.float64);
+      matrix[i] = numpy.add.reduceat(y, starts) / counts;
    # end for
+   return (matrix, x_seconds[numpy.minimum(edges, n-1)]);
    
-   plt.xticks(fontsize=6);
-   plt.yticks(fontsize=6);
-   
-   # Bottom plot
-   ax2 = plt.subplot(212);
-   plt.plot(x2,y2, "go-", label=d2);
-   plt.grid();
-   plt.xlabel(xlabel);
-   plt.ylabel(ylabel2, fontsize=fsize);
-   
-   # Legend
-   box = ax2.get_position()
-   ax2.set_position([box.x0, box.y0, box.width * box_expansion, box.height])
-   leg2 = plt.legend(bbox_to_anchor=(1.01, 1), loc=2, borderaxespad=0., labelspacing=0, 
-                     borderpad=0.15, handletextpad=0.2);
-   frame2 = leg2.get_frame();
-   frame2.set_facecolor("0.80");
-   for t in leg2.get_texts():
-      t.set_fontsize(flegsize);
-   # end for
+# end def
+
+
+
+def plot_heatmap(name, iloop, dirname, x_seconds, iostat_x_seconds, time_sum_list,
+                 fs_data_list):
+   #
+   # Combined figure for many file systems: one heatmap (file system x
+   # time) per series of figure name, each drawn with a single imshow(),
+   # so the time to draw does not depend on the number of file systems.
+   # The rows are sorted by the volume of the figure's series, busiest at
+   # the top, and a line panel shows the total of the heatmap_top_k busiest
+   # file systems (plus the total CPU utilization when time_sum_list is
+   # not None). Returns the image path.
+   #
+   names = heatmap_series[name];
+   filename = dirname + "/" + report_figures[name]["anchor"] + str(iloop);
+   npanels = len(names) + 1;
+   if (time_sum_list is not None):
+      npanels = npanels + 1;
+   # end if
    
-   plt.xticks(fontsize=fsize);
-   plt.yticks(fontsize=fsize);
+   n = len(x_seconds);
+   matrices = [heatmap_matrix(x_seconds, fs_data_list, series, heatmap_columns)
+               for series in names];
+   volume = sum([matrix.sum(axis=1) for (matrix, edges) in matrices]);
+   order = numpy.argsort(-volume, kind="mergesort");
+   top_k = min(heatmap_top_k, len(fs_data_list));
    
-   # Either save the plot to a file or display it to the screen
-   if (len(filename) == 0):
-      plt.show();
-   else:
-      plt.savefig(filename);
-      plt.close();
+   fig = Figure(figsize=(8.0, 1.6*npanels + 0.8));
+   FigureCanvasAgg(fig);
+   axes = [];
+   for k in range(0, len(names)):
+      (matrix, edges) = matrices[k];
+      ax = fig.add_subplot(npanels, 1, k+1);
+      image = ax.imshow(matrix[order], aspect="auto", interpolation="nearest",
+                        extent=[edges[0], edges[-1], len(fs_data_list), 0]);
+      colorbar = fig.colorbar(image, ax=ax, pad=0.01);
+      colorbar.ax.tick_params(labelsize=6);
+      ax.set_yticks([]);
+      ax.set_ylabel(heatmap_labels[names[k]] + "\n %d mounts" % len(fs_data_list), fontsize=7);
+      ax.tick_params(axis="x", labelsize=6);
+      ax.set_xticklabels([]);
+      axes.append(ax);
+   # end for
+   
+   # Top file systems by volume as lines, the total of the figure's series
+   ax = fig.add_subplot(npanels, 1, len(names)+1);
+   for i in order[0:top_k]:
+      y = sum([numpy.asarray(fs_data_list[i][series][0:n], dtype=numpy.float64) for series in names]);
+      (xr, yr) = reduce_series(x_seconds, y);
+      ax.plot(xr, yr, "-", linewidth=0.8, label=fs_data_list[i]["fs"][-30:]);
+   # end for
+   ax.set_ylabel("Top " + str(top_k) + " \n " + " + ".join(names), fontsize=7);
+   ax.tick_params(labelsize=6);
+   ax.grid();
+   leg = ax.legend(loc=2, fontsize=5, labelspacing=0, borderpad=0.15, handletextpad=0.2);
+   leg.get_frame().set_facecolor("0.80");
+   ax.set_xlim(x_seconds[0], x_seconds[-1]);
+   line_axes = [ax];
+   if (time_sum_list is not None):
+      ax.set_xticklabels([]);
+      ax = fig.add_subplot(npanels, 1, npanels);
+      (xr, yr) = reduce_series(iostat_x_seconds, time_sum_list);
+      ax.plot(xr, yr, "go-", markersize=2, label="Total CPU Utilization");
+      ax.set_ylabel("Total CPU \n Percentage \n Utilization", fontsize=7);
+      ax.tick_params(labelsize=6);
+      ax.grid();
+      ax.set_xlim(x_seconds[0], x_seconds[-1]);
+      line_axes.append(ax);
    # end if
+   ax.set_xlabel("Time (seconds)");
+   
+   # Keep the line panels as wide as the heatmaps (which have a colorbar)
+   width = axes[0].get_position().width;
+   for ax in line_axes:
+      box = ax.get_position();
+      ax.set_position([box.x0, box.y0, width, box.height]);
+   # end for
+   annotate_axes(line_axes, anomaly_spans([fs_data_list[i] for i in order[0:top_k]]));
+   
+   save_figure(fig, filename);
+   return image_file(filename);
    
 # end def
 
 
 
-def plot1(iloop, iplot, combined_plots, f, dirname, x_seconds, iostat_x_seconds,
+def plot1(iloop, iplot, combined_plots, dirname, x_seconds, iostat_x_seconds,
           time_sum_list, fsize, item, fs_data_list, line_list):
    #
    # Figure 1: read(2), write(2), total CPU vs. time (skip initial data point
    #
-   if (combined_plots == 0):
-      output_str = "<H4> \n"
-      junk1 = "app_read_write" + str(iloop);
-      output_str = output_str + str(iplot) + ". <a id=\"" + junk1 + "\">Application Read and Write Throughput, and Total CPU Utilization</a>";
-      output_str = output_str + ". Filesystem: " + item["fs"] + " \n";
-      output_str = output_str + "</H4> \n";
-   elif (combined_plots == 1):
-      output_str = "<H3> \n"
-      junk1 = "app_read_write" + str(iloop);
-      output_str = output_str + str(iplot) + ". <a id=\"" + junk1 + "\">Application Read and Write Throughput, and Total CPU Utilization</a>";
-      output_str = output_str + "</H3> \n";
-   # end if
    
-   output_str = output_str + " \n";
-   output_str = output_str + "<P>This figure plots the read and write throughput from applications \n";
-   output_str = output_str + "using the read(2) and write(2) system call interfaces as well as \n";
-   output_str = output_str + "total CPU usage. You can find out more about write throughput by\n";
-   output_str = output_str + "simply typing \"man 2 read\" or  \"man 2 write\". The throughput  \n";
-   output_str = output_str + "is plotted as a function of time. \n";
-   f.write(output_str);
-
    # make the plot
    ylabel1 = "NFS Client Read \n Throughput (MB/s) \n by apps via read(2)";
    ylabel2 = "NFS Client Write \n Throughput (MB/s) \n by apps via write(2)";
@@ -381,7 +867,7 @@ def plot1(iloop, iplot, combined_plots, f, dirname, x_seconds, iostat_x_seconds,
       # Compute box_expansion factor:
       box_expansion = 0.90;   # default
       ilongest = 0;
-      for item in fs_data_list:
+      for fs_item in fs_data_list:
          if (len(d1) > ilongest):
             ilongest = len(d1);
          # end if
@@ -397,8 +883,10 @@ def plot1(iloop, iplot, combined_plots, f, dirname, x_seconds, iostat_x_seconds,
       
       Three_Chart(x_seconds, item["rMB_nor"], x_seconds, item["wMB_nor"],
                   iostat_x_seconds, time_sum_list, xlabel, ylabel1, ylabel2, ylabel3,
-                  d1, d2, d3, fsize, flegsize, filename, box_expansion);
+                  d1, d2, d3, fsize, flegsize, filename, box_expansion,
+                  anomaly_spans([item]));
    elif (combined_plots == 1):
+      fig = chart_figure(filename);
       jloop = -1;
       expansion_box = 0.88;   # default
       
@@ -427,25 +915,25 @@ def plot1(iloop, iplot, combined_plots, f, dirname, x_seconds, iostat_x_seconds,
       expansion_box = round(junk1,2);
       
       # Top plot:
+      ax1 = fig.add_subplot(311);                 # Define top plot using subplot function
       for item in fs_data_list:
          jloop = jloop + 1;
          
          marker = line_list[jloop];
-         ax1 = plt.subplot(311);                 # Define top plot using subplot function
          d11 = item["fs"] + ": \n" + d1;
-         plt.plot(x_seconds, item["rMB_nor"], marker, label=d11);
-         plt.xlabel(" ");                        # Don't put an x-axis label since it's the top plot
-         plt.ylabel(ylabel1, fontsize=fsize);    # Use a 10 pt font for y-axis label
+         plot_reduced(ax1, x_seconds, item["rMB_nor"], marker, d11);
+         ax1.set_xlabel(" ");                    # Don't put an x-axis label since it's the top plot
+         ax1.set_ylabel(ylabel1, fontsize=fsize);    # Use a 10 pt font for y-axis label
          ax1.set_xticklabels([]);                # get x-axis tick label
          
-         plt.xticks(fontsize=fsize);
-         plt.yticks(fontsize=fsize);
+         ax1.tick_params(axis="x", labelsize=fsize);
+         ax1.tick_params(axis="y", labelsize=fsize);
       # end for
-      plt.grid();
+      ax1.grid();
       # Legend
       box = ax1.get_position()
       ax1.set_position([box.x0, box.y0, box.width * expansion_box, box.height])
-      leg1 = plt.legend(bbox_to_anchor=(1.01, 1), loc=2, borderaxespad=0., labelspacing=0, 
+      leg1 = ax1.legend(bbox_to_anchor=(1.01, 1), loc=2, borderaxespad=0., labelspacing=0, 
                         borderpad=0.15, handletextpad=0.2);
       frame1 = leg1.get_frame();
       frame1.set_facecolor("0.80");           # Make legend box have a gray background
@@ -455,25 +943,25 @@ def plot1(iloop, iplot, combined_plots, f, dirname, x_seconds, iostat_x_seconds,
       
       # Middle Plot:
       jloop = -1;
+      ax2 = fig.add_subplot(312);
       for item in fs_data_list:
          jloop = jloop + 1;
          
          marker = line_list[jloop];
-         ax2 = plt.subplot(312);
          d22 = item["fs"] + ": \n" + d2;
-         plt.plot(x_seconds, item["wMB_nor"], marker, label=d22);
-         plt.xlabel(" ");
-         plt.ylabel(ylabel2, fontsize=fsize);
+         plot_reduced(ax2, x_seconds, item["wMB_nor"], marker, d22);
+         ax2.set_xlabel(" ");
+         ax2.set_ylabel(ylabel2, fontsize=fsize);
          ax2.set_xticklabels([]);
          
-         plt.xticks(fontsize=fsize);
-         plt.yticks(fontsize=fsize);
+         ax2.tick_params(axis="x", labelsize=fsize);
+         ax2.tick_params(axis="y", labelsize=fsize);
       # end for
-      plt.grid();
+      ax2.grid();
       # Legend:
       box = ax2.get_position()
       ax2.set_position([box.x0, box.y0, box.width * expansion_box, box.height])
-      leg2 = plt.legend(bbox_to_anchor=(1.01, 1), loc=2, borderaxespad=0., labelspacing=0, 
+      leg2 = ax2.legend(bbox_to_anchor=(1.01, 1), loc=2, borderaxespad=0., labelspacing=0, 
                         borderpad=0.15, handletextpad=0.2);
       frame2 = leg2.get_frame();
       frame2.set_facecolor("0.80");
@@ -482,16 +970,16 @@ def plot1(iloop, iplot, combined_plots, f, dirname, x_seconds, iostat_x_seconds,
       # end for
       
       # Bottom plot
-      ax3 = plt.subplot(313);
-      plt.plot(iostat_x_seconds, time_sum_list, "go-", label=d3);
-      plt.grid();
-      plt.xlabel(xlabel);
-      plt.ylabel(ylabel3, fontsize=fsize);
+      ax3 = fig.add_subplot(313);
+      plot_reduced(ax3, iostat_x_seconds, time_sum_list, "go-", d3);
+      ax3.grid();
+      ax3.set_xlabel(xlabel);
+      ax3.set_ylabel(ylabel3, fontsize=fsize);
       
       # Legend
       box = ax3.get_position()
       ax3.set_position([box.x0, box.y0, box.width * expansion_box, box.height])
-      leg3 = plt.legend(bbox_to_anchor=(1.01, 1), loc=2, borderaxespad=0., labelspacing=0, 
+      leg3 = ax3.legend(bbox_to_anchor=(1.01, 1), loc=2, borderaxespad=0., labelspacing=0, 
                         borderpad=0.15, handletextpad=0.2);
       frame3 = leg3.get_frame();
       frame3.set_facecolor("0.80");
@@ -499,62 +987,28 @@ def plot1(iloop, iplot, combined_plots, f, dirname, x_seconds, iostat_x_seconds,
          t.set_fontsize(flegsize);
       # end for
       
-      plt.xticks(fontsize=fsize);
-      plt.yticks(fontsize=fsize);
+      ax3.tick_params(axis="x", labelsize=fsize);
+      ax3.tick_params(axis="y", labelsize=fsize);
+      annotate_axes(fig.axes, anomaly_spans(fs_data_list));
       
       # Either save the plot to a file or display it to the screen
-      if (len(filename) == 0):
-         plt.show();
-      else:
-         plt.savefig(filename);
-         plt.close();
-      # end if
+      chart_save(fig, filename);
    # end if
       
-   # HTML Output:
-   output_str = "<center> \n";
-   junk1 = "app_read_write" + str(iloop) + ".png";
-   output_str = output_str + "<img src=\"" + junk1 + "\"> \n";
-   if (combined_plots == 0):
-      output_str = output_str + "<BR><BR><strong>Figure " + str(iplot) + " - App Read and Write Throughput, and Total CPU utilization for FileSystem: " + item["fs"] + "</strong></center><BR><BR> \n";
-   elif (combined_plots == 1):
-      output_str = output_str + "<BR><BR><strong>Figure " + str(iplot) + " - App Read and Write Throughput, and Total CPU utilization </strong></center><BR><BR> \n";
-   # end if
-   output_str = output_str + "<BR><BR> \n";
-   output_str = output_str + "</P> \n \n";
-   f.write(output_str);
+   return image_file(filename);
    
 # end def
 
 
 
 
-def plot1a(iloop, iplot, combined_plots, f, dirname, x_seconds,
+def plot1a(iloop, iplot, combined_plots, dirname, x_seconds,
            fsize, item, fs_data_list, line_list):
    #
    # Figure 1: read(2), write(2) (skip initial data point)
    #   This is when iostat data is not included
    #
-   if (combined_plots == 0):
-      output_str = "<H4> \n"
-      junk1 = "app_read_write" + str(iloop);
-      output_str = output_str + str(iplot) + ". <a id=\"" + junk1 + "\">Application Read and Write Throughput</a>";
-      output_str = output_str + ". Filesystem: " + item["fs"] + " \n";
-      output_str = output_str + "</H4> \n";
-   elif (combined_plots == 1):
-      output_str = "<H3> \n"
-      junk1 = "app_read_write" + str(iloop);
-      output_str = output_str + str(iplot) + ". <a id=\"" + junk1 + "\">Application Read and Write Throughput</a>";
-      output_str = output_str + "</H3> \n";
-   # end if
    
-   output_str = output_str + " \n";
-   output_str = output_str + "<P>This figure plots the read and write throughput from applications \n";
-   output_str = output_str + "using the read(2) and write(2) system call interfaces. You can  find\n";
-   output_str = output_str + "out more about write throughput by simply typing \"man 2 read\"\n";
-   output_str = output_str + "or  \"man 2 write\". The throughput is plotted as a function of time. \n";
-   f.write(output_str);
-
    # make the plot
    ylabel1 = "NFS Client Read \n Throughput (MB/s) \n by apps via read(2)";
    ylabel2 = "NFS Client Write \n Throughput (MB/s) \n by apps via write(2)";
@@ -570,7 +1024,7 @@ def plot1a(iloop, iplot, combined_plots, f, dirname, x_seconds,
       # Compute box_expansion factor:
       box_expansion = 0.90;   # default
       ilongest = 0;
-      for item in fs_data_list:
+      for fs_item in fs_data_list:
          if (len(d1) > ilongest):
             ilongest = len(d1);
          # end if
@@ -582,8 +1036,10 @@ def plot1a(iloop, iplot, combined_plots, f, dirname, x_seconds,
       expansion_box = round(junk1,2);
       
       Two_Chart(x_seconds, item["rMB_nor"], x_seconds, item["wMB_nor"], xlabel, ylabel1,
-                ylabel2, d1, d2, fsize, flegsize, filename, box_expansion);
+                ylabel2, d1, d2, fsize, flegsize, filename, box_expansion,
+                anomaly_spans([item]));
    elif (combined_plots == 1):
+      fig = chart_figure(filename);
       jloop = -1;
       expansion_box = 0.88;   # default
       
@@ -609,25 +1065,25 @@ def plot1a(iloop, iplot, combined_plots, f, dirname, x_seconds,
       expansion_box = round(junk1,2);
       
       # Top plot:
+      ax1 = fig.add_subplot(211);                 # Define top plot using subplot function
       for item in fs_data_list:
          jloop = jloop + 1;
          
          marker = line_list[jloop];
-         ax1 = plt.subplot(211);                 # Define top plot using subplot function
          d11 = item["fs"] + ": \n" + d1;
-         plt.plot(x_seconds, item["rMB_nor"], marker, label=d11);
-         plt.xlabel(" ");                        # Don't put an x-axis label since it's the top plot
-         plt.ylabel(ylabel1, fontsize=fsize);    # Use a 10 pt font for y-axis label
+         plot_reduced(ax1, x_seconds, item["rMB_nor"], marker, d11);
+         ax1.set_xlabel(" ");                    # Don't put an x-axis label since it's the top plot
+         ax1.set_ylabel(ylabel1, fontsize=fsize);    # Use a 10 pt font for y-axis label
          ax1.set_xticklabels([]);                # get x-axis tick label
          
-         plt.xticks(fontsize=fsize);
-         plt.yticks(fontsize=fsize);
+         ax1.tick_params(axis="x", labelsize=fsize);
+         ax1.tick_params(axis="y", labelsize=fsize);
       # end for
-      plt.grid();
+      ax1.grid();
       # Legend
       box = ax1.get_position()
       ax1.set_position([box.x0, box.y0, box.width * expansion_box, box.height])
-      leg1 = plt.legend(bbox_to_anchor=(1.01, 1), loc=2, borderaxespad=0., labelspacing=0, 
+      leg1 = ax1.legend(bbox_to_anchor=(1.01, 1), loc=2, borderaxespad=0., labelspacing=0, 
                         borderpad=0.15, handletextpad=0.2);
       frame1 = leg1.get_frame();
       frame1.set_facecolor("0.80");           # Make legend box have a gray background
@@ -637,25 +1093,25 @@ def plot1a(iloop, iplot, combined_plots, f, dirname, x_seconds,
       
       # Middle Plot:
       jloop = -1;
+      ax2 = fig.add_subplot(212);
       for item in fs_data_list:
          jloop = jloop + 1;
          
          marker = line_list[jloop];
-         ax2 = plt.subplot(212);
          d22 = item["fs"] + ": \n" + d2;
-         plt.plot(x_seconds, item["wMB_nor"], marker, label=d22);
-         plt.xlabel(xlabel);
-         plt.ylabel(ylabel2, fontsize=fsize);
+         plot_reduced(ax2, x_seconds, item["wMB_nor"], marker, d22);
+         ax2.set_xlabel(xlabel);
+         ax2.set_ylabel(ylabel2, fontsize=fsize);
          ax2.set_xticklabels([]);
          
-         plt.xticks(fontsize=fsize);
-         plt.yticks(fontsize=fsize);
+         ax2.tick_params(axis="x", labelsize=fsize);
+         ax2.tick_params(axis="y", labelsize=fsize);
       # end for
-      plt.grid();
+      ax2.grid();
       # Legend:
       box = ax2.get_position()
       ax2.set_position([box.x0, box.y0, box.width * expansion_box, box.height])
-      leg2 = plt.legend(bbox_to_anchor=(1.01, 1), loc=2, borderaxespad=0., labelspacing=0, 
+      leg2 = ax2.legend(bbox_to_anchor=(1.01, 1), loc=2, borderaxespad=0., labelspacing=0, 
                         borderpad=0.15, handletextpad=0.2);
       frame2 = leg2.get_frame();
       frame2.set_facecolor("0.80");
@@ -663,59 +1119,25 @@ def plot1a(iloop, iplot, combined_plots, f, dirname, x_seconds,
          t.set_fontsize(flegsize);
       # end for
       
-      plt.xticks(fontsize=fsize);
-      plt.yticks(fontsize=fsize);
+      ax2.tick_params(axis="x", labelsize=fsize);
+      ax2.tick_params(axis="y", labelsize=fsize);
+      annotate_axes(fig.axes, anomaly_spans(fs_data_list));
       
       # Either save the plot to a file or display it to the screen
-      if (len(filename) == 0):
-         plt.show();
-      else:
-         plt.savefig(filename);
-         plt.close();
-      # end if
+      chart_save(fig, filename);
    # end if
       
-   # HTML Output:
-   output_str = "<center> \n";
-   junk1 = "app_read_write" + str(iloop) + ".png";
-   output_str = output_str + "<img src=\"" + junk1 + "\"> \n";
-   if (combined_plots == 0):
-      output_str = output_str + "<BR><BR><strong>Figure " + str(iplot) + " - App Read and Write Throughput for FileSystem: " + item["fs"] + "</strong></center><BR><BR> \n";
-   elif (combined_plots == 1):
-      output_str = output_str + "<BR><BR><strong>Figure " + str(iplot) + " - App Read and Write Throughput </strong></center><BR><BR> \n";
-   # end if
-   output_str = output_str + "<BR><BR> \n";
-   output_str = output_str + "</P> \n \n";
-   f.write(output_str);
+   return image_file(filename);
    
 # end def
 
 
 
-def plot2(iloop, iplot, combined_plots, f, dirname, x_seconds, iostat_x_seconds,
+def plot2(iloop, iplot, combined_plots, dirname, x_seconds, iostat_x_seconds,
           time_sum_list, fsize, item, fs_data_list, line_list):
    #
    # Figure 2: read, write, total CPU vs. time (DIRECT IO)
    #
-   if (combined_plots == 0):
-      output_str = "<H4> \n"
-      junk1 = "app_read_write_dir" + str(iloop);
-      output_str = output_str + str(iplot) + ". <a id=\"" + junk1 + "\">Application Read and Write Throughput with O_DIRECT, and Total CPU Utilization</a>";
-      output_str = output_str + ". Filesystem: " + item["fs"] + " \n";
-      output_str = output_str + "</H4> \n";
-   elif (combined_plots == 1):
-      output_str = "<H3> \n"
-      junk1 = "app_read_write_dir" + str(iloop);
-      output_str = output_str + str(iplot) + ". <a id=\"" + junk1 + "\">Application Read and Write Throughput with O_DIRECT, and Total CPU Utilization</a>";
-      output_str = output_str + "</H3> \n";
-   # end if
-   
-   output_str = output_str + " \n";
-   output_str = output_str + "<P>This figure plots the read and write throughput in MB/s by the \n";
-   output_str = output_str + "applications that opened the file using the O_DIRECT flag. It \n";
-   output_str = output_str + "also plots the total CPU usage (user + system). The throughput  \n";
-   output_str = output_str + "is plotted as a function of time. \n";
-   f.write(output_str);
    
    # make the plot
    ylabel1 = "Read Throughput (MB/s) \n by apps using O_DIRECT";
@@ -733,7 +1155,7 @@ def plot2(iloop, iplot, combined_plots, f, dirname, x_seconds, iostat_x_seconds,
       box_expansion = 0.90; 
       # Compute expansion_box factor:
       ilongest = 0;
-      for item in fs_data_list:
+      for fs_item in fs_data_list:
          if (len(d1) > ilongest):
             ilongest = len(d1);
          # end if
@@ -749,8 +1171,10 @@ def plot2(iloop, iplot, combined_plots, f, dirname, x_seconds, iostat_x_seconds,
       
       Three_Chart(x_seconds, item["rMB_dir"], x_seconds, item["wMB_dir"],
                   iostat_x_seconds, time_sum_list, xlabel, ylabel1, ylabel2, ylabel3,
-                  d1, d2, d3, fsize, flegsize, filename, box_expansion);
+                  d1, d2, d3, fsize, flegsize, filename, box_expansion,
+                  anomaly_spans([item]));
    elif (combined_plots == 1):
+      fig = chart_figure(filename);
       jloop = -1;
       expansion_box = 0.88;   # default
       
@@ -779,25 +1203,25 @@ def plot2(iloop, iplot, combined_plots, f, dirname, x_seconds, iostat_x_seconds,
       expansion_box = round(junk1,2);
       
       # Top plot:
+      ax1 = fig.add_subplot(311);                 # Define top plot using subplot function
       for item in fs_data_list:
          jloop = jloop + 1;
          
          marker = line_list[jloop];
-         ax1 = plt.subplot(311);                 # Define top plot using subplot function
          d11 = item["fs"] + ": \n" + d1;
-         plt.plot(x_seconds, item["rMB_dir"], marker, label=d11);
-         plt.xlabel(" ");                        # Don't put an x-axis label since it's the top plot
-         plt.ylabel(ylabel1, fontsize=fsize);    # Use a 10 pt font for y-axis label
+         plot_reduced(ax1, x_seconds, item["rMB_dir"], marker, d11);
+         ax1.set_xlabel(" ");                    # Don't put an x-axis label since it's the top plot
+         ax1.set_ylabel(ylabel1, fontsize=fsize);    # Use a 10 pt font for y-axis label
          ax1.set_xticklabels([]);                # get x-axis tick label
          
-         plt.xticks(fontsize=fsize);
-         plt.yticks(fontsize=fsize);
+         ax1.tick_params(axis="x", labelsize=fsize);
+         ax1.tick_params(axis="y", labelsize=fsize);
       # end for
-      plt.grid();
+      ax1.grid();
       # Legend
       box = ax1.get_position()
       ax1.set_position([box.x0, box.y0, box.width * expansion_box, box.height])
-      leg1 = plt.legend(bbox_to_anchor=(1.01, 1), loc=2, borderaxespad=0., labelspacing=0, 
+      leg1 = ax1.legend(bbox_to_anchor=(1.01, 1), loc=2, borderaxespad=0., labelspacing=0, 
                         borderpad=0.15, handletextpad=0.2);
       frame1 = leg1.get_frame();
       frame1.set_facecolor("0.80");           # Make legend box have a gray background
@@ -807,25 +1231,25 @@ def plot2(iloop, iplot, combined_plots, f, dirname, x_seconds, iostat_x_seconds,
       
       # Middle Plot:
       jloop = -1;
+      ax2 = fig.add_subplot(312);
       for item in fs_data_list:
          jloop = jloop + 1;
          
          marker = line_list[jloop];
-         ax2 = plt.subplot(312);
          d22 = item["fs"] + ": \n" + d2;
-         plt.plot(x_seconds, item["wMB_dir"], marker, label=d22);
-         plt.xlabel(" ");
-         plt.ylabel(ylabel2, fontsize=fsize);
+         plot_reduced(ax2, x_seconds, item["wMB_dir"], marker, d22);
+         ax2.set_xlabel(" ");
+         ax2.set_ylabel(ylabel2, fontsize=fsize);
          ax2.set_xticklabels([]);
          
-         plt.xticks(fontsize=fsize);
-         plt.yticks(fontsize=fsize);
+         ax2.tick_params(axis="x", labelsize=fsize);
+         ax2.tick_params(axis="y", labelsize=fsize);
       # end for
-      plt.grid();
+      ax2.grid();
       # Legend:
       box = ax2.get_position()
       ax2.set_position([box.x0, box.y0, box.width * expansion_box, box.height])
-      leg2 = plt.legend(bbox_to_anchor=(1.01, 1), loc=2, borderaxespad=0., labelspacing=0, 
+      leg2 = ax2.legend(bbox_to_anchor=(1.01, 1), loc=2, borderaxespad=0., labelspacing=0, 
                         borderpad=0.15, handletextpad=0.2);
       frame2 = leg2.get_frame();
       frame2.set_facecolor("0.80");
@@ -834,16 +1258,16 @@ def plot2(iloop, iplot, combined_plots, f, dirname, x_seconds, iostat_x_seconds,
       # end for
       
       # Bottom plot
-      ax3 = plt.subplot(313);
-      plt.plot(iostat_x_seconds, time_sum_list, "go-", label=d3);
-      plt.grid();
-      plt.xlabel(xlabel);
-      plt.ylabel(ylabel3, fontsize=fsize);
+      ax3 = fig.add_subplot(313);
+      plot_reduced(ax3, iostat_x_seconds, time_sum_list, "go-", d3);
+      ax3.grid();
+      ax3.set_xlabel(xlabel);
+      ax3.set_ylabel(ylabel3, fontsize=fsize);
       
       # Legend
       box = ax3.get_position()
       ax3.set_position([box.x0, box.y0, box.width * expansion_box, box.height])
-      leg3 = plt.legend(bbox_to_anchor=(1.01, 1), loc=2, borderaxespad=0., labelspacing=0, 
+      leg3 = ax3.legend(bbox_to_anchor=(1.01, 1), loc=2, borderaxespad=0., labelspacing=0, 
                         borderpad=0.15, handletextpad=0.2);
       frame3 = leg3.get_frame();
       frame3.set_facecolor("0.80");
@@ -851,60 +1275,27 @@ def plot2(iloop, iplot, combined_plots, f, dirname, x_seconds, iostat_x_seconds,
          t.set_fontsize(flegsize);
       # end for
       
-      plt.xticks(fontsize=fsize);
-      plt.yticks(fontsize=fsize);
+      ax3.tick_params(axis="x", labelsize=fsize);
+      ax3.tick_params(axis="y", labelsize=fsize);
+      annotate_axes(fig.axes, anomaly_spans(fs_data_list));
       
       # Either save the plot to a file or display it to the screen
-      if (len(filename) == 0):
-         plt.show();
-      else:
-         plt.savefig(filename);
-         plt.close();
-      # end if
+      chart_save(fig, filename);
    # end if
       
-   # HTML Output:
-   output_str = "<center> \n";
-   junk1 = "app_read_write_dir" + str(iloop) + ".png";
-   output_str = output_str + "<img src=\"" + junk1 + "\"> \n";
-   if (combined_plots == 0):
-      output_str = output_str + "<BR><BR><strong>Figure " + str(iplot) + " - App Read and Write Throughput with O_DIRECT, and Total CPU utilization for FileSystem: " + item["fs"] + "</strong></center><BR><BR> \n";
-   elif (combined_plots == 1):
-      output_str = output_str + "<BR><BR><strong>Figure " + str(iplot) + " - App Read and Write Throughput with O_DIRECT, and Total CPU utilization </strong></center><BR><BR> \n";
-   # end if
-   output_str = output_str + "<BR><BR> \n";
-   output_str = output_str + "</P> \n \n";
-   f.write(output_str);
+   return image_file(filename);
    
 # end def
 
 
 
 
-def plot2a(iloop, iplot, combined_plots, f, dirname, x_seconds, fsize, item,
+def plot2a(iloop, iplot, combined_plots, dirname, x_seconds, fsize, item,
            fs_data_list, line_list):
    #
    # Figure 2a: read, write vs. time (DIRECT IO)
    #   No iostat data
    #
-   if (combined_plots == 0):
-      output_str = "<H4> \n"
-      junk1 = "app_read_write_dir" + str(iloop);
-      output_str = output_str + str(iplot) + ". <a id=\"" + junk1 + "\">Application Read and Write Throughput with O_DIRECT</a>";
-      output_str = output_str + ". Filesystem: " + item["fs"] + " \n";
-      output_str = output_str + "</H4> \n";
-   elif (combined_plots == 1):
-      output_str = "<H3> \n"
-      junk1 = "app_read_write_dir" + str(iloop);
-      output_str = output_str + str(iplot) + ". <a id=\"" + junk1 + "\">Application Read and Write Throughput with O_DIRECT</a>";
-      output_str = output_str + "</H3> \n";
-   # end if
-   
-   output_str = output_str + " \n";
-   output_str = output_str + "<P>This figure plots the read and write throughput in MB/s by the \n";
-   output_str = output_str + "applications that opened the file using the O_DIRECT flag. \n";
-   output_str = output_str + "The throughput is plotted as a function of time. \n";
-   f.write(output_str);
    
    # make the plot
    ylabel1 = "Read Throughput (MB/s) \n by apps using O_DIRECT";
@@ -920,7 +1311,7 @@ def plot2a(iloop, iplot, combined_plots, f, dirname, x_seconds, fsize, item,
       box_expansion = 0.90; 
       # Compute expansion_box factor:
       ilongest = 0;
-      for item in fs_data_list:
+      for fs_item in fs_data_list:
          if (len(d1) > ilongest):
             ilongest = len(d1);
          # end if
@@ -933,8 +1324,10 @@ def plot2a(iloop, iplot, combined_plots, f, dirname, x_seconds, fsize, item,
       
       Two_Chart(x_seconds, item["rMB_dir"], x_seconds, item["wMB_dir"],
                 xlabel, ylabel1, ylabel2, d1, d2, fsize, flegsize,
-                filename, box_expansion);
+                filename, box_expansion,
+                anomaly_spans([item]));
    elif (combined_plots == 1):
+      fig = chart_figure(filename);
       jloop = -1;
       expansion_box = 0.88;   # default
       
@@ -960,25 +1353,25 @@ def plot2a(iloop, iplot, combined_plots, f, dirname, x_seconds, fsize, item,
       expansion_box = round(junk1,2);
       
       # Top plot:
+      ax1 = fig.add_subplot(211);                 # Define top plot using subplot function
       for item in fs_data_list:
          jloop = jloop + 1;
          
          marker = line_list[jloop];
-         ax1 = plt.subplot(211);                 # Define top plot using subplot function
          d11 = item["fs"] + ": \n" + d1;
-         plt.plot(x_seconds, item["rMB_dir"], marker, label=d11);
-         plt.xlabel(" ");                        # Don't put an x-axis label since it's the top plot
-         plt.ylabel(ylabel1, fontsize=fsize);    # Use a 10 pt font for y-axis label
+         plot_reduced(ax1, x_seconds, item["rMB_dir"], marker, d11);
+         ax1.set_xlabel(" ");                    # Don't put an x-axis label since it's the top plot
+         ax1.set_ylabel(ylabel1, fontsize=fsize);    # Use a 10 pt font for y-axis label
          ax1.set_xticklabels([]);                # get x-axis tick label
          
-         plt.xticks(fontsize=fsize);
-         plt.yticks(fontsize=fsize);
+         ax1.tick_params(axis="x", labelsize=fsize);
+         ax1.tick_params(axis="y", labelsize=fsize);
       # end for
-      plt.grid();
+      ax1.grid();
       # Legend
       box = ax1.get_position()
       ax1.set_position([box.x0, box.y0, box.width * expansion_box, box.height])
-      leg1 = plt.legend(bbox_to_anchor=(1.01, 1), loc=2, borderaxespad=0., labelspacing=0, 
+      leg1 = ax1.legend(bbox_to_anchor=(1.01, 1), loc=2, borderaxespad=0., labelspacing=0, 
                         borderpad=0.15, handletextpad=0.2);
       frame1 = leg1.get_frame();
       frame1.set_facecolor("0.80");           # Make legend box have a gray background
@@ -988,25 +1381,25 @@ def plot2a(iloop, iplot, combined_plots, f, dirname, x_seconds, fsize, item,
       
       # Middle Plot:
       jloop = -1;
+      ax2 = fig.add_subplot(212);
       for item in fs_data_list:
          jloop = jloop + 1;
          
          marker = line_list[jloop];
-         ax2 = plt.subplot(212);
          d22 = item["fs"] + ": \n" + d2;
-         plt.plot(x_seconds, item["wMB_dir"], marker, label=d22);
-         plt.xlabel(xlabel);
-         plt.ylabel(ylabel2, fontsize=fsize);
+         plot_reduced(ax2, x_seconds, item["wMB_dir"], marker, d22);
+         ax2.set_xlabel(xlabel);
+         ax2.set_ylabel(ylabel2, fontsize=fsize);
          ax2.set_xticklabels([]);
          
-         plt.xticks(fontsize=fsize);
-         plt.yticks(fontsize=fsize);
+         ax2.tick_params(axis="x", labelsize=fsize);
+         ax2.tick_params(axis="y", labelsize=fsize);
       # end for
-      plt.grid();
+      ax2.grid();
       # Legend:
       box = ax2.get_position()
       ax2.set_position([box.x0, box.y0, box.width * expansion_box, box.height])
-      leg2 = plt.legend(bbox_to_anchor=(1.01, 1), loc=2, borderaxespad=0., labelspacing=0, 
+      leg2 = ax2.legend(bbox_to_anchor=(1.01, 1), loc=2, borderaxespad=0., labelspacing=0, 
                         borderpad=0.15, handletextpad=0.2);
       frame2 = leg2.get_frame();
       frame2.set_facecolor("0.80");
@@ -1014,30 +1407,15 @@ def plot2a(iloop, iplot, combined_plots, f, dirname, x_seconds, fsize, item,
          t.set_fontsize(flegsize);
       # end for
       
-      plt.xticks(fontsize=fsize);
-      plt.yticks(fontsize=fsize);
+      ax2.tick_params(axis="x", labelsize=fsize);
+      ax2.tick_params(axis="y", labelsize=fsize);
+      annotate_axes(fig.axes, anomaly_spans(fs_data_list));
       
       # Either save the plot to a file or display it to the screen
-      if (len(filename) == 0):
-         plt.show();
-      else:
-         plt.savefig(filename);
-         plt.close();
-      # end if
+      chart_save(fig, filename);
    # end if
       
-   # HTML Output:
-   output_str = "<center> \n";
-   junk1 = "app_read_write_dir" + str(iloop) + ".png";
-   output_str = output_str + "<img src=\"" + junk1 + "\"> \n";
-   if (combined_plots == 0):
-      output_str = output_str + "<BR><BR><strong>Figure " + str(iplot) + " - App Read and Write Throughput with O_DIRECT for FileSystem: " + item["fs"] + "</strong></center><BR><BR> \n";
-   elif (combined_plots == 1):
-      output_str = output_str + "<BR><BR><strong>Figure " + str(iplot) + " - App Read and Write Throughput with O_DIRECT</strong></center><BR><BR> \n";
-   # end if
-   output_str = output_str + "<BR><BR> \n";
-   output_str = output_str + "</P> \n \n";
-   f.write(output_str);
+   return image_file(filename);
    
 # end def
 
@@ -1046,31 +1424,11 @@ def plot2a(iloop, iplot, combined_plots, f, dirname, x_seconds, fsize, item,
 
 
 
-def plot3(iloop, iplot, combined_plots, f, dirname, x_seconds, iostat_x_seconds,
+def plot3(iloop, iplot, combined_plots, dirname, x_seconds, iostat_x_seconds,
           time_sum_list, fsize, item, fs_data_list, line_list):
    #
    # Figure 3: read, write, total CPU vs. time (NFS READ and NFS WRITE)
    #
-   if (combined_plots == 0):
-      output_str = "<H4> \n"
-      junk1 = "app_read_write_svr" + str(iloop);
-      output_str = output_str + str(iplot) + ". <a id=\"" + junk1 + "\">Application Read and Write using NFS_READ and NFS_WRITE, and Total CPU Utilization</a>";
-      output_str = output_str + ". Filesystem: " + item["fs"] + " \n";
-      output_str = output_str + "</H4> \n";
-   elif (combined_plots == 1):
-      output_str = "<H3> \n"
-      junk1 = "app_read_write_svr" + str(iloop);
-      output_str = output_str + str(iplot) + ". <a id=\"" + junk1 + "\">Application Read and Write using NFS_READ and NFS_WRITE, and Total CPU Utilization</a>";
-      output_str = output_str + "</H3> \n";
-   # end if
-   
-   output_str = output_str + " \n";
-   output_str = output_str + "<P>This figure plots the read and write throughput in MB/s by the \n";
-   output_str = output_str + "applications that read from the server via an NFS READ request \n";
-   output_str = output_str + "or written to server via an NFS WRITE request. It also plots \n";
-   output_str = output_str + "the total CPU usage (user + system). The throughput  is plotted \n";
-   output_str = output_str + "as a function of time. \n";
-   f.write(output_str);
    
    # make the plot
    ylabel1 = "Read Throughput (MB/s) \n by apps using NFS READ";
@@ -1088,7 +1446,7 @@ def plot3(iloop, iplot, combined_plots, f, dirname, x_seconds, iostat_x_seconds,
       box_expansion = 0.90;
       # Compute expansion_box factor:
       ilongest = 0;
-      for item in fs_data_list:
+      for fs_item in fs_data_list:
          if (len(d1) > ilongest):
             ilongest = len(d1);
          # end if
@@ -1104,8 +1462,10 @@ def plot3(iloop, iplot, combined_plots, f, dirname, x_seconds, iostat_x_seconds,
       
       Three_Chart(x_seconds, item["rMB_svr"], x_seconds, item["wMB_svr"],
                   iostat_x_seconds, time_sum_list, xlabel, ylabel1, ylabel2, ylabel3,
-                  d1, d2, d3, fsize, flegsize, filename, box_expansion);
+                  d1, d2, d3, fsize, flegsize, filename, box_expansion,
+                  anomaly_spans([item]));
    elif (combined_plots == 1):
+      fig = chart_figure(filename);
       jloop = -1;
       expansion_box = 0.88;   # default
       
@@ -1134,25 +1494,25 @@ def plot3(iloop, iplot, combined_plots, f, dirname, x_seconds, iostat_x_seconds,
       expansion_box = round(junk1,2);
       
       # Top plot:
+      ax1 = fig.add_subplot(311);                 # Define top plot using subplot function
       for item in fs_data_list:
          jloop = jloop + 1;
          
          marker = line_list[jloop];
-         ax1 = plt.subplot(311);                 # Define top plot using subplot function
          d11 = item["fs"] + ": \n" + d1;
-         plt.plot(x_seconds, item["rMB_svr"], marker, label=d11);
-         plt.xlabel(" ");                        # Don't put an x-axis label since it's the top plot
-         plt.ylabel(ylabel1, fontsize=fsize);    # Use a 10 pt font for y-axis label
+         plot_reduced(ax1, x_seconds, item["rMB_svr"], marker, d11);
+         ax1.set_xlabel(" ");                    # Don't put an x-axis label since it's the top plot
+         ax1.set_ylabel(ylabel1, fontsize=fsize);    # Use a 10 pt font for y-axis label
          ax1.set_xticklabels([]);                # get x-axis tick label
          
-         plt.xticks(fontsize=fsize);
-         plt.yticks(fontsize=fsize);
+         ax1.tick_params(axis="x", labelsize=fsize);
+         ax1.tick_params(axis="y", labelsize=fsize);
       # end for
-      plt.grid();
+      ax1.grid();
       # Legend
       box = ax1.get_position()
       ax1.set_position([box.x0, box.y0, box.width * expansion_box, box.height])
-      leg1 = plt.legend(bbox_to_anchor=(1.01, 1), loc=2, borderaxespad=0., labelspacing=0, 
+      leg1 = ax1.legend(bbox_to_anchor=(1.01, 1), loc=2, borderaxespad=0., labelspacing=0, 
                         borderpad=0.15, handletextpad=0.2);
       frame1 = leg1.get_frame();
       frame1.set_facecolor("0.80");           # Make legend box have a gray background
@@ -1162,25 +1522,25 @@ def plot3(iloop, iplot, combined_plots, f, dirname, x_seconds, iostat_x_seconds,
       
       # Middle Plot:
       jloop = -1;
+      ax2 = fig.add_subplot(312);
       for item in fs_data_list:
          jloop = jloop + 1;
          
          marker = line_list[jloop];
-         ax2 = plt.subplot(312);
          d22 = item["fs"] + ": \n" + d2;
-         plt.plot(x_seconds, item["wMB_svr"], marker, label=d22);
-         plt.xlabel(" ");
-         plt.ylabel(ylabel2, fontsize=fsize);
+         plot_reduced(ax2, x_seconds, item["wMB_svr"], marker, d22);
+         ax2.set_xlabel(" ");
+         ax2.set_ylabel(ylabel2, fontsize=fsize);
          ax2.set_xticklabels([]);
          
-         plt.xticks(fontsize=fsize);
-         plt.yticks(fontsize=fsize);
+         ax2.tick_params(axis="x", labelsize=fsize);
+         ax2.tick_params(axis="y", labelsize=fsize);
       # end for
-      plt.grid();
+      ax2.grid();
       # Legend:
       box = ax2.get_position()
       ax2.set_position([box.x0, box.y0, box.width * expansion_box, box.height])
-      leg2 = plt.legend(bbox_to_anchor=(1.01, 1), loc=2, borderaxespad=0., labelspacing=0, 
+      leg2 = ax2.legend(bbox_to_anchor=(1.01, 1), loc=2, borderaxespad=0., labelspacing=0, 
                         borderpad=0.15, handletextpad=0.2);
       frame2 = leg2.get_frame();
       frame2.set_facecolor("0.80");
@@ -1189,16 +1549,16 @@ def plot3(iloop, iplot, combined_plots, f, dirname, x_seconds, iostat_x_seconds,
       # end for
       
       # Bottom plot
-      ax3 = plt.subplot(313);
-      plt.plot(iostat_x_seconds, time_sum_list, "go-", label=d3);
-      plt.grid();
-      plt.xlabel(xlabel);
-      plt.ylabel(ylabel3, fontsize=fsize);
+      ax3 = fig.add_subplot(313);
+      plot_reduced(ax3, iostat_x_seconds, time_sum_list, "go-", d3);
+      ax3.grid();
+      ax3.set_xlabel(xlabel);
+      ax3.set_ylabel(ylabel3, fontsize=fsize);
       
       # Legend
       box = ax3.get_position()
       ax3.set_position([box.x0, box.y0, box.width * expansion_box, box.height])
-      leg3 = plt.legend(bbox_to_anchor=(1.01, 1), loc=2, borderaxespad=0., labelspacing=0, 
+      leg3 = ax3.legend(bbox_to_anchor=(1.01, 1), loc=2, borderaxespad=0., labelspacing=0, 
                         borderpad=0.15, handletextpad=0.2);
       frame3 = leg3.get_frame();
       frame3.set_facecolor("0.80");
@@ -1206,60 +1566,27 @@ def plot3(iloop, iplot, combined_plots, f, dirname, x_seconds, iostat_x_seconds,
          t.set_fontsize(flegsize);
       # end for
       
-      plt.xticks(fontsize=fsize);
-      plt.yticks(fontsize=fsize);
+      ax3.tick_params(axis="x", labelsize=fsize);
+      ax3.tick_params(axis="y", labelsize=fsize);
+      annotate_axes(fig.axes, anomaly_spans(fs_data_list));
       
       # Either save the plot to a file or display it to the screen
-      if (len(filename) == 0):
-         plt.show();
-      else:
-         plt.savefig(filename);
-         plt.close();
-      # end if
+      chart_save(fig, filename);
    # end if
       
-   # HTML Output:
-   output_str = "<center> \n";
-   junk1 = "app_read_write_svr" + str(iloop) + ".png";
-   output_str = output_str + "<img src=\"" + junk1 + "\"> \n";
-   if (combined_plots == 0):
-      output_str = output_str + "<BR><BR><strong>Figure " + str(iplot) + " - App Read and Write throughput using NFS READ and NFS WRITE, and Total CPU utilization for FileSystem: " + item["fs"] + "</strong></center><BR><BR> \n";
-   elif (combined_plots == 1):
-      output_str = output_str + "<BR><BR><strong>Figure " + str(iplot) + " - App Read and Write throughput using NFS READ and NFS WRITE, and Total CPU utilization </strong></center><BR><BR> \n";
-   # end if
-   output_str = output_str + "<BR><BR> \n";
-   output_str = output_str + "</P> \n \n";
-   f.write(output_str);
+   return image_file(filename);
+   
 # end def
 
 
 
 
 
-def plot3a(iloop, iplot, combined_plots, f, dirname, x_seconds, fsize, item,
+def plot3a(iloop, iplot, combined_plots, dirname, x_seconds, fsize, item,
            fs_data_list, line_list):
    #
    # Figure 3a: read, write vs. time (NFS READ and NFS WRITE)
    #
-   if (combined_plots == 0):
-      output_str = "<H4> \n"
-      junk1 = "app_read_write_svr" + str(iloop);
-      output_str = output_str + str(iplot) + ". <a id=\"" + junk1 + "\">Application Read and Write using NFS_READ and NFS_WRITE</a>";
-      output_str = output_str + ". Filesystem: " + item["fs"] + " \n";
-      output_str = output_str + "</H4> \n";
-   elif (combined_plots == 1):
-      output_str = "<H3> \n"
-      junk1 = "app_read_write_svr" + str(iloop);
-      output_str = output_str + str(iplot) + ". <a id=\"" + junk1 + "\">Application Read and Write using NFS_READ and NFS_WRITE</a>";
-      output_str = output_str + "</H3> \n";
-   # end if
-   
-   output_str = output_str + " \n";
-   output_str = output_str + "<P>This figure plots the read and write throughput in MB/s by the \n";
-   output_str = output_str + "applications that read from the server via an NFS READ request \n";
-   output_str = output_str + "or written to server via an NFS WRITE request. The throughput is \n";
-   output_str = output_str + "plotted as a function of time. \n";
-   f.write(output_str);
    
    # make the plot
    ylabel1 = "Read Throughput (MB/s) \n by apps using NFS READ";
@@ -1275,7 +1602,7 @@ def plot3a(iloop, iplot, combined_plots, f, dirname, x_seconds, fsize, item,
       box_expansion = 0.90;
       # Compute expansion_box factor:
       ilongest = 0;
-      for item in fs_data_list:
+      for fs_item in fs_data_list:
          if (len(d1) > ilongest):
             ilongest = len(d1);
          # end if
@@ -1287,8 +1614,10 @@ def plot3a(iloop, iplot, combined_plots, f, dirname, x_seconds, fsize, item,
       expansion_box = round(junk1,2);
       
       Two_Chart(x_seconds, item["rMB_svr"], x_seconds, item["wMB_svr"], xlabel,
-                ylabel1, ylabel2, d1, d2,  fsize, flegsize, filename, box_expansion);
+                ylabel1, ylabel2, d1, d2,  fsize, flegsize, filename, box_expansion,
+                anomaly_spans([item]));
    elif (combined_plots == 1):
+      fig = chart_figure(filename);
       jloop = -1;
       expansion_box = 0.88;   # default
       
@@ -1314,25 +1643,25 @@ def plot3a(iloop, iplot, combined_plots, f, dirname, x_seconds, fsize, item,
       expansion_box = round(junk1,2);
       
       # Top plot:
+      ax1 = fig.add_subplot(211);                 # Define top plot using subplot function
       for item in fs_data_list:
          jloop = jloop + 1;
          
          marker = line_list[jloop];
-         ax1 = plt.subplot(211);                 # Define top plot using subplot function
          d11 = item["fs"] + ": \n" + d1;
-         plt.plot(x_seconds, item["rMB_svr"], marker, label=d11);
-         plt.xlabel(" ");                        # Don't put an x-axis label since it's the top plot
-         plt.ylabel(ylabel1, fontsize=fsize);    # Use a 10 pt font for y-axis label
+         plot_reduced(ax1, x_seconds, item["rMB_svr"], marker, d11);
+         ax1.set_xlabel(" ");                    # Don't put an x-axis label since it's the top plot
+         ax1.set_ylabel(ylabel1, fontsize=fsize);    # Use a 10 pt font for y-axis label
          ax1.set_xticklabels([]);                # get x-axis tick label
          
-         plt.xticks(fontsize=fsize);
-         plt.yticks(fontsize=fsize);
+         ax1.tick_params(axis="x", labelsize=fsize);
+         ax1.tick_params(axis="y", labelsize=fsize);
       # end for
-      plt.grid();
+      ax1.grid();
       # Legend
       box = ax1.get_position()
       ax1.set_position([box.x0, box.y0, box.width * expansion_box, box.height])
-      leg1 = plt.legend(bbox_to_anchor=(1.01, 1), loc=2, borderaxespad=0., labelspacing=0, 
+      leg1 = ax1.legend(bbox_to_anchor=(1.01, 1), loc=2, borderaxespad=0., labelspacing=0, 
                         borderpad=0.15, handletextpad=0.2);
       frame1 = leg1.get_frame();
       frame1.set_facecolor("0.80");           # Make legend box have a gray background
@@ -1342,25 +1671,25 @@ def plot3a(iloop, iplot, combined_plots, f, dirname, x_seconds, fsize, item,
       
       # Middle Plot:
       jloop = -1;
+      ax2 = fig.add_subplot(212);
       for item in fs_data_list:
          jloop = jloop + 1;
          
          marker = line_list[jloop];
-         ax2 = plt.subplot(212);
          d22 = item["fs"] + ": \n" + d2;
-         plt.plot(x_seconds, item["wMB_svr"], marker, label=d22);
-         plt.xlabel(xlabel);
-         plt.ylabel(ylabel2, fontsize=fsize);
+         plot_reduced(ax2, x_seconds, item["wMB_svr"], marker, d22);
+         ax2.set_xlabel(xlabel);
+         ax2.set_ylabel(ylabel2, fontsize=fsize);
          ax2.set_xticklabels([]);
          
-         plt.xticks(fontsize=fsize);
-         plt.yticks(fontsize=fsize);
+         ax2.tick_params(axis="x", labelsize=fsize);
+         ax2.tick_params(axis="y", labelsize=fsize);
       # end for
-      plt.grid();
+      ax2.grid();
       # Legend:
       box = ax2.get_position()
       ax2.set_position([box.x0, box.y0, box.width * expansion_box, box.height])
-      leg2 = plt.legend(bbox_to_anchor=(1.01, 1), loc=2, borderaxespad=0., labelspacing=0, 
+      leg2 = ax2.legend(bbox_to_anchor=(1.01, 1), loc=2, borderaxespad=0., labelspacing=0, 
                         borderpad=0.15, handletextpad=0.2);
       frame2 = leg2.get_frame();
       frame2.set_facecolor("0.80");
@@ -1368,30 +1697,16 @@ def plot3a(iloop, iplot, combined_plots, f, dirname, x_seconds, fsize, item,
          t.set_fontsize(flegsize);
       # end for
       
-      plt.xticks(fontsize=fsize);
-      plt.yticks(fontsize=fsize);
+      ax2.tick_params(axis="x", labelsize=fsize);
+      ax2.tick_params(axis="y", labelsize=fsize);
+      annotate_axes(fig.axes, anomaly_spans(fs_data_list));
       
       # Either save the plot to a file or display it to the screen
-      if (len(filename) == 0):
-         plt.show();
-      else:
-         plt.savefig(filename);
-         plt.close();
-      # end if
+      chart_save(fig, filename);
    # end if
       
-   # HTML Output:
-   output_str = "<center> \n";
-   junk1 = "app_read_write_svr" + str(iloop) + ".png";
-   output_str = output_str + "<img src=\"" + junk1 + "\"> \n";
-   if (combined_plots == 0):
-      output_str = output_str + "<BR><BR><strong>Figure " + str(iplot) + " - App Read and Write throughput using NFS READ and NFS WRITE for FileSystem: " + item["fs"] + "</strong></center><BR><BR> \n";
-   elif (combined_plots == 1):
-      output_str = output_str + "<BR><BR><strong>Figure " + str(iplot) + " - App Read and Write throughput using NFS READ and NFS WRITE</strong></center><BR><BR> \n";
-   # end if
-   output_str = output_str + "<BR><BR> \n";
-   output_str = output_str + "</P> \n \n";
-   f.write(output_str);
+   return image_file(filename);
+   
 # end def
 
 
@@ -1399,28 +1714,11 @@ def plot3a(iloop, iplot, combined_plots, f, dirname, x_seconds, fsize, item,
 
 
 
-def plot4(iloop, iplot, combined_plots, f, dirname, x_seconds, 
+def plot4(iloop, iplot, combined_plots, dirname, x_seconds, 
           fsize, item, fs_data_list, line_list):
    #
    # Figure 4: ops, read ops, write ops vs. time
    #
-   if (combined_plots == 0):
-      output_str = "<H4> \n"
-      junk1 = "app_ops" + str(iloop);
-      output_str = output_str + str(iplot) + ". <a id=\"" + junk1 + "\">Application Operations/s, Read ops/s, and Write Ops/s</a>";
-      output_str = output_str + ". Filesystem: " + item["fs"] + " \n";
-      output_str = output_str + "</H4> \n";
-   elif (combined_plots == 1):
-      output_str = "<H3> \n"
-      junk1 = "app_ops" + str(iloop);
-      output_str = output_str + str(iplot) + ". <a id=\"" + junk1 + "\">Application Operations/s, Read ops/s, and Write Ops/s</a>";
-      output_str = output_str + "</H3> \n";
-   # end if
-   
-   output_str = output_str + " \n";
-   output_str = output_str + "<P>This figure plots the overall ops/s, read ops/ (Read IOPS), and \n";
-   output_str = output_str + "write ops/s (Write IOPS) versus time.  \n";
-   f.write(output_str);
    
    # make the plot
    ylabel1 = "Ops/s issued \n to Filesystem";
@@ -1438,7 +1736,7 @@ def plot4(iloop, iplot, combined_plots, f, dirname, x_seconds,
       box_expansion = 0.90;
       # Compute expansion_box factor:
       ilongest = 0;
-      for item in fs_data_list:
+      for fs_item in fs_data_list:
          if (len(d1) > ilongest):
             ilongest = len(d1);
          # end if
@@ -1455,8 +1753,10 @@ def plot4(iloop, iplot, combined_plots, f, dirname, x_seconds,
       # HTML Output: (Figure html)
       Three_Chart(x_seconds, item["ops"], x_seconds, item["rops"],
                   x_seconds, item["wops"], xlabel, ylabel1, ylabel2, ylabel3,
-                  d1, d2, d3, fsize, flegsize, filename, box_expansion);
+                  d1, d2, d3, fsize, flegsize, filename, box_expansion,
+                  anomaly_spans([item]));
    elif (combined_plots == 1):
+      fig = chart_figure(filename);
       jloop = -1;
       expansion_box = 0.88;   # default
       
@@ -1489,25 +1789,25 @@ def plot4(iloop, iplot, combined_plots, f, dirname, x_seconds,
       expansion_box = round(junk1,2);
       
       # Top plot:
+      ax1 = fig.add_subplot(311);                 # Define top plot using subplot function
       for item in fs_data_list:
          jloop = jloop + 1;
          
          marker = line_list[jloop];
-         ax1 = plt.subplot(311);                 # Define top plot using subplot function
          d11 = item["fs"] + ": \n" + d1;
-         plt.plot(x_seconds, item["ops"], marker, label=d11);
-         plt.xlabel(" ");                        # Don't put an x-axis label since it's the top plot
-         plt.ylabel(ylabel1, fontsize=fsize);    # Use a 10 pt font for y-axis label
+         plot_reduced(ax1, x_seconds, item["ops"], marker, d11);
+         ax1.set_xlabel(" ");                    # Don't put an x-axis label since it's the top plot
+         ax1.set_ylabel(ylabel1, fontsize=fsize);    # Use a 10 pt font for y-axis label
          ax1.set_xticklabels([]);                # get x-axis tick label
          
-         plt.xticks(fontsize=fsize);
-         plt.yticks(fontsize=fsize);
+         ax1.tick_params(axis="x", labelsize=fsize);
+         ax1.tick_params(axis="y", labelsize=fsize);
       # end for
-      plt.grid();
+      ax1.grid();
       # Legend
       box = ax1.get_position()
       ax1.set_position([box.x0, box.y0, box.width * expansion_box, box.height])
-      leg1 = plt.legend(bbox_to_anchor=(1.01, 1), loc=2, borderaxespad=0., labelspacing=0, 
+      leg1 = ax1.legend(bbox_to_anchor=(1.01, 1), loc=2, borderaxespad=0., labelspacing=0, 
                         borderpad=0.15, handletextpad=0.2);
       frame1 = leg1.get_frame();
       frame1.set_facecolor("0.80");           # Make legend box have a gray background
@@ -1517,25 +1817,25 @@ def plot4(iloop, iplot, combined_plots, f, dirname, x_seconds,
       
       # Middle Plot:
       jloop = -1;
+      ax2 = fig.add_subplot(312);
       for item in fs_data_list:
          jloop = jloop + 1;
          
          marker = line_list[jloop];
-         ax2 = plt.subplot(312);
          d22 = item["fs"] + ": \n" + d2;
-         plt.plot(x_seconds, item["rops"], marker, label=d22);
-         plt.xlabel(" ");
-         plt.ylabel(ylabel2, fontsize=fsize);
+         plot_reduced(ax2, x_seconds, item["rops"], marker, d22);
+         ax2.set_xlabel(" ");
+         ax2.set_ylabel(ylabel2, fontsize=fsize);
          ax2.set_xticklabels([]);
          
-         plt.xticks(fontsize=fsize);
-         plt.yticks(fontsize=fsize);
+         ax2.tick_params(axis="x", labelsize=fsize);
+         ax2.tick_params(axis="y", labelsize=fsize);
       # end for
-      plt.grid();
+      ax2.grid();
       # Legend:
       box = ax2.get_position()
       ax2.set_position([box.x0, box.y0, box.width * expansion_box, box.height])
-      leg2 = plt.legend(bbox_to_anchor=(1.01, 1), loc=2, borderaxespad=0., labelspacing=0, 
+      leg2 = ax2.legend(bbox_to_anchor=(1.01, 1), loc=2, borderaxespad=0., labelspacing=0, 
                         borderpad=0.15, handletextpad=0.2);
       frame2 = leg2.get_frame();
       frame2.set_facecolor("0.80");
@@ -1545,260 +1845,307 @@ def plot4(iloop, iplot, combined_plots, f, dirname, x_seconds,
       
       # Bottom Plot:
       jloop = -1;
+      ax3 = fig.add_subplot(313);
       for item in fs_data_list:
          jloop = jloop + 1;
          
          marker = line_list[jloop];
-         ax3 = plt.subplot(313);
          d33 = item["fs"] + ": \n" + d3;
-         plt.plot(x_seconds, item["wops"], marker, label=d33);
-         plt.xlabel(xlabel);
-         plt.ylabel(ylabel3, fontsize=fsize);
+         plot_reduced(ax3, x_seconds, item["wops"], marker, d33);
+         ax3.set_xlabel(xlabel);
+         ax3.set_ylabel(ylabel3, fontsize=fsize);
          ax3.set_xticklabels([]);
          
-         plt.xticks(fontsize=fsize);
-         plt.yticks(fontsize=fsize);
+         ax3.tick_params(axis="x", labelsize=fsize);
+         ax3.tick_params(axis="y", labelsize=fsize);
       # end for
-      plt.grid();
+      ax3.grid();
       # Legend:
       box = ax3.get_position()
       ax3.set_position([box.x0, box.y0, box.width * expansion_box, box.height])
-      leg3 = plt.legend(bbox_to_anchor=(1.01, 1), loc=2, borderaxespad=0., labelspacing=0, 
+      leg3 = ax3.legend(bbox_to_anchor=(1.01, 1), loc=2, borderaxespad=0., labelspacing=0, 
                         borderpad=0.15, handletextpad=0.2);
       frame3 = leg3.get_frame();
       frame3.set_facecolor("0.80");
       for t in leg3.get_texts():
          t.set_fontsize(flegsize);
       # end for
+      annotate_axes(fig.axes, anomaly_spans(fs_data_list));
       
       # Either save the plot to a file or display it to the screen
-      if (len(filename) == 0):
-         plt.show();
-      else:
-         plt.savefig(filename);
-         plt.close();
-      # end if
+      chart_save(fig, filename);
    # end if
       
-   # HTML Output:
-   output_str = "<center> \n";
-   junk1 = "app_ops" + str(iloop) + ".png";
-   output_str = output_str + "<img src=\"" + junk1 + "\"> \n";
-   if (combined_plots == 0):
-      output_str = output_str + "<BR><BR><strong>Figure " + str(iplot) + " - App Operations/s, Read ops/s, and Write ops/s for FileSystem: " + item["fs"] + "</strong></center><BR><BR> \n";
-   elif (combined_plots == 1):
-      output_str = output_str + "<BR><BR><strong>Figure " + str(iplot) + " - App Operations/s, Read ops/s, and Write ops/s </strong></center><BR><BR> \n";
+   return image_file(filename);
+   
+# end def
+
+
+
+
+def read_lines(input_file, chunk_size=1048576):
+   #
+   # Generator that reads an open file in bounded chunks and yields one
+   # line at a time (without the newline). Only one chunk plus a partial
+   # line is held in memory, no matter how large the capture is.
+   #
+   # input_file = open file object
+   # chunk_size = number of bytes read per call
+   #
+   pending = "";
+   while True:
+      chunk = input_file.read(chunk_size);
+      if (len(chunk) == 0):
+         break;
+      # end if
+      lines = (pending + chunk).split("\n");
+      pending = lines.pop();
+      for line in lines:
+         yield line;
+      # end for
+   # end while
+   if (len(pending) > 0):
+      yield pending;
    # end if
-   output_str = output_str + "<BR><BR> \n";
-   output_str = output_str + "</P> \n \n";
-   f.write(output_str);
    
 # end def
 
 
+def follow_lines(input_file, chunk_size=1048576):
+   #
+   # Like read_lines() but for a file that is still being written: at the
+   # current end of the file it yields None, and the next time it is asked
+   # for a line it continues with whatever was appended. Never ends.
+   #
+   pending = "";
+   while True:
+      chunk = input_file.read(chunk_size);
+      if (len(chunk) == 0):
+         yield None;
+         input_file.seek(input_file.tell());   # clear the EOF condition
+         continue;
+      # end if
+      lines = (pending + chunk).split("\n");
+      pending = lines.pop();
+      for line in lines:
+         yield line;
+      # end for
+   # end while
+   
+# end def
+
 
 
+def split_line(line):
+   #
+   # Tokenize a line of nfsiostat output. The output is plain whitespace
+   # separated text so str.split() is enough; shlex is only used when a
+   # line contains quotes.
+   #
+   if ( ('"' in line) or ("'" in line) ):
+      return shlex.split(line);
+   # end if
+   return line.split();
+   
+# end def
 
 
 
+# Data and figures the report is limited to (see parse_nfsiostat() and
+# select_capture())
+#   mounts = fnmatch patterns of the file systems to keep ([] = all)
+#   start, end = time window in seconds from the first timestamp of the
+#                capture (None = from the start / to the end)
+#   figures = figures to render (keys of figure_choices, [] = all)
+report_select = {"mounts": [], "start": None, "end": None, "figures": []};
 
 
-# ===================
-# Main Python section
-# ===================
 
-if __name__ == '__main__':
-   
-   # Get the command line inputs
-   input_options = sys.argv;
-   combined_plots = 0;
-   help_flag = 0;
-   for item in input_options:
-      item2 = item.lower();
-      if (item2 == "-c"):
-         combined_plots = 1;
-      elif ( (item2[0:2] == "-h") or (item2[0:2] == "-H") ):
-         help_flag = 1;
+def mount_selected(fs, select):
+   #
+   # Returns True if file system fs passes the mount filter of select (see
+   # report_select)
+   #
+   if (len(select["mounts"]) == 0):
+      return True;
+   # end if
+   for pattern in select["mounts"]:
+      if fnmatch.fnmatchcase(fs, pattern):
+         return True;
       # end if
    # end for
-   if (help_flag == 1):
-      help_out();
-      sys.exit();
-   # end if
-   
-   input_filename = input_options[-1];
+   return False;
    
-   print "nfsiostat plotting script (includes iostat data)";
-   print " ";
-   print "input filename: ",input_filename;
-   
-   # Look for pickle file:
-   filename = "./iostat_file.pickle";
-   pickle_success = 0;
-   if os.path.isfile(filename):
-      pickle_success = 1;
+# end def
+
+
+
+# Tokenizer of the data rows of parse_nfsiostat():
+#   "numpy" = rows are kept as text and converted to floats a block of
+#             parse_block_rows at a time by one numpy call (rows_array())
+#   "python" = each row is split and converted on its own
+parse_tokenizer = "numpy";
+parse_block_rows = 8192;
+
+
+
+def rows_array(rows):
+   #
+   # Converts a list of data rows (text) to a (len(rows) x len(fs_fields))
+   # array with one numpy.fromstring() call. If that does not give
+   # len(fs_fields) numbers per row, each row is converted on its own
+   # instead, as fs_append() does (only the first len(fs_fields) values are
+   # used, a short row raises ValueError).
+   #
+   n = len(fs_fields);
+   try:
+      values = numpy.fromstring(" ".join(rows), sep=" ");
+   except ValueError:
+      values = None;                       # newer numpy: malformed text
+   # end try
+   if ( (values is None) or (values.size != n*len(rows)) ):
+      values = numpy.empty( (len(rows), n) );
+      for (i, row) in enumerate(rows):
+         values[i,:] = [float(x) for x in split_line(row)[0:n]];
+      # end for
    # end if
+   return values.reshape(len(rows), n);
    
-   # Read iostat pickle:
-   if (pickle_success > 0):
-      print "Reading iostat_file.pickle";
-      pickle_file = open('iostat_file.pickle', 'r');
-      
-      iostat_dict = pickle.load(pickle_file);
-      
-      # unravel iostat_dict
-      iostat_cpu_data = iostat_dict["cpu_data"];
-      iostat_user_list = iostat_dict["cpu_data"]["user_list"];
-      iostat_nice_list = iostat_dict["cpu_data"]["nice_list"];
-      iostat_system_list = iostat_dict["cpu_data"]["system_list"];
-      iostat_iowait_list = iostat_dict["cpu_data"]["iowait_list"];
-      iostat_steal_list = iostat_dict["cpu_data"]["steal_list"];
-      iostat_idle_list = iostat_dict["cpu_data"]["idle_list"];
-      iostat_cpu_lables = iostat_dict["cpu_data"]["cpu_labels"];
-      iostat_time_sum_list = iostat_dict["cpu_data"]["time_sum_list"];
-      
-      iostat_date_list = iostat_dict["time_data"]["date_list"];
-      iostat_time_list = iostat_dict["time_data"]["time_list"];
-      iostat_meridian_list = iostat_dict["time_data"]["meridian_list"];
-      
-      iostat_x_seconds = iostat_dict["x_seconds"];
-      
-      iostat_kernel = iostat_dict["system_info"]["kernel"];
-      iostat_system_name = iostat_dict["system_info"]["system_name"];
-      iostat_date = iostat_dict["system_info"]["date"];
-      iostat_CPU = iostat_dict["system_info"]["CPU"];
-      iostat_cores = iostat_dict["system_info"]["cores"];
-      
-      iostat_device_data_list = iostat_dict["device_data_list"];
-      
-      # "Total" CPU utilziation (user + system)
-      time_sum_list = [];
-      for i in range(0,len(iostat_user_list)):
-          time_sum_list.append( (iostat_user_list[i] + iostat_system_list[i]) );
-      # end for
-      #print "iostat_device_data_list:",iostat_device_data_list;
-      #print "iostat_device_data_list[iloop]:",iostat_device_data_list[1];
-      #print "iostat_device_data_list[iloop]["r"]:",iostat_device_data_list[1]["r"];
-      #print "total time: ",time_sum_list;
-      
-      pickle_file.close();
-   # end if
-   
-   # Initialize lists that will store data
-   date_list = [];
-   time_list = [];
-   meridian_list = [];
-   
-   # Master dictionary of fs data
-   fs_data_list = [];
-   # List element is dictionary:
-   #   local_dict{"filesystem"} = "file system name"
-   #   local_dict{"rMB_nor"} = [];
-   #   local_dict{"wMB_nor"} = [];
-   #   local_dict{"rMB_dir"} = [];
-   #   local_dict{"wMB_dir"} = [];
-   #   local_dict{"rMB_svr"} = [];
-   #   local_dict{"wMB_svr"} = [];
-   #   local_dict{"ops"} = [];
-   #   local_dict{"rops"} = [];
-   #   local_dict{"wops"} = [];
-   
-   # flags for controlling flow
+# end def
+
+
+
+def parse_nfsiostat(lines, select=None):
+   #
+   # Generator implementing the nfsiostat state machine (iflow_flag) over
+   # an iterable of lines. It yields one record at a time so the caller
+   # never needs the whole capture in memory:
+   #
+   #   ("system", system_info)          - first line (OS, kernel, ...)
+   #   ("time", date, time, meridian)   - timestamp of a section, as in
+   #                                      the file (see convert_timestamps());
+   #                                      meridian is "" on a 24 hour clock
+   #   ("header", labels)               - the "Filesystem:" header line
+   #   ("sample", fs, values)           - data row for file system fs
+   #   ("rows", fs_list, values)        - with parse_tokenizer "numpy", a
+   #                                      block of data rows instead: the
+   #                                      file system of each row and a
+   #                                      (rows x fs_fields) array
+   #   ("idle",)                        - lines is None: no more data yet
+   #                                      (see follow_lines())
+   #
+   # After a data row, a line with a single token is taken as the next
+   # file system of the same section, anything else as the next timestamp.
+   #
+   # select = data to keep (see report_select), or None for everything.
+   #          The data rows of other mounts and of sections outside the
+   #          time window are skipped without being split into tokens, and
+   #          reading stops at the first section after the window.
+   #
    iflow_flag = 1;
-   
-   # Define fixed variables
-   fsize = 8;
-   
-   # loop over lines in input file
-   print " ";
-   print "reading nfsiostat output file ... ";
-   icount = 0;
-   for line in open(input_filename,'r').readlines():
-      currentline = shlex.split(line);
+   temp_fs = "";
+   skip_section = False;
+   skip_row = False;
+   keep_fs = {};
+   first_time = None;
+   bulk = (parse_tokenizer == "numpy");
+   block_fs = [];
+   block_rows = [];
+   for line in lines:
+      if (line is None):
+         if (len(block_rows) > 0):
+            yield ("rows", block_fs, rows_array(block_rows));
+            block_fs = [];
+            block_rows = [];
+         # end if
+         yield ("idle",);
+         continue;
+      # end if
+      if ( skip_row and (iflow_flag == 5) ):
+         # data row (or the end of the section) of a skipped mount
+         iflow_flag = 2;
+         continue;
+      # end if
+      if ( bulk and (iflow_flag == 5) ):
+         # data row (or the end of the section): kept as text and converted
+         # with the rest of its block
+         if (len(line.strip()) > 0):
+            block_fs.append(temp_fs);
+            block_rows.append(line);
+            if (len(block_rows) >= parse_block_rows):
+               yield ("rows", block_fs, rows_array(block_rows));
+               block_fs = [];
+               block_rows = [];
+            # end if
+         # end if
+         iflow_flag = 2;
+         continue;
+      # end if
+      currentline = split_line(line);
       
       if (len(currentline) > 0):
          if (iflow_flag == 5):
             #print "   Reading and Storing fs values";
-            local_fs = temp_fs;
-            if (len(fs_data_list) == 0):
-               #print "      Adding new fs"
-               local_dict = {};
-               local_dict["fs"] = local_fs;
-               local_dict["rMB_nor"]=[float(currentline[0])];
-               local_dict["wMB_nor"]=[float(currentline[1])];
-               local_dict["rMB_dir"]=[float(currentline[2])]; 
-               local_dict["wMB_dir"]=[float(currentline[3])];
-               local_dict["rMB_svr"]=[float(currentline[4])];
-               local_dict["wMB_svr"]=[float(currentline[5])];
-               local_dict["ops"]=[float(currentline[6])];
-               local_dict["rops"]=[float(currentline[7])];
-               local_dict["wops"]=[float(currentline[8])];
-               fs_data_list.append(local_dict);
-            else:
-               # search for file system - add it if not new
-               ifind = 0;
-               for iloop in range(0, len(fs_data_list) ):
-                  item = fs_data_list[iloop];
-                  if (item["fs"] == local_fs):
-                     #print "         adding data to existing fs";
-                     fs_data_list[iloop]["rMB_nor"].append(float(currentline[0]));            
-                     fs_data_list[iloop]["wMB_nor"].append(float(currentline[1]));
-                     fs_data_list[iloop]["rMB_dir"].append(float(currentline[2]));            
-                     fs_data_list[iloop]["wMB_dir"].append(float(currentline[3]));
-                     fs_data_list[iloop]["rMB_svr"].append(float(currentline[4]));            
-                     fs_data_list[iloop]["wMB_svr"].append(float(currentline[5]));
-                     fs_data_list[iloop]["ops"].append(float(currentline[6]));            
-                     fs_data_list[iloop]["rops"].append(float(currentline[7]));
-                     fs_data_list[iloop]["wops"].append(float(currentline[8]));
-                     ifind = 1;
-                  # end if
-               # end
-               if (ifind == 0):
-                  #print "      Adding data to new fs";
-                  local_dict = {};
-                  local_dict["fs"] = temp_fs;
-                  local_dict["rMB_nor"]=[float(currentline[0])];
-                  local_dict["wMB_nor"]=[float(currentline[1])];
-                  local_dict["rMB_dir"]=[float(currentline[2])]; 
-                  local_dict["wMB_dir"]=[float(currentline[3])];
-                  local_dict["rMB_svr"]=[float(currentline[4])];
-                  local_dict["wMB_svr"]=[float(currentline[5])];
-                  local_dict["ops"]=[float(currentline[6])];
-                  local_dict["rops"]=[float(currentline[7])];
-                  local_dict["wops"]=[float(currentline[8])];
-                  fs_data_list.append(local_dict);
-               # end if
-            # end if
+            yield ("sample", temp_fs, currentline);
             iflow_flag = 2;
          elif (iflow_flag == 4):
             #print "   Reading file system";
             temp_fs = currentline[0];
             iflow_flag = 5;
+            if (select is not None):
+               if temp_fs not in keep_fs:
+                  keep_fs[temp_fs] = mount_selected(temp_fs, select);
+               # end if
+               skip_row = skip_section or (not keep_fs[temp_fs]);
+            # end if
          elif (iflow_flag == 3):
             #print "      Reading and storing fs headers";
-            cpu_labels = [];
-            cpu_labels = currentline;
-	    iflow_flag = 4;
+            yield ("header", currentline);
+            iflow_flag = 4;
+            if ( bulk and (len(currentline) != len(fs_fields) + 1) ):
+               # other columns than expected: convert row by row from here
+               if (len(block_rows) > 0):
+                  yield ("rows", block_fs, rows_array(block_rows));
+                  block_fs = [];
+                  block_rows = [];
+               # end if
+               bulk = False;
+            # end if
+         elif ( (iflow_flag == 2) and (len(currentline) == 1) and (len(temp_fs) > 0) ):
+            #print "   Reading next file system in section";
+            temp_fs = currentline[0];
+            iflow_flag = 5;
+            if (select is not None):
+               if temp_fs not in keep_fs:
+                  keep_fs[temp_fs] = mount_selected(temp_fs, select);
+               # end if
+               skip_row = skip_section or (not keep_fs[temp_fs]);
+            # end if
          elif (iflow_flag == 2):
             #print "   Reading time information";
-            date_list.append(currentline[0].replace("/"," "));
-            # if meridian is PM then need to add 12 hours to time_list
-            if (currentline[2] == "PM"):
-               junk1 = currentline[1].replace(":"," ");
-               junk2 = shlex.split(junk1);
-               if ( int(junk2[0]) < 12):
-                  junk3 = int(junk2[0]) + 12;
-               elif (int(junk2[0]) == 12):
-                  junk3 = int(junk2[0]);
+            meridian = "";
+            if (len(currentline) > 2):
+               meridian = currentline[2];
+            # end if
+            if ( (select is not None) and
+                 ((select["start"] is not None) or (select["end"] is not None)) ):
+               seconds = timestamp_seconds(currentline[0], currentline[1], meridian);
+               if (first_time is None):
+                  first_time = seconds;
+               # end if
+               seconds = seconds - first_time;
+               if ( (select["end"] is not None) and (seconds > select["end"]) ):
+                  if (len(block_rows) > 0):
+                     yield ("rows", block_fs, rows_array(block_rows));
+                  # end if
+                  return;
                # end if
-               junk4 = str(junk3) + ":" + junk2[1] + ":" + junk2[2];
-               time_list.append(junk4);
-            else:
-               time_list.append(currentline[1]);
+               skip_section = ( (select["start"] is not None) and (seconds < select["start"]) );
+            # end if
+            if not skip_section:
+               yield ("time", currentline[0], currentline[1], meridian);
             # end if
-            meridian_list.append(currentline[2]);
             iflow_flag = 3;
-            icount = icount + 1;
          elif (iflow_flag == 1):
             #print "   Read system information";
             system_info = {};
@@ -1808,316 +2155,3542 @@ if __name__ == '__main__':
             system_info["date"] = currentline[3];
             system_info["CPU"] = currentline[4];
             system_info["cores"] = currentline[5][1:];
+            yield ("system", system_info);
             iflow_flag = 2;
          # end if
       else:
          #print "   Finished reading section - get ready for next section";
-         if (iflow_flag == 1):
-            iflow_flag = 2;
-         elif (iflow_flag >= 2):
-            iflow_flag = 2;
-         # end if
+         iflow_flag = 2;
       # end if
    # end for
-   print "Finished reading ",icount," data points for ",len(fs_data_list)," NFS mounted file systems.";
-   print "Creating plots and HTML report";
-   
-   # Create time list for x-axis data (need to convert to regular time format)
-   x_seconds = [];
-   for i in range(0,len(date_list)):
-      test2 = shlex.split(date_list[i]);
-      test3 = test2[2] + "-" + test2[0] + "-" + test2[1];
-      
-      junk1 = test3 + " " + time_list[i];
-      ts = time.mktime(time.strptime(junk1, '%Y-%m-%d %H:%M:%S'));
-      if (i == 0):
-         BeginTime = ts;
-         x_seconds.append(0.0);
-      else:
-         x_seconds.append( (ts - BeginTime) );
-      # end if
-   # end of
-   
-   # 
-   # HTML Report initialization
-   #    Write all data files to subdirectory called HTML_REPORT
-   #    File is report.html
-   dirname ="./HTML_REPORT";
-   if not os.path.exists(dirname):
-      os.makedirs(dirname);
+   if (len(block_rows) > 0):
+      yield ("rows", block_fs, rows_array(block_rows));
    # end if
-   html_filename = dirname + '/report.html';
-   f = open(html_filename, 'w')
-   
-   # Print HTML Report header
-   output_str = "<H2>\n";
-   output_str = output_str + "NFSIOSTAT Report for file: " + input_filename + " \n";
-   output_str = output_str + "</H2>\n";
-   output_str = output_str + " \n";
-   
-   # HTML Introduction
-   output_str = "<H3>\n";
-   output_str = output_str + "Introduction \n";
-   output_str = output_str + "</H3> \n \n";
-   output_str = output_str + "<P>This report plots the nfsiostat output contained in file: \n";
-   output_str = output_str + sys.argv[1] + ". The filesystems analyzed are: \n";
-   output_str = output_str + "<UL> \n";
-   for item in fs_data_list:
-      output_str = output_str + "   <LI>" + item["fs"] + " \n";
+   
+# end def
+
+
+
+def fs_new(fs, capacity=1024):
+   #
+   # Creates the data store for one file system. The samples are kept in a
+   # single (len(fs_fields) x capacity) float array that grows by doubling,
+   # instead of one Python list of boxed floats per series.
+   #
+   # fs = file system name
+   # capacity = initial number of samples
+   #
+   local_dict = {};
+   local_dict["fs"] = fs;
+   local_dict["data"] = numpy.empty( (len(fs_fields), capacity) );
+   local_dict["count"] = 0;
+   fs_views(local_dict);
+   return local_dict;
+   
+# end def
+
+
+
+def fs_append(item, currentline):
+   #
+   # Appends one nfsiostat data row (list of tokens) to a file system store
+   #
+   icount = item["count"];
+   data = item["data"];
+   if (icount == data.shape[1]):
+      # full - double the capacity
+      new_data = numpy.empty( (data.shape[0], 2*data.shape[1]) );
+      new_data[:,0:icount] = data[:,0:icount];
+      data = new_data;
+      item["data"] = data;
    # end if
-   if (combined_plots == 0):
-      output_str = output_str + "</UL> \n";
-      output_str = output_str + "For each filesystem there are a series of plots of the output \n";
-      output_str = output_str + "from nfsiostat that was captured. The report is contained in a\n";
-      output_str = output_str + "subdirectory HTML_REPORT. In that directory you will find a \n";
-      output_str = output_str + "file name report.html. Just open that file in a browser \n";
-      output_str = output_str + "and you will see the plots. Please note that all plots are \n";
-      output_str = output_str + "referenced to the beginning time of the nfsiostat run. </P>\n";
-      output_str = output_str + " \n";
-      f.write(output_str);
-   elif(combined_plots == 1):
-      output_str = output_str + "</UL> \n";
-      output_str = output_str + "There are a series of plots from the captured nfsiostat output \n";
-      output_str = output_str + "where all devices are plotted together where possible. \n";
-      output_str = output_str + "The report is contained in a subdirectory HTML_REPORT.\n";
-      output_str = output_str + "In that directory you will find a file name report.html. Just \n";
-      output_str = output_str + "open that file in a browser and you will see the plots. \n";
-      output_str = output_str + "Please note that all plots are referenced to the beginning \n";
-      output_str = output_str + "time of the nfsiostat run. \n";
-      output_str = output_str + "</P>\n";
-      output_str = output_str + " \n";
-      f.write(output_str);
-   # end if
-   
-   
-   # HTML System Output (from iostat):
-   output_str = "<P>NFSiostat outputs a number of basic system parameters when it\n";
-   output_str = output_str + "creates the output. These parameters are listed below. \n";
-   output_str = output_str + "<UL> \n";
-   output_str = output_str + "   <LI>System Name: " + system_info["system_name"] + " \n";
-   output_str = output_str + "   <LI>OS: " + system_info["OS"] + " \n";
-   output_str = output_str + "   <LI>Kernel: " + system_info["kernel"] + " \n";
-   output_str = output_str + "   <LI>Number of Cores " + system_info["cores"] + " \n";
-   output_str = output_str + "   <LI>Core Type " + system_info["CPU"] + " \n";
-   output_str = output_str + "</UL> \n";
-   output_str = output_str + "The nfsiostat run was started on " + system_info["date"] + " at \n";
-   output_str = output_str + time_list[0] + " " + meridian_list[0] + ". \n";
-   output_str = output_str + "</P> \n";
-   f.write(output_str);
-   
-   # HTML hyperlinks
-   if (combined_plots == 0):
-      output_str = "<P>Below are hyperlinks to various plots within the report \n";
-      output_str = output_str + "for each device. \n";
-      output_str = output_str + "<BR><BR> \n";
-      f.write(output_str);
-   elif (combined_plots == 1):
-      output_str = "<P>Below are hyperlinks to various plots within the report \n";
-      output_str = output_str + "where all of the devices are plotted together on each chart. \n";
-      output_str = output_str + "<BR><BR> \n";
-      f.write(output_str);
+   data[:,icount] = [float(x) for x in currentline[0:len(fs_fields)]];
+   item["count"] = icount + 1;
+   
+# end def
+
+
+
+def fs_extend(item, values):
+   #
+   # Appends the rows of values (a (rows x len(fs_fields)) array) to a file
+   # system store
+   #
+   icount = item["count"];
+   data = item["data"];
+   k = values.shape[0];
+   if (icount + k > data.shape[1]):
+      capacity = data.shape[1];
+      while (capacity < icount + k):
+         capacity = 2*capacity;
+      # end while
+      new_data = numpy.empty( (data.shape[0], capacity) );
+      new_data[:,0:icount] = data[:,0:icount];
+      data = new_data;
+      item["data"] = data;
    # end if
-   iloop = -1;
-   plots_per_fs = 4;
-   max_plots = plots_per_fs * len(fs_data_list);
-   if (combined_plots == 0):
-      for item in fs_data_list:
-         iloop = iloop + 1; 
-         output_str = "<strong>" + item["fs"] + "</strong>: \n";
-         junk1 = (iloop)*plots_per_fs+1;
-         output_str = output_str + "<OL start=" + str(junk1) + "> \n";
-         junk1 = "app_read_write" + str(iloop);
-         output_str = output_str + "   <LI><a href=\"#" + junk1 + "\">Application Read and Write Throughput</a> \n";
-         junk1 = "app_read_write_dir" + str(iloop);
-         output_str = output_str + "   <LI><a href=\"#" + junk1 + "\">Application Read and Write Throughput with O_DIRECT</a> \n";
-         junk1 = "app_read_write_svr" + str(iloop);
-         output_str = output_str + "   <LI><a href=\"#" + junk1 + "\">Application Read and Write using NFS_READ and NFS_WRITE</a> \n";
-         junk1 = "app_ops" + str(iloop);
-         output_str = output_str + "   <LI><a href=\"#" + junk1 + "\">Application Operations/s, Read ops/s, and Write Ops/s</a> \n";
-         output_str = output_str + "</OL> \n";
-         output_str = output_str + "</P> \n";
-         output_str = output_str + " \n";
-         f.write(output_str);
-      # end if
-   elif (combined_plots == 1):
-      iloop = 0;
-      iloop = iloop + 1;
-      output_str = "<OL start=" + str(iloop) + "> \n";
-      junk1 = "app_read_write" + str(iloop);
-      output_str = output_str + "   <LI><a href=\"#" + junk1 + "\">Application Read and Write Throughput</a> \n";
-      junk1 = "app_read_write_dir" + str(iloop);
-      output_str = output_str + "   <LI><a href=\"#" + junk1 + "\">Application Read and Write Throughput with O_DIRECT</a> \n";
-      junk1 = "app_read_write_svr" + str(iloop);
-      output_str = output_str + "   <LI><a href=\"#" + junk1 + "\">Application Read and Write using NFS_READ and NFS_WRITE</a> \n";
-      junk1 = "app_ops" + str(iloop);
-      output_str = output_str + "   <LI><a href=\"#" + junk1 + "\">Application Operations/s, Read ops/s, and Write Ops/s</a> \n";
-      output_str = output_str + "</OL> \n";
-      output_str = output_str + "</P> \n";
-      output_str = output_str + " \n";
-      f.write(output_str);
-   # end if
-   
-   
-   # Create array of line colors/styles:
-   # http://matplotlib.org/api/artist_api.html#matplotlib.lines.Line2D.lineStyles
-   # line_style = ['-', '--', '-.'];
-   # line_marker  = ['o', '^', 's', '*', '+', '<', '>', 'v'];
-   color_list = ['b', 'g', 'r', 'c', 'm', 'y', 'k'];
-   line_style = ['o-', '^--', 's-.', '*-', '<--', '>-.', 'v-', 'o--'];
-   line_list = [];
-   for line_type in line_style:
-      for color in color_list:
-         junk2 = color + line_type;
-         line_list.append(junk2);
-      # end for
+   data[:,icount:icount+k] = values.T;
+   item["count"] = icount + k;
+   
+# end def
+
+
+
+def fs_views(item):
+   #
+   # (Re)creates the named series item["rMB_nor"] ... item["wops"] as views
+   # of the filled part of the store. Call after appending and before
+   # plotting.
+   #
+   data = item["data"];
+   icount = item["count"];
+   for k in range(0, len(fs_fields)):
+      item[fs_fields[k]] = data[k,0:icount];
    # end for
    
+# end def
+
+
+def fs_trim(item, n):
+   #
+   # Returns a copy of a file system store whose named series are limited
+   # to the first n samples (the data array itself is shared)
+   #
+   local_dict = dict(item);
+   local_dict["count"] = min(n, item["count"]);
+   fs_views(local_dict);
+   return local_dict;
    
+# end def
+
+
+
+def capture_new():
+   #
+   # Returns an empty dictionary for the data parsed from an nfsiostat
+   # capture:
+   #   capture["system_info"] = dictionary of OS, kernel, system_name, ...
+   #   capture["cpu_labels"] = header labels
+   #   capture["date_list"], capture["time_list"], capture["meridian_list"]
+   #      = one entry per timestamp, as in the file
+   #   capture["start_time"] = time and meridian of the first timestamp
+   #   capture["timestamps"] = seconds since the epoch of each timestamp
+   #      (see capture_timestamps())
+   #   capture["fs_data_list"] = list of file system stores (see fs_new())
+   #   capture["fs_index"] = dictionary of file system name -> store
+   #   capture["rows"] = number of data rows read
+   #   capture["dirty"] = set of file system names that received samples
+   #      (cleared by the caller)
+   #
+   capture = {};
+   capture["system_info"] = {};
+   capture["cpu_labels"] = [];
+   capture["date_list"] = [];
+   capture["time_list"] = [];
+   capture["meridian_list"] = [];
+   capture["start_time"] = "";
+   capture["timestamps"] = numpy.zeros(0);
+   capture["fs_data_list"] = [];
+   capture["fs_index"] = {};
+   capture["rows"] = 0;
+   capture["dirty"] = set();
+   return capture;
    
-   # Actually create the plots!!
-   if (combined_plots == 0):
-      # Loop over each device and create plots and HTML:
-      iloop = -1;
-      iplot = 0;
-      for item in fs_data_list:
-         iloop = iloop + 1;
-         
-         print "File system: ",item["fs"];
-         output_str = "<HR> \n";
-         f.write(output_str);
-         
-         # Figure 1:
-         if (pickle_success > 0):
-            # Figure 1: read(2), write(2), total CPU vs. time
-            fsize = 6;
-            iplot = iplot + 1;
-            plot1(iloop, iplot, combined_plots, f, dirname, x_seconds, iostat_x_seconds,
-                  iostat_time_sum_list, fsize, item, fs_data_list, line_list);
-            print "   Finished Plot ",iplot," of ",max_plots;
-         else:
-            # Figure 1: read(2), write(2) vs. time
-            fsize = 6;
-            iplot = iplot + 1;
-            plot1a(iloop, iplot, combined_plots, f, dirname, x_seconds, fsize, item,
-                   fs_data_list, line_list);
-            print "   Finished Plot ",iplot," of ",max_plots;
-         # end if
-         
-         # Figure 2:
-         if (pickle_success > 0):
-            # Figure 2: read, write, total CPU vs. time using O_DIRECT
-            fsize = 6;
-            iplot = iplot + 1;
-            plot2(iloop, iplot, combined_plots, f, dirname, x_seconds, iostat_x_seconds,
-                  iostat_time_sum_list, fsize, item, fs_data_list, line_list);
-         else:
-            # Figure 2: read, write vs. time using O_DIRECT
-            fsize = 6;
-            iplot = iplot + 1;
-            plot2a(iloop, iplot, combined_plots, f, dirname, x_seconds, fsize, item, 
-                   fs_data_list, line_list);
+# end def
+
+
+
+def capture_add(capture, records):
+   #
+   # Adds the records produced by parse_nfsiostat() to capture. The store
+   # of a file system is found through capture["fs_index"] so the cost
+   # per sample does not depend on the number of mounts. Stops at the end
+   # of records or at an "idle" record, so it can be called again with the
+   # same records generator when more data arrives.
+   #
+   fs_index = capture["fs_index"];
+   dirty = capture["dirty"];
+   nrows = 0;
+   for record in records:
+      if (record[0] == "sample"):
+         item = fs_index.get(record[1]);
+         if (item is None):
+            #print "      Adding data to new fs";
+            item = fs_new(record[1]);
+            fs_index[record[1]] = item;
+            capture["fs_data_list"].append(item);
          # end if
-         print "   Finished Plot ",iplot," of ",max_plots;
-         
-         # Figure 3:
-         if (pickle_success > 0):
-            # Figure 3: read, write, total CPU vs. time using O_DIRECT
-            fsize = 6;
-            iplot = iplot + 1;
-            plot3(iloop, iplot, combined_plots, f, dirname, x_seconds, iostat_x_seconds,
-                  iostat_time_sum_list, fsize, item, fs_data_list, line_list);
-         else:
-            # Figure 3: read, write time using O_DIRECT
-            fsize = 6;
-            iplot = iplot + 1;
-            plot3a(iloop, iplot, combined_plots, f, dirname, x_seconds, fsize, item,
-                   fs_data_list, line_list);
+         fs_append(item, record[2]);
+         dirty.add(record[1]);
+         nrows = nrows + 1;
+      elif (record[0] == "rows"):
+         # Group the rows of the block by file system (in order of first
+         # appearance, as for "sample" records) and append each group at once
+         codes = {};
+         code_list = numpy.array([codes.setdefault(fs, len(codes)) for fs in record[1]]);
+         order = numpy.argsort(code_list, kind="mergesort");
+         bounds = numpy.searchsorted(code_list[order], numpy.arange(len(codes) + 1));
+         for fs in sorted(codes, key=codes.get):
+            item = fs_index.get(fs);
+            if (item is None):
+               item = fs_new(fs);
+               fs_index[fs] = item;
+               capture["fs_data_list"].append(item);
+            # end if
+            code = codes[fs];
+            fs_extend(item, record[2][order[bounds[code]:bounds[code+1]]]);
+            dirty.add(fs);
+         # end for
+         nrows = nrows + len(record[1]);
+      elif (record[0] == "time"):
+         if (len(capture["start_time"]) == 0):
+            capture["start_time"] = record[2] + " " + record[3];
          # end if
-         print "   Finished Plot ",iplot," of ",max_plots;
-         
-         # Figure 4: ops, read ops, write ops vs. time
-         fsize = 6;
-         iplot = iplot + 1;
-         plot4(iloop, iplot, combined_plots, f, dirname, x_seconds,
-               fsize, item, fs_data_list, line_list);
-         print "   Finished Plot ",iplot," of ",max_plots;
-      # end for
-   elif (combined_plots == 1):
-      # For each plot, loop over each device and create plot and HTML:
-      iloop = 1;
-      iplot = 0;
-       
-      output_str = "<HR> \n";
-      f.write(output_str);
-      
-      # Figure 1:
-      if (pickle_success > 0):
-         # Figure 1: read(2), write(2), total CPU vs. time
-         fsize = 6;
-         iplot = iplot + 1;
-         plot1(iloop, iplot, combined_plots, f, dirname, x_seconds, iostat_x_seconds,
-               iostat_time_sum_list, fsize, item, fs_data_list, line_list);
-      else:
-         # Figure 1: read(2), write(2), total CPU vs. time
-         fsize = 6;
-         iplot = iplot + 1;
-         plot1a(iloop, iplot, combined_plots, f, dirname, x_seconds, fsize, item,
-                fs_data_list, line_list);
-      print "   Finished Plot ",iplot," of ",max_plots;
-      
-      # Figure 2:
-      if (pickle_success > 0):
-         # Figure 2: read, write, total CPU vs. time using O_DIRECT
-         fsize = 6;
-         iplot = iplot + 1;
-         plot2(iloop, iplot, combined_plots, f, dirname, x_seconds, iostat_x_seconds,
-               iostat_time_sum_list, fsize, item, fs_data_list, line_list);
-      else:
-         # Figure 2: read, write vs. time using O_DIRECT
-         fsize = 6;
-         iplot = iplot + 1;
-         plot2a(iloop, iplot, combined_plots, f, dirname, x_seconds, fsize, item,
-                fs_data_list, line_list);
-      # end if
-      print "   Finished Plot ",iplot," of ",max_plots;
-      
-      # Figure 3:
-      if (pickle_success > 0):
-         # Figure 3: read, write, total CPU vs. time using O_DIRECT
-         fsize = 6;
-         iplot = iplot + 1;
-         plot3(iloop, iplot, combined_plots, f, dirname, x_seconds, iostat_x_seconds,
-               iostat_time_sum_list, fsize, item, fs_data_list, line_list);
-      else:
-         # Figure 3: read, write vs. time using O_DIRECT
-         fsize = 6;
-         iplot = iplot + 1;
-         plot3a(iloop, iplot, combined_plots, f, dirname, x_seconds, fsize, item,
-                fs_data_list, line_list);
+         capture["date_list"].append(record[1]);
+         capture["time_list"].append(record[2]);
+         capture["meridian_list"].append(record[3]);
+      elif (record[0] == "header"):
+         capture["cpu_labels"] = record[1];
+      elif (record[0] == "system"):
+         capture["system_info"] = record[1];
+      elif (record[0] == "idle"):
+         break;
       # end if
-      print "   Finished Plot ",iplot," of ",max_plots;
-      
-      # Figure 4: ops, read ops, write ops vs. time
-      fsize = 6;
-      iplot = iplot + 1;
-      plot4(iloop, iplot, combined_plots, f, dirname, x_seconds,
-            fsize, item, fs_data_list, line_list);
-      print "   Finished Plot ",iplot," of ",max_plots;
+   # end for
+   capture["rows"] = capture["rows"] + nrows;
+   for item in capture["fs_data_list"]:
+      fs_views(item);
+   # end for
+   return capture;
+   
+# end def
+
+
+
+def read_nfsiostat(input_file):
+   #
+   # Reads an open nfsiostat output file and returns the capture
+   # dictionary (see capture_new())
+   #
+   return capture_add(capture_new(), parse_nfsiostat(read_lines(input_file)));
+   
+# end def
+
+
+# Local time (seconds since the epoch) of (date, hour), filled in by
+# convert_timestamps()
+timestamp_cache = {};
+
+
+
+def convert_timestamps(date_list, time_list, meridian_list):
+   #
+   # Converts the timestamps of a capture to seconds since the epoch (local
+   # time) in one vectorized pass and returns them as a numpy array.
+   #
+   # date_list = dates as "MM/DD/YYYY" (or "MM DD YYYY", or "MM/DD/YY")
+   # time_list = times as "HH:MM:SS"
+   # meridian_list = "AM"/"PM" for each time ("" for a time on the 24 hour
+   #                 clock), or None if all times are on the 24 hour clock
+   #
+   # The start of each distinct (date, hour) is computed once with
+   # time.mktime() and cached; all other work is done on arrays.
+   #
+   n = len(time_list);
+   if (n == 0):
+      return numpy.zeros(0);
    # end if
    
+   # hours, minutes, seconds
+   joined = "".join(time_list).encode("ascii");
+   if (len(joined) == 8*n):
+      # fixed width "HH:MM:SS" - convert the digits directly
+      digits = (numpy.frombuffer(joined, dtype=numpy.uint8).reshape(n, 8) - 48).astype(int);
+      hours = digits[:,0]*10 + digits[:,1];
+      seconds = (digits[:,3]*10 + digits[:,4])*60 + digits[:,6]*10 + digits[:,7];
+   else:
+      fields = numpy.array([t.split(":") for t in time_list], dtype=int);
+      hours = fields[:,0];
+      seconds = fields[:,1]*60 + fields[:,2];
+   # end if
    
-   # Start of Pickling
-   # =================
-   if (pickle_success > 0):
-      # Open file for pickling
-      pickle_file = open('nfsiostat_file.pickle', 'w')
-      
-      # Write list to pickle file
-      pickle.dump(fs_data_list, pickle_file);
-      
-      # Close pickle file
-      pickle_file.close();
+   # 12 hour clock: 12 AM is hour 0 and 1-11 PM are hours 13-23
+   if (meridian_list is not None):
+      meridian = numpy.asarray(meridian_list);
+      twelve = (meridian == "AM") | (meridian == "PM");
+      hours = numpy.where(twelve & (hours == 12), 0, hours);
+      hours = numpy.where(meridian == "PM", hours + 12, hours);
    # end if
-   print "Finished. Please open the document HTML/report.html in a browser.";
+   
+   # dates (captures have very few distinct dates)
+   date_codes = {};
+   codes = numpy.array([date_codes.setdefault(d, len(date_codes)) for d in date_list]);
+   dates = sorted(date_codes, key=date_codes.get);
+   
+   (keys, inverse) = numpy.unique(codes*24 + hours, return_inverse=True);
+   base = numpy.empty(len(keys));
+   for i in range(0, len(keys)):
+      base[i] = hour_start(dates[keys[i] // 24], int(keys[i] % 24));
+   # end for
+   
+   return base[inverse] + seconds;
+   
+# end def
+
+
+
+def hour_start(date, hour):
+   #
+   # Returns the local time (seconds since the epoch) of the start of hour
+   # of date ("MM/DD/YYYY" or "MM DD YYYY"; a two digit year, as in the C
+   # locale, is taken as 20YY), cached in timestamp_cache
+   #
+   if (date, hour) not in timestamp_cache:
+      (month, day, year) = [int(x) for x in date.replace("/"," ").split()];
+      if (year < 100):
+         year = year + 2000;
+      # end if
+      timestamp_cache[(date, hour)] = time.mktime( (year, month, day, hour, 0, 0, 0, 0, -1) );
+   # end if
+   return timestamp_cache[(date, hour)];
+   
+# end def
+
+
+
+def timestamp_seconds(date, time_str, meridian):
+   #
+   # Returns the seconds since the epoch of one timestamp of a capture, as
+   # convert_timestamps() does for all of them
+   #
+   fields = [int(x) for x in time_str.split(":")];
+   hour = fields[0];
+   if ( (hour == 12) and (meridian in ["AM", "PM"]) ):
+      hour = 0;
+   # end if
+   if (meridian == "PM"):
+      hour = hour + 12;
+   # end if
+   return hour_start(date, hour) + fields[1]*60 + fields[2];
+   
+# end def
+
+
+def capture_timestamps(capture):
+   #
+   # Converts the timestamps added to capture since the last call and
+   # appends them to capture["timestamps"]
+   #
+   done = len(capture["timestamps"]);
+   if (len(capture["date_list"]) > done):
+      new_timestamps = convert_timestamps(capture["date_list"][done:],
+                                          capture["time_list"][done:],
+                                          capture["meridian_list"][done:]);
+      capture["timestamps"] = numpy.concatenate( (capture["timestamps"], new_timestamps) );
+   # end if
+   
+# end def
+
+# Version of the parsed-capture cache layout (see save_capture())
+cache_version = 1;
+
+
+
+def capture_key(input_filename):
+   #
+   # Returns a key for the content of a capture file: a SHA-1 of its size,
+   # mtime and all of its data. The file is hashed in 1 MB blocks, which
+   # is still much faster than parsing it, so any change to the capture
+   # gives a new key.
+   #
+   st = os.stat(input_filename);
+   h = hashlib.sha1();
+   h.update( ("%d %r" % (st.st_size, st.st_mtime)).encode("ascii") );
+   input_file = open(input_filename, 'rb');
+   while True:
+      block = input_file.read(1048576);
+      if (len(block) == 0):
+         break;
+      # end if
+      h.update(block);
+   # end while
+   input_file.close();
+   return h.hexdigest();
+   
+# end def
+
+
+
+def cache_prefix(input_filename):
+   #
+   # Returns the name prefix of the cache directories of a capture file:
+   #   <file name>-<SHA-1 of its absolute path (12 digits)>-
+   # Captures with the same file name in different directories have
+   # their own prefix, so they never remove each other's cache.
+   #
+   path = os.path.realpath(input_filename);
+   return (os.path.basename(input_filename) + "-" +
+           hashlib.sha1(path.encode("utf-8")).hexdigest()[0:12] + "-");
+   
+# end def
+
+
+
+def cache_path(cache_dir, input_filename):
+   #
+   # Returns the cache directory of a capture file:
+   #   cache_dir/<cache_prefix()><capture_key()>
+   #
+   return os.path.join(cache_dir, cache_prefix(input_filename) +
+                       capture_key(input_filename));
+   
+# end def
+
+
+
+def replace_dir(temp_path, path):
+   #
+   # Renames directory temp_path to path, replacing path if it exists
+   #
+   if os.path.exists(path):
+      shutil.rmtree(path);
+   # end if
+   os.rename(temp_path, path);
+   
+# end def
+
+
+
+def cache_prune(cache_dir, input_filename, keep):
+   #
+   # Removes the cache directories of earlier versions of a capture file
+   # (same cache_prefix(), see cache_path()), except keep
+   #
+   prefix = cache_prefix(input_filename);
+   name = os.path.basename(keep);
+   for old in os.listdir(cache_dir):
+      if ( old.startswith(prefix) and (old != name) and (len(old) == len(name)) ):
+         shutil.rmtree(os.path.join(cache_dir, old), True);
+      # end if
+   # end for
+   
+# end def
+
+
+
+def save_capture(path, capture):
+   #
+   # Writes a parsed capture to directory path:
+   #   meta.json       - system info, labels, file system names, counts
+   #   timestamps.npy  - capture["timestamps"]
+   #   fs<i>.npy       - data of file system i (one row per fs_fields name)
+   # The directory is written under a temporary name and renamed, so it is
+   # always complete.
+   #
+   meta = {};
+   meta["version"] = cache_version;
+   meta["system_info"] = capture["system_info"];
+   meta["cpu_labels"] = capture["cpu_labels"];
+   meta["start_time"] = capture["start_time"];
+   meta["rows"] = capture["rows"];
+   meta["fs_fields"] = fs_fields;
+   meta["fs"] = [item["fs"] for item in capture["fs_data_list"]];
+   
+   temp_path = path + ".tmp" + str(os.getpid());
+   os.makedirs(temp_path);
+   meta_file = open(os.path.join(temp_path, "meta.json"), 'w');
+   json.dump(meta, meta_file);
+   meta_file.close();
+   numpy.save(os.path.join(temp_path, "timestamps.npy"), capture["timestamps"]);
+   for i in range(0, len(capture["fs_data_list"])):
+      item = capture["fs_data_list"][i];
+      numpy.save(os.path.join(temp_path, "fs" + str(i) + ".npy"),
+                 item["data"][:,0:item["count"]]);
+   # end for
+   
+   replace_dir(temp_path, path);
+   
+# end def
+
+
+
+def load_capture(path):
+   #
+   # Reads a capture written by save_capture(). The arrays are memory
+   # mapped, so only the parts that are plotted are read from disk.
+   # Returns None if there is no (usable) cache at path.
+   #
+   meta_filename = os.path.join(path, "meta.json");
+   if not os.path.isfile(meta_filename):
+      return None;
+   # end if
+   meta_file = open(meta_filename, 'r');
+   meta = json.load(meta_file);
+   meta_file.close();
+   if ( (meta["version"] != cache_version) or (meta["fs_fields"] != fs_fields) ):
+      return None;
+   # end if
+   
+   capture = capture_new();
+   capture["system_info"] = meta["system_info"];
+   capture["cpu_labels"] = meta["cpu_labels"];
+   capture["start_time"] = meta["start_time"];
+   capture["rows"] = meta["rows"];
+   capture["timestamps"] = numpy.load(os.path.join(path, "timestamps.npy"), mmap_mode='r');
+   for i in range(0, len(meta["fs"])):
+      item = {};
+      item["fs"] = meta["fs"][i];
+      item["data"] = numpy.load(os.path.join(path, "fs" + str(i) + ".npy"), mmap_mode='r');
+      item["count"] = item["data"].shape[1];
+      fs_views(item);
+      capture["fs_index"][item["fs"]] = item;
+      capture["fs_data_list"].append(item);
+   # end for
+   return capture;
+   
+# end def
+
+
+
+def iostat_source(pickle_filename):
+   #
+   # Returns the size and mtime of the iostat pickle, stored with the data
+   # converted from it (see save_iostat() and iostat_current())
+   #
+   st = os.stat(pickle_filename);
+   return {"size": st.st_size, "mtime": st.st_mtime};
+   
+# end def
+
+
+
+def iostat_current(path, source):
+   #
+   # Returns 1 if directory path holds iostat data converted (by this
+   # version of the code) from the pickle described by source (see
+   # iostat_source()), else 0
+   #
+   meta_filename = os.path.join(path, "meta.json");
+   if not os.path.isfile(meta_filename):
+      return 0;
+   # end if
+   meta_file = open(meta_filename, 'r');
+   meta = json.load(meta_file);
+   meta_file.close();
+   if ( (meta.get("version") != cache_version) or (meta.get("source") != source) ):
+      return 0;
+   # end if
+   return 1;
+   
+# end def
+
+
+
+def save_iostat(path, iostat_dict, source=None):
+   #
+   # Writes the iostat data of iostat_plotter.py (the dictionary stored in
+   # iostat_file.pickle) to directory path as one .npy file per series so
+   # that it can be memory mapped and read column by column:
+   #   meta.json             - system info, CPU labels, device keys and
+   #                           source (size and mtime of the pickle)
+   #   cpu_<name>.npy        - user_list, nice_list, system_list, ... 
+   #   x_seconds.npy         - iostat time axis
+   #   timestamps.npy        - seconds since the epoch of each sample
+   #   device<i>_<key>.npy   - every list of device i
+   #
+   meta = {};
+   meta["version"] = cache_version;
+   meta["system_info"] = iostat_dict["system_info"];
+   meta["cpu_labels"] = iostat_dict["cpu_data"]["cpu_labels"];
+   meta["devices"] = [];
+   meta["source"] = source;
+   
+   temp_path = path + ".tmp" + str(os.getpid());
+   os.makedirs(temp_path);
+   for (key, value) in iostat_dict["cpu_data"].items():
+      if ( key.endswith("_list") and (key != "cpu_labels") ):
+         numpy.save(os.path.join(temp_path, "cpu_" + key + ".npy"), numpy.asarray(value, dtype=float));
+      # end if
+   # end for
+   numpy.save(os.path.join(temp_path, "x_seconds.npy"),
+              numpy.asarray(iostat_dict["x_seconds"], dtype=float));
+   # iostat_plotter.py stores the time on a 24 hour clock
+   numpy.save(os.path.join(temp_path, "timestamps.npy"),
+              convert_timestamps(iostat_dict["time_data"]["date_list"],
+                                 iostat_dict["time_data"]["time_list"], None));
+   for i in range(0, len(iostat_dict["device_data_list"])):
+      device = {};
+      for (key, value) in iostat_dict["device_data_list"][i].items():
+         if isinstance(value, list):
+            numpy.save(os.path.join(temp_path, "device" + str(i) + "_" + key + ".npy"),
+                       numpy.asarray(value, dtype=float));
+            device[key] = "npy";
+         else:
+            device[key] = value;
+         # end if
+      # end for
+      meta["devices"].append(device);
+   # end for
+   meta_file = open(os.path.join(temp_path, "meta.json"), 'w');
+   json.dump(meta, meta_file);
+   meta_file.close();
+   
+   replace_dir(temp_path, path);
+   
+# end def
+
+
+
+def load_iostat(path):
+   #
+   # Reads the iostat data written by save_iostat(). Only the columns the
+   # plots need are opened (memory mapped) and the total CPU utilization
+   # (user + system) is computed on the arrays. Returns a dictionary:
+   #   iostat["x_seconds"] = iostat time axis
+   #   iostat["timestamps"] = seconds since the epoch of each sample
+   #   iostat["time_sum_list"] = user + system CPU utilization
+   #   iostat["system_info"] = system info of the iostat run
+   #
+   meta_file = open(os.path.join(path, "meta.json"), 'r');
+   meta = json.load(meta_file);
+   meta_file.close();
+   
+   iostat = {};
+   iostat["system_info"] = meta["system_info"];
+   iostat["x_seconds"] = numpy.load(os.path.join(path, "x_seconds.npy"), mmap_mode='r');
+   iostat["timestamps"] = numpy.load(os.path.join(path, "timestamps.npy"), mmap_mode='r');
+   user = numpy.load(os.path.join(path, "cpu_user_list.npy"), mmap_mode='r');
+   system = numpy.load(os.path.join(path, "cpu_system_list.npy"), mmap_mode='r');
+   iostat["time_sum_list"] = user + system;
+   return iostat;
+   
+# end def
+
+
+def align_series(t_src, y_src, t_grid, method, tolerance):
+   #
+   # Resamples the series (t_src, y_src) onto the times t_grid (sorted).
+   # With t_src sorted as well this is a merge (numpy.searchsorted), not a
+   # search per point.
+   #
+   # method = "nearest" (value of the closest source sample) or "linear"
+   #          (linear interpolation between the neighboring samples)
+   # tolerance = grid points farther than this from any source sample get
+   #             NaN
+   #
+   t_src = numpy.asarray(t_src, dtype=float);
+   y_src = numpy.asarray(y_src, dtype=float);
+   n = min(len(t_src), len(y_src));
+   t_src = t_src[0:n];
+   y_src = y_src[0:n];
+   if (n == 0):
+      return numpy.nan * numpy.ones(len(t_grid));
+   # end if
+   if numpy.any(numpy.diff(t_src) < 0.0):
+      # e.g. a capture that runs past midnight without dates
+      order = numpy.argsort(t_src, kind="mergesort");
+      t_src = t_src[order];
+      y_src = y_src[order];
+   # end if
+   
+   right = numpy.clip(numpy.searchsorted(t_src, t_grid), 0, n-1);
+   left = numpy.clip(right - 1, 0, n-1);
+   closer_left = numpy.abs(t_grid - t_src[left]) <= numpy.abs(t_src[right] - t_grid);
+   nearest = numpy.where(closer_left, left, right);
+   if (method == "linear"):
+      values = numpy.interp(t_grid, t_src, y_src);
+   else:
+      values = y_src[nearest];
+   # end if
+   values[numpy.abs(t_src[nearest] - t_grid) > tolerance] = numpy.nan;
+   return values;
+   
+# end def
+
+
+
+def join_iostat(capture, iostat, method, step=0.0):
+   #
+   # Joins the nfsiostat samples of each file system with the iostat total
+   # CPU utilization on a shared time grid, using the absolute timestamps
+   # of both captures. The grid covers the time both captures overlap,
+   # with step seconds between points (default: the median nfsiostat
+   # interval). Returns a dictionary:
+   #   joined["t"] = the grid (seconds since the epoch)
+   #   joined["cpu"] = total CPU utilization on the grid
+   #   joined["records"] = dictionary of file system name -> numpy record
+   #      array with fields "t", "cpu" and the fs_fields, one record per
+   #      grid point
+   #
+   t_nfs = numpy.asarray(capture["timestamps"], dtype=float);
+   t_cpu = numpy.asarray(iostat["timestamps"], dtype=float);
+   joined = {"t": numpy.zeros(0), "cpu": numpy.zeros(0), "records": {}};
+   if ( (len(t_nfs) < 2) or (len(t_cpu) < 2) ):
+      return joined;
+   # end if
+   if (step <= 0.0):
+      step = max(1.0, float(numpy.median(numpy.diff(t_nfs))));
+   # end if
+   start = max(t_nfs[0], t_cpu[0]);
+   end = min(t_nfs[-1], t_cpu[-1]);
+   if (end < start):
+      return joined;
+   # end if
+   
+   t_grid = numpy.arange(start, end + step/2.0, step);
+   joined["t"] = t_grid;
+   joined["cpu"] = align_series(t_cpu, iostat["time_sum_list"], t_grid, method, step);
+   dtype = [("t", float), ("cpu", float)] + [(name, float) for name in fs_fields];
+   for item in capture["fs_data_list"]:
+      records = numpy.empty(len(t_grid), dtype=dtype);
+      records["t"] = t_grid;
+      records["cpu"] = joined["cpu"];
+      t_item = t_nfs[0:item["count"]];
+      for name in fs_fields:
+         records[name] = align_series(t_item, item[name], t_grid, method, step);
+      # end for
+      joined["records"][item["fs"]] = records;
+   # end for
+   return joined;
+   
+# end def
+
+
+
+def correlation_html(joined):
+   #
+   # Returns an HTML section with the correlation coefficient (Pearson)
+   # between the total CPU utilization and each nfsiostat series of each
+   # file system, computed over the joined records
+   #
+   output_list = ["<H3> \n"];
+   output_list.append("Correlation with CPU Utilization \n");
+   output_list.append("</H3> \n \n");
+   output_list.append("<P>The nfsiostat and iostat samples were aligned on a common \n");
+   output_list.append("time grid (" + str(len(joined["t"])) + " points). The table lists the \n");
+   output_list.append("correlation coefficient between the total CPU utilization and each \n");
+   output_list.append("series (1 = rise and fall together, 0 = unrelated). \n");
+   output_list.append("<TABLE BORDER=1> \n");
+   output_list.append("<TR><TH>Filesystem</TH>");
+   for name in fs_fields:
+      output_list.append("<TH>" + name + "</TH>");
+   # end for
+   output_list.append("</TR> \n");
+   for (fs, records) in sorted(joined["records"].items()):
+      output_list.append("<TR><TD>" + fs + "</TD>");
+      for name in fs_fields:
+         valid = ~(numpy.isnan(records["cpu"]) | numpy.isnan(records[name]));
+         x = records["cpu"][valid];
+         y = records[name][valid];
+         if ( (len(x) > 1) and (x.std() > 0.0) and (y.std() > 0.0) ):
+            output_list.append("<TD>%.2f</TD>" % numpy.corrcoef(x, y)[0,1]);
+         else:
+            output_list.append("<TD>-</TD>");
+         # end if
+      # end for
+      output_list.append("</TR> \n");
+   # end for
+   output_list.append("</TABLE> \n");
+   output_list.append("</P> \n");
+   return "".join(output_list);
+   
+# end def
+
+
+
+# Summary statistics (see stats_new()). The quantiles come from a sketch
+# with log-spaced buckets: each quantile is within sketch_accuracy
+# (relative) of the exact value, whatever the number of samples.
+sketch_accuracy = 0.01;
+sketch_gamma = (1.0 + sketch_accuracy) / (1.0 - sketch_accuracy);
+
+# Series whose total (MB/s integrated over time) is the amount of data moved
+stats_total_fields = ["rMB_nor", "wMB_nor", "rMB_dir", "wMB_dir", "rMB_svr", "wMB_svr"];
+
+
+
+def stats_new():
+   #
+   # Returns empty summary statistics of a series. Statistics are updated
+   # with stats_add() one chunk at a time and two of them (of chunks, file
+   # systems or hosts) are combined with stats_merge(). They are plain
+   # dictionaries so they can be written to JSON as they are:
+   #   count, min, max, mean, m2 (sum of squared deviations from mean)
+   #   total = sum of value * interval length
+   #   zero = number of values <= 0
+   #   bins = dictionary of bucket index (a string) -> number of values
+   #          in (gamma**(index-1), gamma**index]
+   #
+   stats = {};
+   stats["count"] = 0;
+   stats["min"] = float("inf");
+   stats["max"] = float("-inf");
+   stats["mean"] = 0.0;
+   stats["m2"] = 0.0;
+   stats["total"] = 0.0;
+   stats["zero"] = 0;
+   stats["bins"] = {};
+   return stats;
+   
+# end def
+
+
+
+def stats_merge(a, b):
+   #
+   # Combines statistics b into a (the moments are merged with the
+   # pairwise formula of Chan et al.) and returns a
+   #
+   n = a["count"] + b["count"];
+   if (b["count"] == 0):
+      return a;
+   # end if
+   delta = b["mean"] - a["mean"];
+   a["mean"] = a["mean"] + delta * b["count"] / n;
+   a["m2"] = a["m2"] + b["m2"] + delta * delta * a["count"] * b["count"] / n;
+   a["count"] = n;
+   a["min"] = min(a["min"], b["min"]);
+   a["max"] = max(a["max"], b["max"]);
+   a["total"] = a["total"] + b["total"];
+   a["zero"] = a["zero"] + b["zero"];
+   for (index, count) in b["bins"].items():
+      a["bins"][index] = a["bins"].get(index, 0) + count;
+   # end for
+   return a;
+   
+# end def
+
+
+
+def stats_add(stats, values, dt):
+   #
+   # Adds a chunk of a series to stats
+   #
+   # values = numpy array of values
+   # dt = numpy array of the interval length (seconds) of each value
+   #
+   if (len(values) == 0):
+      return stats;
+   # end if
+   values = numpy.asarray(values, dtype=numpy.float64);
+   chunk = stats_new();
+   chunk["count"] = len(values);
+   chunk["min"] = float(values.min());
+   chunk["max"] = float(values.max());
+   chunk["mean"] = float(values.mean());
+   chunk["m2"] = float(((values - chunk["mean"])**2).sum());
+   chunk["total"] = float((values * dt).sum());
+   positive = values[values > 0.0];
+   chunk["zero"] = len(values) - len(positive);
+   if (len(positive) > 0):
+      index = numpy.ceil(numpy.log(positive) / numpy.log(sketch_gamma)).astype(numpy.int64);
+      (index, counts) = numpy.unique(index, return_counts=True);
+      for i in range(0, len(index)):
+         chunk["bins"][str(index[i])] = int(counts[i]);
+      # end for
+   # end if
+   return stats_merge(stats, chunk);
+   
+# end def
+
+
+
+def stats_quantile(stats, q):
+   #
+   # Returns quantile q (0 to 1) of the values in stats
+   #
+   if (stats["count"] == 0):
+      return float("nan");
+   # end if
+   rank = q * (stats["count"] - 1);
+   if (rank < stats["zero"]):
+      return stats["min"];
+   # end if
+   seen = stats["zero"];
+   for index in sorted([int(index) for index in stats["bins"]]):
+      seen = seen + stats["bins"][str(index)];
+      if (seen > rank):
+         value = 2.0 * sketch_gamma**index / (sketch_gamma + 1.0);
+         return min(max(value, stats["min"]), stats["max"]);
+      # end if
+   # end for
+   return stats["max"];
+   
+# end def
+
+
+
+def stats_result(stats):
+   #
+   # Returns the dictionary of summary values of stats: min, max, mean,
+   # p50, p95, p99, std and total
+   #
+   result = {};
+   result["count"] = stats["count"];
+   for name in ["min", "max", "mean", "total"]:
+      result[name] = stats[name];
+   # end for
+   result["p50"] = stats_quantile(stats, 0.50);
+   result["p95"] = stats_quantile(stats, 0.95);
+   result["p99"] = stats_quantile(stats, 0.99);
+   result["std"] = 0.0;
+   if (stats["count"] > 0):
+      result["std"] = (stats["m2"] / stats["count"])**0.5;
+   # end if
+   return result;
+   
+# end def
+
+
+
+def summarize_capture(capture, top_n=10, chunk_size=65536):
+   #
+   # Computes the summary statistics of every series of every file system
+   # in a single pass over the column store, chunk_size samples at a time
+   # (so a memory-mapped capture is never read into memory as a whole).
+   # Returns a dictionary:
+   #   summary["fs"] = list of file system names (report order)
+   #   summary["stats"] = dictionary fs -> dictionary series -> stats_new()
+   #   summary["top"] = dictionary fs -> list of the top_n busiest
+   #                    intervals (rMB_svr + wMB_svr), each a list
+   #                    [timestamp, MB/s, ops/s], busiest first
+   #
+   timestamps = capture["timestamps"];
+   dt = numpy.zeros(len(timestamps));
+   if (len(timestamps) > 1):
+      dt[1:] = numpy.diff(timestamps);
+      dt[0] = numpy.median(dt[1:]);
+   # end if
+   
+   summary = {"fs": [], "stats": {}, "top": {}};
+   rMB_svr = fs_fields.index("rMB_svr");
+   wMB_svr = fs_fields.index("wMB_svr");
+   ops = fs_fields.index("ops");
+   for item in capture["fs_data_list"]:
+      n = min(len(timestamps), item["count"]);
+      fs_stats = dict([(name, stats_new()) for name in fs_fields]);
+      top = numpy.zeros((3, 0));
+      for start in range(0, n, chunk_size):
+         stop = min(n, start + chunk_size);
+         data = numpy.asarray(item["data"][:, start:stop], dtype=numpy.float64);
+         for k in range(0, len(fs_fields)):
+            stats_add(fs_stats[fs_fields[k]], data[k], dt[start:stop]);
+         # end for
+         # Keep the busiest top_n of the chunk and the ones kept so far
+         busy = numpy.vstack( (timestamps[start:stop], data[rMB_svr] + data[wMB_svr],
+                               data[ops]) );
+         top = numpy.hstack( (top, busy) );
+         if (top.shape[1] > top_n):
+            top = top[:, numpy.argsort(-top[1], kind="mergesort")[0:top_n]];
+         # end if
+      # end for
+      top = top[:, numpy.argsort(-top[1], kind="mergesort")];
+      summary["fs"].append(item["fs"]);
+      summary["stats"][item["fs"]] = fs_stats;
+      summary["top"][item["fs"]] = top.T.tolist();
+   # end for
+   return summary;
+   
+# end def
+
+
+
+def summary_html(summary):
+   #
+   # Returns an HTML section with the summary statistics of each file
+   # system and its busiest intervals
+   #
+   output_list = ["<H3> \n"];
+   output_list.append("Summary Statistics \n");
+   output_list.append("</H3> \n \n");
+   output_list.append("<P>Statistics of each series (MB/s or ops/s). Total is the amount of \n");
+   output_list.append("data moved (MB). Percentiles are within " + str(100.0 * sketch_accuracy) + "% of the exact \n");
+   output_list.append("value. The busiest intervals are those with the highest NFS read plus \n");
+   output_list.append("write throughput (rMB_svr + wMB_svr). \n");
+   output_list.append("</P> \n");
+   for fs in summary["fs"]:
+      output_list.append("<P><B>" + fs + "</B> \n");
+      output_list.append("<TABLE BORDER=1> \n");
+      output_list.append("<TR><TH>Series</TH><TH>min</TH><TH>max</TH><TH>mean</TH><TH>p50</TH>");
+      output_list.append("<TH>p95</TH><TH>p99</TH><TH>std</TH><TH>Total (MB)</TH></TR> \n");
+      for name in fs_fields:
+         result = stats_result(summary["stats"][fs][name]);
+         output_list.append("<TR><TD>" + name + "</TD>");
+         for key in ["min", "max", "mean", "p50", "p95", "p99", "std"]:
+            output_list.append("<TD>%.2f</TD>" % result[key]);
+         # end for
+         if (name in stats_total_fields):
+            output_list.append("<TD>%.1f</TD></TR> \n" % result["total"]);
+         else:
+            output_list.append("<TD>-</TD></TR> \n");
+         # end if
+      # end for
+      output_list.append("</TABLE> \n");
+      output_list.append("<TABLE BORDER=1> \n");
+      output_list.append("<TR><TH>Busiest intervals</TH><TH>NFS read+write MB/s</TH><TH>ops/s</TH></TR> \n");
+      for (t, mbs, ops) in summary["top"][fs]:
+         output_list.append("<TR><TD>" + time.strftime("%m/%d/%Y %I:%M:%S %p", time.localtime(t)));
+         output_list.append("</TD><TD>%.2f</TD><TD>%.1f</TD></TR> \n" % (mbs, ops));
+      # end for
+      output_list.append("</TABLE> \n");
+      output_list.append("</P> \n");
+   # end for
+   return "".join(output_list);
+   
+# end def
+
+
+
+def write_summary(dirname, summary):
+   #
+   # Writes the summary statistics to dirname/stats.json (everything,
+   # including the sketches, so files of several captures can be merged
+   # with stats_merge()) and dirname/stats.csv (one row per file system
+   # and series)
+   #
+   json_file = open(os.path.join(dirname, "stats.json"), 'w');
+   json.dump(summary, json_file);
+   json_file.close();
+   
+   if (sys.version_info[0] >= 3):
+      csv_file = open(os.path.join(dirname, "stats.csv"), 'w', newline="");
+   else:
+      csv_file = open(os.path.join(dirname, "stats.csv"), 'wb');
+   # end if
+   writer = csv.writer(csv_file);
+   keys = ["count", "min", "max", "mean", "p50", "p95", "p99", "std", "total"];
+   writer.writerow(["filesystem", "series"] + keys);
+   for fs in summary["fs"]:
+      for name in fs_fields:
+         result = stats_result(summary["stats"][fs][name]);
+         writer.writerow([fs, name] + [result[key] for key in keys]);
+      # end for
+   # end for
+   csv_file.close();
+   
+# end def
+
+
+
+# Anomaly detection (see detect_anomalies())
+#   enabled = 0 to turn detection off
+#   window = number of preceding samples a sample is compared with
+#   z = a sample more than z standard deviations above the mean of the
+#       preceding window is a spike
+#   plateau = minimum length (samples) of a saturation plateau
+#   level = a plateau is at or above level * the 99th percentile ...
+#   cv = ... and varies by less than cv * its mean (std / mean)
+anomaly_params = {"enabled": 1, "window": 60, "z": 4.0, "plateau": 30, "level": 0.9,
+                  "cv": 0.05};
+
+# Series the anomaly detection looks at
+anomaly_fields = ["ops", "rMB_svr", "wMB_svr"];
+
+
+
+def rolling_mean_std(y, window):
+   #
+   # Returns (mean, std, count) of the window values preceding each value
+   # of y (y[i-window:i], fewer at the start). Computed from cumulative
+   # sums, so the cost is O(n) whatever the window.
+   #
+   n = len(y);
+   offset = y.mean();
+   y = y - offset;                      # keeps the cumulative sums small
+   c1 = numpy.concatenate( ([0.0], numpy.cumsum(y)) );
+   c2 = numpy.concatenate( ([0.0], numpy.cumsum(y * y)) );
+   i = numpy.arange(n);
+   lo = numpy.maximum(i - window, 0);
+   count = i - lo;
+   safe = numpy.maximum(count, 1);
+   mean = (c1[i] - c1[lo]) / safe;
+   var = numpy.maximum((c2[i] - c2[lo]) / safe - mean * mean, 0.0);
+   return (mean + offset, numpy.sqrt(var), count);
+   
+# end def
+
+
+
+def mask_runs(mask):
+   #
+   # Returns the list of (start, stop) of the runs of True in the boolean
+   # array mask (stop is exclusive)
+   #
+   edges = numpy.diff(numpy.concatenate( ([0], mask.astype(numpy.int8), [0]) ));
+   return list(zip(numpy.nonzero(edges == 1)[0], numpy.nonzero(edges == -1)[0]));
+   
+# end def
+
+
+
+def detect_series(y, params):
+   #
+   # Detects spikes and saturation plateaus in series y. Returns
+   # (spike mask, z-score, plateau mask).
+   #
+   n = len(y);
+   y = numpy.asarray(y, dtype=numpy.float64);
+   window = params["window"];
+   spike = numpy.zeros(n, dtype=bool);
+   plateau = numpy.zeros(n, dtype=bool);
+   score = numpy.zeros(n);
+   if (n < 2):
+      return (spike, score, plateau);
+   # end if
+   high = numpy.percentile(y, 99.0);
+   
+   # Spikes: rolling z-score against the preceding window. A floor on the
+   # standard deviation keeps a flat series (e.g. idle at 0) from turning
+   # every small blip into a spike.
+   (mean, std, count) = rolling_mean_std(y, window);
+   score = (y - mean) / numpy.maximum(std, 0.01 * max(high, 1e-6));
+   spike = (score > params["z"]) & (count >= window // 2);
+   
+   # Saturation: windows of plateau samples that stay close to the top of
+   # the range. The samples of every such window are marked with a
+   # difference array, so overlapping windows cost nothing extra.
+   w = params["plateau"];
+   if ( (n >= w) and (high > 0.0) ):
+      (mean, std, count) = rolling_mean_std(numpy.append(y, 0.0), w);
+      mean = mean[w:];                  # window y[i-w:i] for i = w .. n
+      std = std[w:];
+      flat = (mean >= params["level"] * high) & (std <= params["cv"] * mean);
+      ends = numpy.nonzero(flat)[0] + w;
+      marks = numpy.zeros(n + 1, dtype=numpy.int64);
+      numpy.add.at(marks, ends - w, 1);
+      numpy.add.at(marks, ends, -1);
+      plateau = numpy.cumsum(marks[0:n]) > 0;
+   # end if
+   return (spike, score, plateau);
+   
+# end def
+
+
+
+def detect_anomalies(capture, x_seconds, params=anomaly_params):
+   #
+   # Looks for spikes and saturation plateaus in the anomaly_fields series
+   # of every file system. Returns a dictionary of file system name ->
+   # list of regions, each a dictionary:
+   #   kind = "spike" or "saturation"
+   #   series = name of the series
+   #   start, stop = sample range (stop is exclusive)
+   #   x0, x1 = range on the x_seconds axis (for the figures)
+   #   t0 = timestamp of the first sample
+   #   peak = largest value in the region
+   #   z = largest z-score in the region (spikes)
+   #
+   anomalies = {};
+   if (params["enabled"] == 0):
+      return anomalies;
+   # end if
+   half = 0.5;
+   if (len(x_seconds) > 1):
+      half = 0.5 * numpy.median(numpy.diff(x_seconds));
+   # end if
+   for item in capture["fs_data_list"]:
+      n = min(len(x_seconds), item["count"]);
+      regions = [];
+      for name in anomaly_fields:
+         y = numpy.asarray(item[name][0:n], dtype=numpy.float64);
+         (spike, score, plateau) = detect_series(y, params);
+         for (kind, mask) in [("spike", spike), ("saturation", plateau)]:
+            for (start, stop) in mask_runs(mask):
+               region = {};
+               region["kind"] = kind;
+               region["series"] = name;
+               region["start"] = int(start);
+               region["stop"] = int(stop);
+               region["x0"] = float(x_seconds[start] - half);
+               region["x1"] = float(x_seconds[stop-1] + half);
+               region["t0"] = float(capture["timestamps"][start]);
+               region["peak"] = float(y[start:stop].max());
+               region["z"] = float(score[start:stop].max());
+               regions.append(region);
+            # end for
+         # end for
+      # end for
+      regions.sort(key=lambda region: region["start"]);
+      anomalies[item["fs"]] = regions;
+   # end for
+   return anomalies;
+   
+# end def
+
+
+
+def anomaly_html(anomalies, max_rows=100):
+   #
+   # Returns an HTML section listing the regions found by
+   # detect_anomalies() (at most max_rows, the strongest spikes and longest
+   # plateaus first)
+   #
+   rows = [];
+   for (fs, regions) in sorted(anomalies.items()):
+      for region in regions:
+         rows.append( (fs, region) );
+      # end for
+   # end for
+   output_list = ["<H3> \n"];
+   output_list.append("Anomalies \n");
+   output_list.append("</H3> \n \n");
+   output_list.append("<P>Spikes are samples of ops/s, rMB_svr or wMB_svr more than ");
+   output_list.append(str(anomaly_params["z"]) + " standard \n");
+   output_list.append("deviations above the mean of the preceding " + str(anomaly_params["window"]));
+   output_list.append(" samples (shaded red in the figures). \n");
+   output_list.append("Saturation marks at least " + str(anomaly_params["plateau"]) + " samples that stay ");
+   output_list.append("flat near the top of the series \n");
+   output_list.append("(shaded orange), which often means a link, server or client limit was reached. \n");
+   if (len(rows) == 0):
+      output_list.append("None were found. \n");
+      output_list.append("</P> \n");
+      return "".join(output_list);
+   # end if
+   if (len(rows) > max_rows):
+      output_list.append("Only the " + str(max_rows) + " strongest of " + str(len(rows)));
+      output_list.append(" regions are listed. \n");
+      rows.sort(key=lambda row: -max(row[1]["z"], row[1]["stop"] - row[1]["start"]));
+      rows = sorted(rows[0:max_rows], key=lambda row: (row[0], row[1]["start"]));
+   # end if
+   output_list.append("<TABLE BORDER=1> \n");
+   output_list.append("<TR><TH>Filesystem</TH><TH>Kind</TH><TH>Series</TH><TH>Start</TH>");
+   output_list.append("<TH>Samples</TH><TH>Peak</TH><TH>z</TH></TR> \n");
+   for (fs, region) in rows:
+      output_list.append("<TR><TD>" + fs + "</TD><TD>" + region["kind"] + "</TD><TD>");
+      output_list.append(region["series"] + "</TD><TD>");
+      output_list.append(time.strftime("%m/%d/%Y %I:%M:%S %p", time.localtime(region["t0"])));
+      output_list.append("</TD><TD>%d</TD><TD>%.2f</TD>" % (region["stop"] - region["start"],
+                   region["peak"]));
+      if (region["kind"] == "spike"):
+         output_list.append("<TD>%.1f</TD></TR> \n" % region["z"]);
+      else:
+         output_list.append("<TD>-</TD></TR> \n");
+      # end if
+   # end for
+   output_list.append("</TABLE> \n");
+   output_list.append("</P> \n");
+   return "".join(output_list);
+   
+# end def
+
+
+
+def select_active(select):
+   #
+   # Returns True if select (see report_select) leaves out any data
+   #
+   return ( (select is not None) and ( (len(select["mounts"]) > 0) or
+            (select["start"] is not None) or (select["end"] is not None) ) );
+   
+# end def
+
+
+
+def select_capture(capture, select):
+   #
+   # Returns the part of a complete capture (e.g. from load_capture())
+   # that passes the mount filter and time window of select, the way
+   # parse_nfsiostat() would have read it. The arrays are sliced, not
+   # copied.
+   #
+   timestamps = capture["timestamps"];
+   i0 = 0;
+   i1 = len(timestamps);
+   if (len(timestamps) > 0):
+      offsets = timestamps - timestamps[0];
+      if (select["start"] is not None):
+         i0 = int(numpy.searchsorted(offsets, select["start"], side="left"));
+      # end if
+      if (select["end"] is not None):
+         i1 = int(numpy.searchsorted(offsets, select["end"], side="right"));
+      # end if
+      i1 = max(i0, i1);
+   # end if
+   
+   selected = dict(capture);
+   selected["timestamps"] = timestamps[i0:i1];
+   if ( (i0 > 0) and (i0 < len(timestamps)) ):
+      selected["start_time"] = time.strftime("%I:%M:%S %p", time.localtime(timestamps[i0]));
+   # end if
+   selected["fs_data_list"] = [];
+   selected["fs_index"] = {};
+   selected["rows"] = 0;
+   for item in capture["fs_data_list"]:
+      if mount_selected(item["fs"], select):
+         new_item = {"fs": item["fs"]};
+         new_item["data"] = item["data"][:, i0:min(i1, item["count"])];
+         new_item["count"] = new_item["data"].shape[1];
+         fs_views(new_item);
+         selected["fs_data_list"].append(new_item);
+         selected["fs_index"][item["fs"]] = new_item;
+         selected["rows"] = selected["rows"] + new_item["count"];
+      # end if
+   # end for
+   return selected;
+   
+# end def
+
+
+
+def load_or_parse(input_filename, cache_dir, use_cache, select=None):
+   #
+   # Returns the capture of input_filename: the parsed data of an earlier
+   # run on the same capture if cache_dir has it (and use_cache == 1),
+   # otherwise the records of the input file (streamed in bounded chunks),
+   # which are then saved in cache_dir for the next run. input_filename
+   # "-" reads standard input (never cached), and a directory is read as a
+   # capture written by save_capture().
+   #
+   # select = data to keep (see report_select). Without a cache only the
+   #          selected data is parsed, and it is not saved in cache_dir as
+   #          it is not the whole capture.
+   #
+   if (input_filename == "-"):
+      use_cache = 0;
+   # end if
+   if not select_active(select):
+      select = None;
+   # end if
+   if os.path.isdir(input_filename):
+      # a capture directory written by save_capture() (e.g. by --collect)
+      capture = load_capture(input_filename);
+      if (capture is None):
+         raise IOError("no nfsiostat capture in directory " + input_filename);
+      # end if
+      print("reading capture directory ",input_filename);
+      if (select is not None):
+         capture = select_capture(capture, select);
+      # end if
+      return capture;
+   # end if
+   capture = None;
+   if (use_cache == 1):
+      capture_cache = cache_path(cache_dir, input_filename);
+      capture = load_capture(capture_cache);
+   # end if
+   if (capture is not None):
+      print("reading parsed data from ",capture_cache);
+      if (select is not None):
+         capture = select_capture(capture, select);
+      # end if
+      return capture;
+   # end if
+   
+   print("reading nfsiostat output file ... ");
+   read_start = time.time();
+   if (input_filename == "-"):
+      capture = capture_add(capture_new(), parse_nfsiostat(read_lines(sys.stdin), select));
+   else:
+      input_file = open(input_filename,'r');
+      capture = capture_add(capture_new(), parse_nfsiostat(read_lines(input_file), select));
+      input_file.close();
+   # end if
+   capture_timestamps(capture);
+   read_time = time.time() - read_start;
+   if (read_time > 0.0):
+      print("Parsed %d rows in %.2f s (%.0f rows/s), peak RSS %.1f MB" % (capture["rows"],
+            read_time, capture["rows"] / read_time, peak_rss_mb()));
+   # end if
+   if (select is not None):
+      print("Only the selected mounts and time window were parsed (not cached)");
+      use_cache = 0;
+   # end if
+   if (use_cache == 1):
+      if not os.path.exists(cache_dir):
+         os.makedirs(cache_dir);
+      # end if
+      save_capture(capture_cache, capture);
+      cache_prune(cache_dir, input_filename, capture_cache);
+   # end if
+   return capture;
+   
+# end def
+
+
+
+# Counters of one NFS mount in /proc/self/mountstats that the fs_fields
+# rates are computed from (see read_mountstats()), in fs_fields order:
+#   bytes: normal, O_DIRECT and server (NFS READ/WRITE) read and write bytes
+#   xprt: RPC requests sent (ops/s)
+#   READ:, WRITE: number of READ and WRITE operations (rops/s, wops/s)
+mountstats_counters = ["normalreadbytes", "normalwritebytes", "directreadbytes",
+                       "directwritebytes", "serverreadbytes", "serverwritebytes",
+                       "rpcsends", "readops", "writeops"];
+
+# Per-second rate of each counter: bytes are reported in MB (as with
+# "nfsiostat -m"), operations as they are
+mountstats_scale = numpy.array([1.0/1048576.0]*6 + [1.0]*3);
+
+
+
+def read_mountstats(mountstats_file):
+   #
+   # Reads a /proc/self/mountstats snapshot (open file) and returns a
+   # dictionary of NFS device ("server:/export", the nfsiostat file system
+   # name) -> numpy array of its mountstats_counters. Other file systems
+   # and further mounts of the same device are ignored.
+   #
+   counters = {};
+   current = None;
+   for line in read_lines(mountstats_file):
+      tokens = line.split();
+      if (len(tokens) == 0):
+         continue;
+      # end if
+      if (tokens[0] == "device"):
+         current = None;
+         if ( ("fstype" in tokens) and (tokens.index("fstype") + 1 < len(tokens)) ):
+            fstype = tokens[tokens.index("fstype") + 1];
+            if ( fstype.startswith("nfs") and (tokens[1] not in counters) ):
+               current = numpy.zeros(len(mountstats_counters));
+               counters[tokens[1]] = current;
+            # end if
+         # end if
+      elif (current is None):
+         continue;
+      elif ( (tokens[0] == "bytes:") and (len(tokens) >= 7) ):
+         current[0:6] = [float(x) for x in tokens[1:7]];
+      elif ( (tokens[0] == "xprt:") and (len(tokens) >= 5) ):
+         # udp: xprt: udp port bind_count sends ...
+         # tcp/rdma: xprt: tcp port bind_count connect_count connect_time idle_time sends ...
+         # (several xprt lines with nconnect: add them up)
+         if (tokens[1] == "udp"):
+            current[6] = current[6] + float(tokens[4]);
+         elif (len(tokens) >= 8):
+            current[6] = current[6] + float(tokens[7]);
+         # end if
+      elif ( (tokens[0] == "READ:") and (len(tokens) >= 2) ):
+         current[7] = float(tokens[1]);
+      elif ( (tokens[0] == "WRITE:") and (len(tokens) >= 2) ):
+         current[8] = float(tokens[1]);
+      # end if
+   # end for
+   return counters;
+   
+# end def
+
+
+
+def mountstats_snapshots(source, interval, count):
+   #
+   # Generator of (time, counters) of successive mountstats snapshots (see
+   # read_mountstats()):
+   #   source = /proc/self/mountstats (or another file), read every
+   #            interval seconds, count times (0 = until interrupted)
+   #   source = a directory of recorded snapshots, e.g. made with
+   #            "cat /proc/self/mountstats > snap.$(date +%s)", read in
+   #            name order with the file time as the sample time
+   #
+   if os.path.isdir(source):
+      names = sorted([name for name in os.listdir(source) if not name.startswith(".")]);
+      if (count > 0):
+         names = names[0:count];
+      # end if
+      for name in names:
+         filename = os.path.join(source, name);
+         snapshot_file = open(filename, 'r');
+         counters = read_mountstats(snapshot_file);
+         snapshot_file.close();
+         yield (os.path.getmtime(filename), counters);
+      # end for
+      return;
+   # end if
+   
+   start = time.time();
+   i = 0;
+   while ( (count == 0) or (i < count) ):
+      # sleep to the next multiple of interval, so the samples do not drift
+      delay = start + i*interval - time.time();
+      if (delay > 0.0):
+         time.sleep(delay);
+      # end if
+      sample_time = time.time();
+      snapshot_file = open(source, 'r');
+      counters = read_mountstats(snapshot_file);
+      snapshot_file.close();
+      yield (sample_time, counters);
+      i = i + 1;
+   # end while
+   
+# end def
+
+
+
+def collect_mountstats(source, interval, count):
+   #
+   # Native collector: samples mountstats (see mountstats_snapshots()) and
+   # returns a capture (see capture_new()) with the same series as the
+   # nfsiostat text output, computed from the counter differences between
+   # snapshots, without writing or parsing any text. The first snapshot
+   # is the reference, so count snapshots give count-1 samples. A mount
+   # that is not in a snapshot gets zeros, so all file systems have a
+   # sample at every timestamp. Stops early on Ctrl-C.
+   #
+   # source = see mountstats_snapshots()
+   # interval = seconds between snapshots
+   # count = number of snapshots (0 = until interrupted)
+   #
+   uname = os.uname();
+   cores = 1;
+   if (multiprocessing_success == 1):
+      cores = multiprocessing.cpu_count();
+   # end if
+   capture = capture_new();
+   capture["system_info"] = {"OS": uname[0], "kernel": uname[2], "system_name": uname[1],
+                             "date": time.strftime("%m/%d/%Y"), "CPU": "_" + uname[4] + "_",
+                             "cores": str(cores)};
+   capture["cpu_labels"] = ["Filesystem:"] + [name + "/s" for name in fs_fields];
+   fs_index = capture["fs_index"];
+   timestamps = [];
+   zeros = numpy.zeros(len(fs_fields));
+   
+   previous = None;
+   snapshots = mountstats_snapshots(source, interval, count);
+   try:
+      for (sample_time, counters) in snapshots:
+         if (previous is not None):
+            dt = sample_time - previous[0];
+            if (dt <= 0.0):
+               dt = interval;
+            # end if
+            for fs in sorted(counters):
+               if fs not in fs_index:
+                  # new mount: zeros for the samples before it appeared
+                  item = fs_new(fs);
+                  for i in range(0, len(timestamps)):
+                     fs_append(item, zeros);
+                  # end for
+                  fs_index[fs] = item;
+                  capture["fs_data_list"].append(item);
+               # end if
+            # end for
+            for item in capture["fs_data_list"]:
+               values = zeros;
+               if ( (item["fs"] in counters) and (item["fs"] in previous[1]) ):
+                  # counters go back to zero when a file system is mounted again
+                  delta = numpy.maximum(counters[item["fs"]] - previous[1][item["fs"]], 0.0);
+                  values = delta * mountstats_scale / dt;
+               # end if
+               fs_append(item, values);
+               capture["dirty"].add(item["fs"]);
+            # end for
+            capture["rows"] = capture["rows"] + len(capture["fs_data_list"]);
+            timestamps.append(sample_time);
+            if (len(timestamps) == 1):
+               capture["start_time"] = time.strftime("%I:%M:%S %p", time.localtime(sample_time));
+               capture["system_info"]["date"] = time.strftime("%m/%d/%Y",
+                                                              time.localtime(sample_time));
+            # end if
+         # end if
+         previous = (sample_time, counters);
+      # end for
+   except KeyboardInterrupt:
+      print(" ");
+      print("Collection stopped");
+   # end try
+   
+   capture["timestamps"] = numpy.array(timestamps, dtype=float);
+   for item in capture["fs_data_list"]:
+      fs_views(item);
+   # end for
+   return capture;
+   
+# end def
+
+
+
+def load_pickle(pickle_file):
+   #
+   # Reads a pickle from the open (binary) file pickle_file. iostat_plotter.py
+   # writes its pickle with Python 2, whose strings Python 3 can only read
+   # as latin-1.
+   #
+   if (sys.version_info[0] >= 3):
+      return pickle.load(pickle_file, encoding="latin1");
+   # end if
+   return pickle.load(pickle_file);
+   
+# end def
+
+
+
+def peak_rss_mb():
+   #
+   # Returns the peak resident set size of the process in MB, or -1.0 if
+   # the resource module is not available
+   #
+   if (resource_success == 0):
+      return -1.0;
+   # end if
+   rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss;
+   if (sys.platform == "darwin"):
+      return rss / (1024.0 * 1024.0);     # bytes on Mac OS X
+   # end if
+   return rss / 1024.0;                   # KB on Linux
+   
+# end def
+
+
+
+# Data shared with the plot workers (see plot_worker_init())
+plot_data = {};
+
+
+
+def plot_worker_init(data):
+   #
+   # Initializes a plot worker: stores the data the plots need once per
+   # worker (instead of sending it with every job) and switches to the
+   # non-interactive Agg backend
+   #
+   global figure_timing_hook, parse_tokenizer;
+   plot_data.update(data);
+   plt.switch_backend("Agg");
+   figure_timing_hook = data["figure_timing_hook"];
+   plot_reduce.update(data["plot_reduce"]);
+   if ("plot_anomalies" in data):
+      plot_anomalies.clear();
+      plot_anomalies.update(data["plot_anomalies"]);
+   # end if
+   if ("anomaly_params" in data):
+      anomaly_params.update(data["anomaly_params"]);
+   # end if
+   if ("report_images" in data):
+      report_images.update(data["report_images"]);
+   # end if
+   if ("report_select" in data):
+      report_select.update(data["report_select"]);
+   # end if
+   if ("parse_tokenizer" in data):
+      parse_tokenizer = data["parse_tokenizer"];
+   # end if
+   
+# end def
+
+
+
+def plot_job(job):
+   #
+   # Renders one figure and returns (image path, HTML fragment)
+   #
+   # job = (prefix, plot name, iloop, iplot, ifs)
+   #   prefix = HTML written before the figure's own HTML
+   #   plot name = "plot1", "plot1a", ..., "plot4"
+   #   ifs = index of the file system in fs_data_list
+   #
+   (prefix, name, iloop, iplot, ifs) = job;
+   d = plot_data;
+   fs_data_list = d["fs_data_list"];
+   
+   # Plot as many samples as there are both timestamps and data rows for
+   # (they differ when a mount is missing from some sections, or when the
+   # last section of a capture that is still written is incomplete)
+   x_seconds = d["x_seconds"];
+   if (d["combined_plots"] == 1):
+      n = min([len(x_seconds)] + [item["count"] for item in fs_data_list]);
+      fs_data_list = [fs_trim(item, n) for item in fs_data_list];
+      item = fs_data_list[ifs];
+   else:
+      if ("x_seconds" in fs_data_list[ifs]):
+         x_seconds = fs_data_list[ifs]["x_seconds"];    # own samples (follow_view())
+      # end if
+      n = min(len(x_seconds), fs_data_list[ifs]["count"]);
+      item = fs_trim(fs_data_list[ifs], n);
+   # end if
+   x_seconds = x_seconds[0:n];
+   
+   fsize = 6;
+   note = "";
+   start = time.time();
+   if ( (d["combined_plots"] == 1) and (len(fs_data_list) > combined_max_lines) ):
+      time_sum_list = None;
+      if (name in ["plot1", "plot2", "plot3"]):
+         time_sum_list = d["time_sum_list"];
+      # end if
+      image = plot_heatmap(name, iloop, d["dirname"], x_seconds, d.get("iostat_x_seconds"),
+                           time_sum_list, fs_data_list);
+      note = heatmap_note;
+   elif (name in ["plot1", "plot2", "plot3"]):
+      image = globals()[name](iloop, iplot, d["combined_plots"], d["dirname"],
+                              x_seconds, d["iostat_x_seconds"], d["time_sum_list"],
+                              fsize, item, fs_data_list, d["line_list"]);
+   else:
+      image = globals()[name](iloop, iplot, d["combined_plots"], d["dirname"],
+                              x_seconds, fsize, item, fs_data_list, d["line_list"]);
+   # end if
+   if (figure_timing_hook is not None):
+      figure_timing_hook(os.path.splitext(image)[0], time.time() - start);
+   # end if
+   return (image, prefix + figure_html(name, iloop, iplot, d["combined_plots"], item["fs"], note));
+   
+# end def
+
+
+
+def render_plots(jobs, data, workers):
+   #
+   # Renders all plot jobs and returns the list of (image path, HTML
+   # fragment) in the order of jobs. With workers > 1 the figures are
+   # rendered by a pool of worker processes.
+   #
+   if ( (workers > 1) and (multiprocessing_success == 1) and (len(jobs) > 1) ):
+      pool = multiprocessing.Pool(min(workers, len(jobs)), plot_worker_init, (data,));
+      try:
+         results = pool.map(plot_job, jobs, 1);
+      finally:
+         pool.close();
+         pool.join();
+      # end try
+   else:
+      plot_data.update(data);
+      results = [plot_job(job) for job in jobs];
+   # end if
+   return results;
+   
+# end def
+
+
+
+# Figures of the report (see figure_html()), by plot function:
+#   anchor = HTML anchor and image name (followed by the loop number)
+#   title = heading
+#   caption = caption under the image
+#   text = description
+# plot1 - plot3 include the total CPU utilization; the "a" versions are
+# used when there is no iostat data.
+report_figures = {};
+report_figures["plot1"] = {"anchor": "app_read_write",
+   "title": "Application Read and Write Throughput, and Total CPU Utilization",
+   "caption": "App Read and Write Throughput, and Total CPU utilization",
+   "text": "This figure plots the read and write throughput from applications \n" +
+           "using the read(2) and write(2) system call interfaces as well as \n" +
+           "total CPU usage. You can find out more about write throughput by\n" +
+           "simply typing \"man 2 read\" or  \"man 2 write\". The throughput  \n" +
+           "is plotted as a function of time. \n"};
+report_figures["plot1a"] = {"anchor": "app_read_write",
+   "title": "Application Read and Write Throughput",
+   "caption": "App Read and Write Throughput",
+   "text": "This figure plots the read and write throughput from applications \n" +
+           "using the read(2) and write(2) system call interfaces. You can  find\n" +
+           "out more about write throughput by simply typing \"man 2 read\"\n" +
+           "or  \"man 2 write\". The throughput is plotted as a function of time. \n"};
+report_figures["plot2"] = {"anchor": "app_read_write_dir",
+   "title": "Application Read and Write Throughput with O_DIRECT, and Total CPU Utilization",
+   "caption": "App Read and Write Throughput with O_DIRECT, and Total CPU utilization",
+   "text": "This figure plots the read and write throughput in MB/s by the \n" +
+           "applications that opened the file using the O_DIRECT flag. It \n" +
+           "also plots the total CPU usage (user + system). The throughput  \n" +
+           "is plotted as a function of time. \n"};
+report_figures["plot2a"] = {"anchor": "app_read_write_dir",
+   "title": "Application Read and Write Throughput with O_DIRECT",
+   "caption": "App Read and Write Throughput with O_DIRECT",
+   "text": "This figure plots the read and write throughput in MB/s by the \n" +
+           "applications that opened the file using the O_DIRECT flag. \n" +
+           "The throughput is plotted as a function of time. \n"};
+report_figures["plot3"] = {"anchor": "app_read_write_svr",
+   "title": "Application Read and Write using NFS_READ and NFS_WRITE, and Total CPU Utilization",
+   "caption": "App Read and Write throughput using NFS READ and NFS WRITE, and Total CPU utilization",
+   "text": "This figure plots the read and write throughput in MB/s by the \n" +
+           "applications that read from the server via an NFS READ request \n" +
+           "or written to server via an NFS WRITE request. It also plots \n" +
+           "the total CPU usage (user + system). The throughput  is plotted \n" +
+           "as a function of time. \n"};
+report_figures["plot3a"] = {"anchor": "app_read_write_svr",
+   "title": "Application Read and Write using NFS_READ and NFS_WRITE",
+   "caption": "App Read and Write throughput using NFS READ and NFS WRITE",
+   "text": "This figure plots the read and write throughput in MB/s by the \n" +
+           "applications that read from the server via an NFS READ request \n" +
+           "or written to server via an NFS WRITE request. The throughput is \n" +
+           "plotted as a function of time. \n"};
+report_figures["plot4"] = {"anchor": "app_ops",
+   "title": "Application Operations/s, Read ops/s, and Write Ops/s",
+   "caption": "App Operations/s, Read ops/s, and Write ops/s",
+   "text": "This figure plots the overall ops/s, read ops/ (Read IOPS), and \n" +
+           "write ops/s (Write IOPS) versus time.  \n"};
+
+# Hyperlinks listed in the header for each file system (or once for the
+# combined plots): anchor and title
+report_links = [("app_read_write", "Application Read and Write Throughput"),
+                ("app_read_write_dir", "Application Read and Write Throughput with O_DIRECT"),
+                ("app_read_write_svr", "Application Read and Write using NFS_READ and NFS_WRITE"),
+                ("app_ops", "Application Operations/s, Read ops/s, and Write Ops/s")];
+
+# Figures that can be selected with --figures, by the anchor of their
+# report_figures entries
+figure_choices = {"rw": "app_read_write", "dir": "app_read_write_dir",
+                  "svr": "app_read_write_svr", "ops": "app_ops"};
+
+
+
+def figure_selected(anchor):
+   #
+   # Returns True if the figures with this anchor (see report_figures) are
+   # part of the report (report_select["figures"])
+   #
+   figures = report_select["figures"];
+   return ( (len(figures) == 0) or (anchor in [figure_choices[name] for name in figures]) );
+   
+# end def
+
+# Text of the header that depends on combined_plots
+report_intro = {};
+report_intro[0] = ("For each filesystem there are a series of plots of the output \n" +
+                   "from nfsiostat that was captured. The report is contained in a\n" +
+                   "subdirectory HTML_REPORT. In that directory you will find a \n" +
+                   "file name report.html. Just open that file in a browser \n" +
+                   "and you will see the plots. Please note that all plots are \n" +
+                   "referenced to the beginning time of the nfsiostat run. </P>\n" +
+                   " \n");
+report_intro[1] = ("There are a series of plots from the captured nfsiostat output \n" +
+                   "where all devices are plotted together where possible. \n" +
+                   "The report is contained in a subdirectory HTML_REPORT.\n" +
+                   "In that directory you will find a file name report.html. Just \n" +
+                   "open that file in a browser and you will see the plots. \n" +
+                   "Please note that all plots are referenced to the beginning \n" +
+                   "time of the nfsiostat run. \n" +
+                   "</P>\n" +
+                   " \n");
+report_links_intro = {0: "for each device. \n",
+                      1: "where all of the devices are plotted together on each chart. \n"};
+
+# HTML of the report, compiled once. The same templates serve both kinds
+# of report (combined_plots = 0 or 1); only the values differ.
+report_templates = {};
+report_templates["header"] = string.Template(
+   "<H2>\n" +
+   "NFSIOSTAT Report for file: ${input_filename} \n" +
+   "</H2>\n" +
+   " \n" +
+   "<H3>\n" +
+   "Introduction \n" +
+   "</H3> \n \n" +
+   "<P>This report plots the nfsiostat output contained in file: \n" +
+   "${input_filename}. The filesystems analyzed are: \n" +
+   "<UL> \n" +
+   "${fs_list}" +
+   "</UL> \n" +
+   "${intro}" +
+   "<P>NFSiostat outputs a number of basic system parameters when it\n" +
+   "creates the output. These parameters are listed below. \n" +
+   "<UL> \n" +
+   "   <LI>System Name: ${system_name} \n" +
+   "   <LI>OS: ${OS} \n" +
+   "   <LI>Kernel: ${kernel} \n" +
+   "   <LI>Number of Cores ${cores} \n" +
+   "   <LI>Core Type ${CPU} \n" +
+   "</UL> \n" +
+   "The nfsiostat run was started on ${date} at \n" +
+   "${start_time}. \n" +
+   "</P> \n" +
+   "<P>Below are hyperlinks to various plots within the report \n" +
+   "${links_intro}" +
+   "<BR><BR> \n");
+report_templates["fs_item"] = string.Template("   <LI>${fs} \n");
+report_templates["links"] = string.Template(
+   "${label}" +
+   "<OL start=${start}> \n" +
+   "${items}" +
+   "</OL> \n" +
+   "</P> \n" +
+   " \n");
+report_templates["link"] = string.Template("   <LI><a href=\"#${anchor}\">${title}</a> \n");
+report_templates["figure"] = string.Template(
+   "<H${level}> \n" +
+   "${iplot}. <a id=\"${anchor}\">${title}</a>${fs_title}</H${level}> \n" +
+   " \n" +
+   "<P>${text}" +
+   "<center> \n" +
+   "<img src=\"${image}\"> \n" +
+   "<BR><BR><strong>Figure ${iplot} - ${caption}${fs_caption}</strong></center><BR><BR> \n" +
+   "<BR><BR> \n" +
+   "</P> \n \n");
+
+# Description added to combined figures drawn as heatmaps
+heatmap_note = ("With this many file systems each series is shown as a heatmap: one \n" +
+                "row per file system, busiest at the top, colored by the mean value in \n" +
+                "each time interval. The line panel shows the busiest file systems. \n");
+
+# Version of the figure sections kept in dirname/sections (see
+# render_report()); change it when the figures or templates change
+section_cache_version = 2;
+
+
+
+def figure_html(name, iloop, iplot, combined_plots, fs, note=""):
+   #
+   # Returns the HTML section of a figure
+   #
+   # name = plot function ("plot1", "plot1a", ..., "plot4")
+   # fs = file system of the figure (not shown with combined_plots == 1)
+   # note = text added to the description
+   #
+   figure = report_figures[name];
+   values = {"iplot": iplot, "anchor": figure["anchor"] + str(iloop),
+             "image": image_file(figure["anchor"] + str(iloop)),
+             "title": figure["title"], "text": figure["text"] + note,
+             "caption": figure["caption"]};
+   if (combined_plots == 0):
+      values["level"] = 4;
+      values["fs_title"] = ". Filesystem: " + fs + " \n";
+      values["fs_caption"] = " for FileSystem: " + fs;
+   else:
+      values["level"] = 3;
+      values["fs_title"] = "";
+      values["fs_caption"] = "";
+   # end if
+   return report_templates["figure"].substitute(values);
+   
+# end def
+
+
+
+def report_open(filename):
+   #
+   # Opens report filename for writing. The sections are streamed to a
+   # temporary file through a 1 MB buffer, which report_close() renames to
+   # filename, so nobody (a browser, follow mode) sees half a report.
+   #
+   return open(filename + ".tmp", 'w', 1048576);
+   
+# end def
+
+
+
+def array_digest(h, y):
+   #
+   # Adds the values of the one-dimensional numpy array y to hash h
+   #
+   h.update(numpy.ascontiguousarray(y, dtype=numpy.float64).tobytes());
+   
+# end def
+
+
+
+def section_keys(jobs, combined_plots, fs_data_list, x_seconds, iostat, anomalies):
+   #
+   # Returns a dictionary of (plot name, iloop) -> key of the section (HTML
+   # and image) of each job of render_report(): a SHA-1 of everything the
+   # figure is made from, i.e. the data of its file systems, the time
+   # axes, the plot options and the anomaly regions. A section only has to
+   # be rendered again when its key changes.
+   #
+   common = hashlib.sha1();
+   common.update(repr( (section_cache_version, combined_plots,
+                        sorted(plot_reduce.items()),
+                        sorted(report_images.items())) ).encode("ascii"));
+   array_digest(common, x_seconds);
+   cpu_key = "";
+   if (iostat is not None):
+      h = hashlib.sha1();
+      array_digest(h, iostat["x_seconds"]);
+      array_digest(h, iostat["time_sum_list"]);
+      cpu_key = h.hexdigest();
+   # end if
+   
+   fs_keys = [];
+   for item in fs_data_list:
+      h = hashlib.sha1();
+      h.update(item["fs"].encode("utf-8"));
+      for k in range(0, len(fs_fields)):
+         array_digest(h, item["data"][k, 0:item["count"]]);
+      # end for
+      if (anomalies is not None):
+         regions = [(region["kind"], region["x0"], region["x1"])
+                    for region in anomalies.get(item["fs"], [])];
+         h.update(repr(regions).encode("ascii"));
+      # end if
+      fs_keys.append(h.hexdigest());
+   # end for
+   
+   keys = {};
+   for job in jobs:
+      (prefix, name, iloop, iplot, ifs) = job;
+      h = common.copy();
+      h.update(repr(job).encode("ascii"));
+      if (combined_plots == 1):
+         h.update("".join(fs_keys).encode("ascii"));
+      else:
+         h.update(fs_keys[ifs].encode("ascii"));
+      # end if
+      if (name in ["plot1", "plot2", "plot3"]):
+         h.update(cpu_key.encode("ascii"));
+      # end if
+      keys[(name, iloop)] = h.hexdigest();
+   # end for
+   return keys;
+   
+# end def
+
+
+
+def image_stamp(image):
+   #
+   # Returns the size and mtime of an image file as text. A section in
+   # dirname/sections is only reused while its image still has the stamp
+   # saved with it (follow mode rewrites the images, but not the sections).
+   #
+   st = os.stat(image);
+   return "%d %r" % (st.st_size, st.st_mtime);
+   
+# end def
+
+
+
+def report_close(f, filename):
+   #
+   # Closes a report opened with report_open() and puts it in place
+   #
+   f.close();
+   if ( (os.name == "nt") and os.path.exists(filename) ):
+      os.remove(filename);                # rename does not replace on Windows
+   # end if
+   os.rename(filename + ".tmp", filename);
+   
+# end def
+
+
+
+def write_report_header(f, input_filename, capture, combined_plots):
+   #
+   # Writes the introduction, system information and hyperlinks of the
+   # HTML report to the open file f
+   #
+   fs_data_list = capture["fs_data_list"];
+   values = dict(capture["system_info"]);
+   values["input_filename"] = input_filename;
+   values["start_time"] = capture["start_time"];
+   values["intro"] = report_intro[combined_plots];
+   values["links_intro"] = report_links_intro[combined_plots];
+   values["fs_list"] = "".join([report_templates["fs_item"].substitute(fs=item["fs"])
+                                for item in fs_data_list]);
+   f.write(report_templates["header"].substitute(values));
+   
+   # Hyperlinks to the figures of each file system, or of the combined
+   # figures (loop number 1)
+   links = [(anchor, title) for (anchor, title) in report_links if figure_selected(anchor)];
+   plots_per_fs = len(links);
+   if (combined_plots == 0):
+      groups = [("<strong>" + fs_data_list[iloop]["fs"] + "</strong>: \n", iloop)
+                for iloop in range(0, len(fs_data_list))];
+   else:
+      groups = [("", 1)];
+   # end if
+   for (label, iloop) in groups:
+      items = "".join([report_templates["link"].substitute(anchor=anchor + str(iloop), title=title)
+                       for (anchor, title) in links]);
+      start = 1;
+      if (combined_plots == 0):
+         start = iloop*plots_per_fs + 1;
+      # end if
+      f.write(report_templates["links"].substitute(label=label, start=start, items=items));
+   # end for
+   
+# end def
+
+
+
+def make_line_list():
+   #
+   # Returns the list of line colors/styles used for the combined plots
+   #
+   # http://matplotlib.org/api/artist_api.html#matplotlib.lines.Line2D.lineStyles
+   # line_style = ['-', '--', '-.'];
+   # line_marker  = ['o', '^', 's', '*', '+', '<', '>', 'v'];
+   color_list = ['b', 'g', 'r', 'c', 'm', 'y', 'k'];
+   line_style = ['o-', '^--', 's-.', '*-', '<--', '>-.', 'v-', 'o--'];
+   line_list = [];
+   for line_type in line_style:
+      for color in color_list:
+         junk2 = color + line_type;
+         line_list.append(junk2);
+      # end for
+   # end for
+   return line_list;
+   
+# end def
+
+
+
+def render_report(input_filename, capture, x_seconds, iostat, combined_plots,
+                  dirname, workers, fragments=None, dirty=None, sections=None,
+                  anomalies=None):
+   #
+   # Renders the figures of a capture and writes dirname/report.html
+   #
+   # x_seconds = time of each timestamp relative to the first one
+   # iostat = dictionary with the iostat "x_seconds" and "time_sum_list"
+   #          (total CPU utilization), or None
+   # fragments = dictionary of (figure name, iloop) -> HTML of the figures
+   #             rendered before; it is updated and returned
+   # dirty = set of file system names with new data since fragments were
+   #         rendered (None = render every figure)
+   # sections = list of HTML sections written between the header and the
+   #            figures
+   # anomalies = regions to shade on the figures (see detect_anomalies())
+   #
+   # With report_format == "interactive" the report is written by
+   # write_interactive_report() instead and no figures are rendered.
+   #
+   if (report_format == "interactive"):
+      write_interactive_report(input_filename, capture, x_seconds, iostat, combined_plots,
+                               dirname, sections, anomalies);
+      return {};
+   # end if
+   fs_data_list = capture["fs_data_list"];
+   if (fragments is None):
+      fragments = {};
+   # end if
+   
+   # Build the list of figures (in report order)
+   if (iostat is not None):
+      # Figures 1-3 include total CPU utilization
+      fig_names = ["plot1", "plot2", "plot3", "plot4"];
+   else:
+      fig_names = ["plot1a", "plot2a", "plot3a", "plot4"];
+   # end if
+   fig_names = [name for name in fig_names if figure_selected(report_figures[name]["anchor"])];
+   plots_per_fs = len(fig_names);
+   max_plots = plots_per_fs * len(fs_data_list);
+   jobs = [];
+   iplot = 0;
+   if (combined_plots == 0):
+      # Loop over each device and create plots and HTML:
+      for iloop in range(0, len(fs_data_list)):
+         prefix = "<HR> \n";
+         for name in fig_names:
+            iplot = iplot + 1;
+            jobs.append( (prefix, name, iloop, iplot, iloop) );
+            prefix = "";
+         # end for
+      # end for
+   elif (combined_plots == 1):
+      # For each plot, loop over each device and create plot and HTML:
+      prefix = "<HR> \n";
+      for name in fig_names:
+         iplot = iplot + 1;
+         jobs.append( (prefix, name, 1, iplot, len(fs_data_list)-1) );
+         prefix = "";
+      # end for
+   # end if
+   
+   # Sections made from the same data with the same options in an earlier
+   # run are read from dirname/sections instead of being rendered again
+   # (follow mode keeps them in fragments instead and passes dirty)
+   section_dir = os.path.join(dirname, "sections");
+   keys = {};
+   if (dirty is None):
+      keys = section_keys(jobs, combined_plots, fs_data_list, x_seconds, iostat, anomalies);
+      for job in jobs:
+         section_filename = os.path.join(section_dir, keys[(job[1], job[2])] + ".html");
+         stamp_filename = os.path.join(section_dir, keys[(job[1], job[2])] + ".image");
+         image = image_file(os.path.join(dirname, report_figures[job[1]]["anchor"] + str(job[2])));
+         if ( os.path.isfile(section_filename) and os.path.isfile(stamp_filename) and
+              os.path.isfile(image) ):
+            stamp_file = open(stamp_filename, 'r');
+            stamp = stamp_file.read();
+            stamp_file.close();
+            if (stamp == image_stamp(image)):
+               section_file = open(section_filename, 'r');
+               fragments[(job[1], job[2])] = section_file.read();
+               section_file.close();
+            # end if
+         # end if
+      # end for
+      if (len(fragments) > 0):
+         print("Reusing ",len(fragments)," of ",len(jobs)," figures from an earlier run");
+      # end if
+   # end if
+   
+   # Only the figures of file systems with new data need rendering
+   todo = [];
+   for job in jobs:
+      if ((job[1], job[2]) not in fragments):
+         todo.append(job);
+      elif (dirty is None):
+         continue;                          # from dirname/sections
+      elif ( (combined_plots == 1) and (len(dirty) > 0) ):
+         todo.append(job);
+      elif ( (combined_plots == 0) and (fs_data_list[job[4]]["fs"] in dirty) ):
+         todo.append(job);
+      # end if
+   # end for
+   
+   data = {};
+   data["combined_plots"] = combined_plots;
+   data["dirname"] = dirname;
+   data["x_seconds"] = x_seconds;
+   data["fs_data_list"] = fs_data_list;
+   data["line_list"] = make_line_list();
+   data["figure_timing_hook"] = figure_timing_hook;
+   data["plot_reduce"] = plot_reduce;
+   data["report_images"] = report_images;
+   plot_anomalies.clear();
+   if (anomalies is not None):
+      plot_anomalies.update(anomalies);
+   # end if
+   data["plot_anomalies"] = plot_anomalies;
+   if (iostat is not None):
+      data["iostat_x_seconds"] = iostat["x_seconds"];
+      data["time_sum_list"] = iostat["time_sum_list"];
+   # end if
+   if ( (workers > 1) and (len(todo) > 1) ):
+      print("Rendering ",len(todo)," plots with ",workers," workers");
+   # end if
+   results = render_plots(todo, data, workers);
+   
+   for i in range(0, len(todo)):
+      job = todo[i];
+      fragments[(job[1], job[2])] = results[i][1];
+      if ( (combined_plots == 0) and (fig_names.index(job[1]) == 0) ):
+         print("File system: ",fs_data_list[job[4]]["fs"]);
+      # end if
+      print("   Finished Plot ",job[3]," of ",max_plots);
+   # end for
+   
+   # Keep the sections of this report (only) for the next run
+   if (dirty is None):
+      if not os.path.exists(section_dir):
+         os.makedirs(section_dir);
+      # end if
+      for job in todo:
+         section_file = open(os.path.join(section_dir, keys[(job[1], job[2])] + ".html"), 'w');
+         section_file.write(fragments[(job[1], job[2])]);
+         section_file.close();
+         image = image_file(os.path.join(dirname, report_figures[job[1]]["anchor"] + str(job[2])));
+         stamp_file = open(os.path.join(section_dir, keys[(job[1], job[2])] + ".image"), 'w');
+         stamp_file.write(image_stamp(image));
+         stamp_file.close();
+      # end for
+      current = set([key + ".html" for key in keys.values()] +
+                    [key + ".image" for key in keys.values()]);
+      for old in os.listdir(section_dir):
+         if (old not in current):
+            os.remove(os.path.join(section_dir, old));
+         # end if
+      # end for
+   # end if
+   
+   # HTML Report: header followed by the sections and the figures in
+   # report order, streamed to the file
+   html_filename = dirname + '/report.html';
+   f = report_open(html_filename);
+   write_report_header(f, input_filename, capture, combined_plots);
+   if (sections is not None):
+      for output_str in sections:
+         f.write(output_str);
+      # end for
+   # end if
+   for job in jobs:
+      f.write(fragments[(job[1], job[2])]);
+   # end for
+   report_close(f, html_filename);
+   
+   return fragments;
+   
+# end def
+
+
+
+# Follow mode keeps its own state between refreshes (see follow_new()), so a
+# refresh only processes the samples appended since the previous one: the
+# anomaly detection is rolled forward from the last window of samples and
+# the plotted series come from min/max buckets that are extended (and
+# merged when there are too many) instead of reducing whole series again.
+
+
+
+def growable(array, n):
+   #
+   # Returns the one-dimensional array with room for at least n values,
+   # doubling its capacity when needed (the values are kept)
+   #
+   if (n <= len(array)):
+      return array;
+   # end if
+   new_array = numpy.zeros(max(n, 2*len(array)), dtype=array.dtype);
+   new_array[0:len(array)] = array;
+   return new_array;
+   
+# end def
+
+
+
+def buckets_new():
+   #
+   # Returns the min/max buckets of one file system (see buckets_add()):
+   #   n = number of samples added
+   #   vmin, vmax, imin, imax = smallest and largest value of each series
+   #                            (rows, fs_fields order) in each bucket
+   #                            (columns) and their sample numbers
+   #   sum = sum of each series in each bucket
+   #
+   k = len(fs_fields);
+   return {"n": 0, "vmin": numpy.zeros( (k, 0) ), "vmax": numpy.zeros( (k, 0) ),
+           "imin": numpy.zeros( (k, 0), dtype=numpy.int64 ),
+           "imax": numpy.zeros( (k, 0), dtype=numpy.int64 ), "sum": numpy.zeros( (k, 0) )};
+   
+# end def
+
+
+
+def buckets_add(b, data, n1, size):
+   #
+   # Adds samples b["n"] .. n1-1 of data (a fs_new() store array) to the
+   # buckets of size samples (bucket j holds samples j*size .. j*size+size-1).
+   # The first new samples may complete the last bucket.
+   #
+   n0 = b["n"];
+   if (n1 <= n0):
+      return;
+   # end if
+   k = data.shape[0];
+   j0 = n0 // size;                           # bucket of the first new sample
+   j1 = -(-n1 // size);                       # ceil(n1 / size)
+   padded = numpy.empty( (k, (j1 - j0) * size) );
+   padded[:] = numpy.nan;
+   padded[:, n0 - j0*size:n1 - j0*size] = data[:, n0:n1];
+   padded = padded.reshape(k, j1 - j0, size);
+   offset = (j0 + numpy.arange(j1 - j0)) * size;
+   imin = numpy.nanargmin(padded, axis=2);
+   imax = numpy.nanargmax(padded, axis=2);
+   new = {};
+   new["vmin"] = numpy.take_along_axis(padded, imin[:,:,None], axis=2)[:,:,0];
+   new["vmax"] = numpy.take_along_axis(padded, imax[:,:,None], axis=2)[:,:,0];
+   new["imin"] = imin + offset;
+   new["imax"] = imax + offset;
+   new["sum"] = numpy.nansum(padded, axis=2);
+   if (j0 < b["sum"].shape[1]):
+      # the last bucket continues: merge the first new one into it
+      lower = new["vmin"][:,0] < b["vmin"][:,-1];
+      b["vmin"][lower,-1] = new["vmin"][lower,0];
+      b["imin"][lower,-1] = new["imin"][lower,0];
+      higher = new["vmax"][:,0] > b["vmax"][:,-1];
+      b["vmax"][higher,-1] = new["vmax"][higher,0];
+      b["imax"][higher,-1] = new["imax"][higher,0];
+      b["sum"][:,-1] = b["sum"][:,-1] + new["sum"][:,0];
+      for key in new:
+         new[key] = new[key][:,1:];
+      # end for
+   # end if
+   for key in new:
+      b[key] = numpy.concatenate( (b[key], new[key]), axis=1 );
+   # end for
+   b["n"] = n1;
+   
+# end def
+
+
+
+def buckets_merge(b):
+   #
+   # Merges neighbouring buckets in pairs (the bucket size doubles)
+   #
+   nb = b["sum"].shape[1];
+   if (nb % 2 == 1):
+      # pad with an empty bucket that never wins
+      k = b["sum"].shape[0];
+      pad = {"vmin": numpy.inf, "vmax": -numpy.inf, "imin": -1, "imax": -1, "sum": 0.0};
+      for key in pad:
+         b[key] = numpy.concatenate( (b[key], numpy.full( (k, 1), pad[key],
+                                                          dtype=b[key].dtype )), axis=1 );
+      # end for
+      nb = nb + 1;
+   # end if
+   for (value, index, pick) in [("vmin", "imin", numpy.argmin), ("vmax", "imax", numpy.argmax)]:
+      values = b[value].reshape(-1, nb // 2, 2);
+      j = pick(values, axis=2)[:,:,None];
+      b[value] = numpy.take_along_axis(values, j, axis=2)[:,:,0];
+      b[index] = numpy.take_along_axis(b[index].reshape(-1, nb // 2, 2), j, axis=2)[:,:,0];
+   # end for
+   b["sum"] = b["sum"].reshape(-1, nb // 2, 2).sum(axis=2);
+   
+# end def
+
+
+
+def detect_new():
+   #
+   # Returns the state of detect_add() for one series:
+   #   n = number of samples processed
+   #   spike, plateau, score = detect_series() results so far (capacity
+   #                           grows by doubling, only the first n are used)
+   #   top = the largest values seen, enough for their 99th percentile
+   #   regions = kind -> list of regions (see detect_anomalies())
+   #
+   return {"n": 0, "spike": numpy.zeros(1024, dtype=bool),
+           "plateau": numpy.zeros(1024, dtype=bool), "score": numpy.zeros(1024),
+           "top": numpy.zeros(0), "regions": {"spike": [], "saturation": []}};
+   
+# end def
+
+
+
+def top_percentile(top, n, q):
+   #
+   # Returns the q-th percentile (as numpy.percentile(), linear) of n values
+   # of which top holds the largest ones
+   #
+   top = numpy.sort(top);
+   p = (q / 100.0) * (n - 1);
+   lo = int(numpy.floor(p));
+   hi = min(lo + 1, n - 1);
+   skip = n - len(top);                       # values below top
+   v_lo = top[lo - skip];
+   return v_lo + (p - lo) * (top[hi - skip] - v_lo);
+   
+# end def
+
+
+
+def detect_add(state, name, y, timestamps, half, params=anomaly_params):
+   #
+   # detect_series() for follow mode: scores only the samples of y added
+   # since the last call against the window before them, marks the
+   # saturation windows that end in them and rebuilds the regions that
+   # may have changed (see detect_anomalies() for the region format). The
+   # 99th percentile used by both tests is that of the samples seen so far,
+   # so earlier samples keep the result they had when they were new.
+   #
+   # name = series name (stored in the regions)
+   #
+   n0 = state["n"];
+   n1 = len(y);
+   if ( (n1 <= n0) or (n1 < 2) ):
+      return;
+   # end if
+   y = numpy.asarray(y, dtype=numpy.float64);
+   for key in ["spike", "plateau", "score"]:
+      state[key] = growable(state[key], n1);
+   # end for
+   
+   # The 99th percentile needs the largest 1% (plus 2) of the values
+   m = int(numpy.ceil(0.01 * (n1 - 1))) + 2;
+   top = numpy.concatenate( (state["top"], y[n0:n1]) );
+   if (len(top) > m):
+      top = numpy.partition(top, len(top) - m)[len(top) - m:];
+   # end if
+   state["top"] = top;
+   high = top_percentile(top, n1, 99.0);
+   
+   # Spikes: rolling z-score of the new samples (see detect_series())
+   window = params["window"];
+   t0 = max(0, n0 - window);
+   (mean, std, count) = rolling_mean_std(y[t0:n1], window);
+   k0 = n0 - t0;
+   score = (y[n0:n1] - mean[k0:]) / numpy.maximum(std[k0:], 0.01 * max(high, 1e-6));
+   state["score"][n0:n1] = score;
+   state["spike"][n0:n1] = (score > params["z"]) & (count[k0:] >= window // 2);
+   
+   # Saturation: the windows of plateau samples that end in a new sample
+   # (and can mark samples up to w-1 before it)
+   w = params["plateau"];
+   changed = n0;
+   first = max(w, n0 + 1);                    # end (exclusive) of the first new window
+   if ( (n1 >= first) and (high > 0.0) ):
+      a = first - w;
+      (mean, std, count) = rolling_mean_std(numpy.append(y[a:n1], 0.0), w);
+      mean = mean[w:];                        # windows ending at first .. n1
+      std = std[w:];
+      flat = (mean >= params["level"] * high) & (std <= params["cv"] * mean);
+      ends = numpy.nonzero(flat)[0] + (first - a);
+      marks = numpy.zeros(n1 - a + 1, dtype=numpy.int64);
+      numpy.add.at(marks, ends - w, 1);
+      numpy.add.at(marks, ends, -1);
+      state["plateau"][a:n1] = state["plateau"][a:n1] | (numpy.cumsum(marks[0:n1-a]) > 0);
+      changed = min(changed, a);
+   # end if
+   
+   # Regions: the ones that end at or after the first changed sample are
+   # found again, from the start of the earliest of them
+   for (kind, key) in [("spike", "spike"), ("saturation", "plateau")]:
+      regions = state["regions"][kind];
+      r0 = changed;
+      while ( (len(regions) > 0) and (regions[-1]["stop"] >= changed) ):
+         r0 = min(r0, regions.pop()["start"]);
+      # end while
+      for (start, stop) in mask_runs(state[key][r0:n1]):
+         start = start + r0;
+         stop = stop + r0;
+         region = {};
+         region["kind"] = kind;
+         region["series"] = name;
+         region["start"] = int(start);
+         region["stop"] = int(stop);
+         region["x0"] = float(timestamps[start] - timestamps[0] - half);
+         region["x1"] = float(timestamps[stop-1] - timestamps[0] + half);
+         region["t0"] = float(timestamps[start]);
+         region["peak"] = float(y[start:stop].max());
+         region["z"] = float(state["score"][start:stop].max());
+         regions.append(region);
+      # end for
+   # end for
+   state["n"] = n1;
+   
+# end def
+
+
+
+def follow_new():
+   #
+   # Returns the state of follow_update():
+   #   size = samples per bucket (a power of two, the same for all file
+   #          systems, so they share the time grid)
+   #   buckets = file system name -> buckets_new()
+   #   detect = (file system name, series) -> detect_new()
+   #   stamps = number of timestamps processed
+   #   half = half of the median sample interval (s), for the region edges
+   #
+   return {"size": 1, "buckets": {}, "detect": {}, "stamps": 0, "half": 0.5};
+   
+# end def
+
+
+
+def follow_update(follow, capture):
+   #
+   # Adds the samples appended to capture since the last call to the
+   # buckets and the anomaly detection of follow mode. Returns the
+   # anomalies (see detect_anomalies()).
+   #
+   timestamps = capture["timestamps"];
+   nstamps = len(timestamps);
+   if (nstamps - follow["stamps"] > 0):
+      d = numpy.diff(timestamps[max(0, follow["stamps"] - 1):nstamps]);
+      if (len(d) > 0):
+         follow["half"] = 0.5 * float(numpy.median(d));
+      # end if
+      follow["stamps"] = nstamps;
+   # end if
+   
+   # At most max_points/2 buckets per series: double the bucket size
+   limit = max(1, plot_reduce["max_points"] // 2);
+   while (-(-nstamps // follow["size"]) > limit):
+      follow["size"] = 2 * follow["size"];
+      for b in follow["buckets"].values():
+         buckets_merge(b);
+      # end for
+   # end while
+   
+   anomalies = {};
+   for item in capture["fs_data_list"]:
+      n = min(nstamps, item["count"]);
+      b = follow["buckets"].setdefault(item["fs"], buckets_new());
+      buckets_add(b, item["data"], n, follow["size"]);
+      if (anomaly_params["enabled"] == 1):
+         regions = [];
+         for name in anomaly_fields:
+            state = follow["detect"].setdefault( (item["fs"], name), detect_new() );
+            detect_add(state, name, item["data"][fs_fields.index(name), 0:n], timestamps,
+                       follow["half"]);
+            regions = regions + state["regions"]["spike"] + state["regions"]["saturation"];
+         # end for
+         regions.sort(key=lambda region: region["start"]);
+         anomalies[item["fs"]] = regions;
+      # end if
+   # end for
+   return anomalies;
+   
+# end def
+
+
+
+def view_item(item, indices):
+   #
+   # Returns a file system store with samples indices of item
+   #
+   new_item = {"fs": item["fs"]};
+   new_item["data"] = item["data"][:, indices];
+   new_item["count"] = len(indices);
+   fs_views(new_item);
+   return new_item;
+   
+# end def
+
+
+
+def follow_view(follow, capture, combined_plots):
+   #
+   # Returns (view, x_seconds): the capture reduced to what the figures of
+   # follow mode draw, which is bounded by the number of buckets however
+   # long the capture gets:
+   #   - the samples that are the min or max of a series in a bucket, for
+   #     all file systems together (combined figures, interactive report),
+   #     or of each file system with its own "x_seconds" (figures per file
+   #     system, see plot_job())
+   #   - for heatmaps, the mean of each bucket
+   #
+   timestamps = capture["timestamps"];
+   items = capture["fs_data_list"];
+   view = dict(capture);
+   view["fs_data_list"] = [];
+   view["fs_index"] = {};
+   buckets = [follow["buckets"][item["fs"]] for item in items];
+   
+   if ( (combined_plots == 1) and (len(items) > combined_max_lines) and
+        (report_format != "interactive") ):
+      size = follow["size"];
+      nb = min([b["sum"].shape[1] for b in buckets]);
+      starts = numpy.arange(nb) * size;
+      x_seconds = timestamps[numpy.minimum(starts + size // 2, len(timestamps) - 1)] - timestamps[0];
+      for (item, b) in zip(items, buckets):
+         new_item = {"fs": item["fs"]};
+         new_item["data"] = b["sum"][:, 0:nb] / numpy.minimum(size, b["n"] - starts);
+         new_item["count"] = nb;
+         fs_views(new_item);
+         view["fs_data_list"].append(new_item);
+      # end for
+   else:
+      indices = [numpy.unique(numpy.concatenate( (b["imin"].ravel(), b["imax"].ravel()) ))
+                 for b in buckets];
+      common = numpy.unique(numpy.concatenate(indices));
+      if (combined_plots == 1):
+         common = common[common < min([b["n"] for b in buckets])];
+      # end if
+      x_seconds = timestamps[common] - timestamps[0];
+      for (item, b, own) in zip(items, buckets, indices):
+         if ( (combined_plots == 0) and (report_format != "interactive") ):
+            new_item = view_item(item, own);
+            new_item["x_seconds"] = timestamps[own] - timestamps[0];
+         else:
+            new_item = view_item(item, common[common < b["n"]]);
+         # end if
+         view["fs_data_list"].append(new_item);
+      # end for
+   # end if
+   for new_item in view["fs_data_list"]:
+      view["fs_index"][new_item["fs"]] = new_item;
+   # end for
+   return (view, x_seconds);
+   
+# end def
+
+
+
+# Client-side chart of the interactive report (see write_interactive_report()).
+# It decodes the base64 Float32 arrays of NFS_DATA, draws each panel on a
+# canvas (at most two points per pixel column: the min and max) and keeps
+# the time axis of all panels together: scroll to zoom, drag to pan,
+# double-click to show everything again.
+interactive_script = """
+(function () {
+   var data = NFS_DATA, arrays = {}, charts = [], pending = false;
+   var left = 70, right = 10, top = 22, bottom = 26;
+   function decode(b64) {
+      var s = atob(b64), bytes = new Uint8Array(s.length);
+      for (var i = 0; i < s.length; i++) { bytes[i] = s.charCodeAt(i); }
+      return new Float32Array(bytes.buffer);
+   }
+   for (var key in data.arrays) { arrays[key] = decode(data.arrays[key]); }
+   var xmin = Infinity, xmax = -Infinity;
+   data.panels.forEach(function (panel) {
+      panel.lines.forEach(function (line) {
+         var x = arrays[line.x];
+         if (x.length > 0) { xmin = Math.min(xmin, x[0]); xmax = Math.max(xmax, x[x.length-1]); }
+      });
+   });
+   if (!(xmax > xmin)) { xmin = 0; xmax = 1; }
+   var view = {x0: xmin, x1: xmax};
+
+   function lowerBound(a, v, n) {
+      var lo = 0, hi = n;
+      while (lo < hi) { var mid = (lo + hi) >> 1; if (a[mid] < v) { lo = mid + 1; } else { hi = mid; } }
+      return lo;
+   }
+   function ticks(lo, hi, count) {
+      var span = hi - lo, step = Math.pow(10, Math.floor(Math.log(span / count) / Math.LN10));
+      var err = span / count / step, out = [];
+      if (err >= 7.5) { step *= 10; } else if (err >= 3.5) { step *= 5; } else if (err >= 1.5) { step *= 2; }
+      for (var v = Math.ceil(lo / step) * step; v <= hi; v += step) { out.push(v); }
+      return out;
+   }
+   function label(v) { return Math.abs(v) >= 1000 ? v.toFixed(0) : String(+v.toPrecision(4)); }
+
+   function draw(chart) {
+      var c = chart.canvas, ctx = c.getContext("2d"), panel = chart.panel;
+      var pw = c.width - left - right, ph = c.height - top - bottom;
+      var x0 = view.x0, x1 = view.x1, sx = pw / (x1 - x0), ymax = 0, ranges = [];
+      panel.lines.forEach(function (line) {
+         var x = arrays[line.x], y = arrays[line.y], n = Math.min(x.length, y.length);
+         var i0 = Math.max(lowerBound(x, x0, n) - 1, 0), i1 = Math.min(lowerBound(x, x1, n) + 1, n);
+         for (var i = i0; i < i1; i++) { if (y[i] > ymax) { ymax = y[i]; } }
+         ranges.push([x, y, i0, i1]);
+      });
+      if (!(ymax > 0)) { ymax = 1; }
+      ymax = ymax * 1.05;
+      var sy = ph / ymax;
+      function px(v) { return left + (v - x0) * sx; }
+      function py(v) { return top + ph - v * sy; }
+
+      ctx.clearRect(0, 0, c.width, c.height);
+      ctx.save();
+      ctx.beginPath(); ctx.rect(left, top, pw, ph); ctx.clip();
+      panel.regions.forEach(function (r) {
+         ctx.fillStyle = (r[2] == "spike") ? "rgba(255,0,0,0.25)" : "rgba(255,165,0,0.3)";
+         ctx.fillRect(px(r[0]), top, Math.max(px(r[1]) - px(r[0]), 1), ph);
+      });
+      panel.lines.forEach(function (line, k) {
+         var x = ranges[k][0], y = ranges[k][1], i0 = ranges[k][2], i1 = ranges[k][3], i;
+         ctx.strokeStyle = line.color; ctx.lineWidth = 1; ctx.beginPath();
+         if (i1 - i0 > 2 * pw) {
+            var col = null, lo = 0, hi = 0, first = true;
+            for (i = i0; i <= i1; i++) {
+               var cx = (i < i1) ? Math.floor(px(x[i])) : null;
+               if (cx !== col) {
+                  if (col !== null) {
+                     if (first) { ctx.moveTo(col, py(lo)); first = false; } else { ctx.lineTo(col, py(lo)); }
+                     ctx.lineTo(col, py(hi));
+                  }
+                  if (i < i1) { col = cx; lo = hi = y[i]; }
+               } else {
+                  lo = Math.min(lo, y[i]); hi = Math.max(hi, y[i]);
+               }
+            }
+         } else {
+            for (i = i0; i < i1; i++) {
+               if (i == i0) { ctx.moveTo(px(x[i]), py(y[i])); } else { ctx.lineTo(px(x[i]), py(y[i])); }
+            }
+         }
+         ctx.stroke();
+      });
+      ctx.restore();
+
+      ctx.strokeStyle = "#000"; ctx.fillStyle = "#000"; ctx.font = "10px sans-serif";
+      ctx.strokeRect(left, top, pw, ph);
+      ctx.textAlign = "center"; ctx.textBaseline = "top";
+      ticks(x0, x1, 8).forEach(function (v) {
+         ctx.fillText(label(v), px(v), top + ph + 4);
+         ctx.beginPath(); ctx.moveTo(px(v), top + ph); ctx.lineTo(px(v), top + ph + 3); ctx.stroke();
+      });
+      ctx.textAlign = "right"; ctx.textBaseline = "middle";
+      ticks(0, ymax, 4).forEach(function (v) {
+         ctx.fillText(label(v), left - 4, py(v));
+      });
+      ctx.textAlign = "left"; ctx.textBaseline = "top"; ctx.font = "bold 11px sans-serif";
+      ctx.fillText(panel.title, left, 4);
+      var lx = c.width - right;
+      ctx.textAlign = "right"; ctx.font = "10px sans-serif";
+      for (var k = panel.lines.length - 1; k >= 0; k--) {
+         ctx.fillStyle = panel.lines[k].color;
+         ctx.fillText(panel.lines[k].label, lx, 5);
+         lx = lx - ctx.measureText(panel.lines[k].label).width - 12;
+      }
+   }
+   function redraw() {
+      pending = false;
+      charts.forEach(draw);
+   }
+   function setView(a, b) {
+      var span = Math.min(Math.max(b - a, (xmax - xmin) * 1e-6), xmax - xmin);
+      a = Math.max(xmin, Math.min(a, xmax - span));
+      view.x0 = a; view.x1 = a + span;
+      if (!pending) { pending = true; window.requestAnimationFrame(redraw); }
+   }
+   data.panels.forEach(function (panel, i) {
+      var chart = {canvas: document.getElementById("nfs_chart" + i), panel: panel}, drag = null;
+      var c = chart.canvas;
+      function at(ev) {
+         var r = c.getBoundingClientRect();
+         return view.x0 + (ev.clientX - r.left - left) / (c.width - left - right) * (view.x1 - view.x0);
+      }
+      c.addEventListener("wheel", function (ev) {
+         ev.preventDefault();
+         var xm = at(ev), f = (ev.deltaY < 0) ? 0.8 : 1.25;
+         setView(xm - (xm - view.x0) * f, xm + (view.x1 - xm) * f);
+      });
+      c.addEventListener("mousedown", function (ev) { drag = {x: ev.clientX, x0: view.x0, x1: view.x1}; });
+      window.addEventListener("mousemove", function (ev) {
+         if (drag === null) { return; }
+         var dx = (ev.clientX - drag.x) / (c.width - left - right) * (drag.x1 - drag.x0);
+         setView(drag.x0 - dx, drag.x1 - dx);
+      });
+      window.addEventListener("mouseup", function () { drag = null; });
+      c.addEventListener("dblclick", function () { setView(xmin, xmax); });
+      charts.push(chart);
+   });
+   redraw();
+})();
+""";
+
+
+
+# Report written by render_report(): "png" (figures made with matplotlib)
+# or "interactive" (see write_interactive_report())
+report_format = "png";
+
+# Panels of the interactive report: anchor of the figure of the PNG report
+# (see report_figures), title and series, in the order of those figures
+interactive_panels = [
+   ("app_read_write", "Application Read and Write Throughput (MB/s), read(2) and write(2)",
+    ["rMB_nor", "wMB_nor"]),
+   ("app_read_write_dir", "Application Read and Write Throughput with O_DIRECT (MB/s)",
+    ["rMB_dir", "wMB_dir"]),
+   ("app_read_write_svr", "Application Read and Write using NFS_READ and NFS_WRITE (MB/s)",
+    ["rMB_svr", "wMB_svr"]),
+   ("app_ops", "Application Operations/s, Read ops/s, and Write Ops/s", ["ops", "rops", "wops"])];
+
+interactive_colors = ["#d62728", "#1f77b4", "#2ca02c", "#9467bd", "#ff7f0e", "#17becf",
+                      "#8c564b", "#e377c2", "#7f7f7f", "#bcbd22"];
+
+
+
+def encode_series(y):
+   #
+   # Returns the values of y as base64 of little-endian float32 (the
+   # layout of a JavaScript Float32Array)
+   #
+   return base64.b64encode(numpy.asarray(y, dtype="<f4").tobytes()).decode("ascii");
+   
+# end def
+
+
+
+def write_interactive_report(input_filename, capture, x_seconds, iostat, combined_plots,
+                             dirname, sections=None, anomalies=None):
+   #
+   # Writes dirname/report.html as a single self-contained page: the
+   # series are embedded as base64 Float32 arrays and drawn in the
+   # browser by interactive_script, which zooms and pans without going
+   # back to the data. No images are rendered, so the time and size of
+   # the report depend only on the number of samples.
+   #
+   # The arguments are those of render_report()
+   #
+   fs_data_list = capture["fs_data_list"];
+   if (anomalies is None):
+      anomalies = {};
+   # end if
+   arrays = {"x": encode_series(x_seconds)};
+   panels = [];
+   
+   if (iostat is not None):
+      arrays["cpu_x"] = encode_series(iostat["x_seconds"]);
+      arrays["cpu"] = encode_series(iostat["time_sum_list"]);
+      panels.append( {"title": "Total CPU Utilization (%)", "regions": [],
+                      "lines": [{"x": "cpu_x", "y": "cpu", "label": "Total CPU Utilization",
+                                 "color": interactive_colors[2]}]} );
+   # end if
+   for i in range(0, len(fs_data_list)):
+      item = fs_data_list[i];
+      n = min(len(x_seconds), item["count"]);
+      for name in fs_fields:
+         arrays["fs" + str(i) + "_" + name] = encode_series(item[name][0:n]);
+      # end for
+   # end for
+   
+   # One group of panels per file system, or one for all of them with
+   # combined_plots == 1
+   if (combined_plots == 1):
+      groups = [("All file systems", range(0, len(fs_data_list)))];
+   else:
+      groups = [(fs_data_list[i]["fs"], [i]) for i in range(0, len(fs_data_list))];
+   # end if
+   headings = {};
+   for (heading, members) in groups:
+      headings[len(panels)] = heading;
+      regions = [];
+      for i in members:
+         for region in anomalies.get(fs_data_list[i]["fs"], []):
+            regions.append( [region["x0"], region["x1"], region["kind"]] );
+         # end for
+      # end for
+      for (anchor, title, names) in interactive_panels:
+         if not figure_selected(anchor):
+            continue;
+         # end if
+         lines = [];
+         for i in members:
+            for k in range(0, len(names)):
+               line = {"x": "x", "y": "fs" + str(i) + "_" + names[k], "label": names[k]};
+               if (len(members) > 1):
+                  line["label"] = fs_data_list[i]["fs"] + " " + names[k];
+                  line["color"] = interactive_colors[(len(lines)) % len(interactive_colors)];
+               else:
+                  line["color"] = interactive_colors[k];
+               # end if
+               lines.append(line);
+            # end for
+         # end for
+         panels.append( {"title": title, "regions": regions, "lines": lines} );
+      # end for
+   # end for
+   
+   output_list = ["<HTML><HEAD><META charset=\"utf-8\"> \n"];
+   output_list.append("<TITLE>NFSIOSTAT Report for file: " + input_filename + "</TITLE></HEAD><BODY> \n");
+   output_list.append("<H2>\n");
+   output_list.append("NFSIOSTAT Report for file: " + input_filename + " \n");
+   output_list.append("</H2>\n");
+   output_list.append("<P>System: " + capture["system_info"]["system_name"] + ", ");
+   output_list.append(str(len(fs_data_list)) + " NFS file systems, ");
+   output_list.append(str(len(x_seconds)) + " samples starting " + capture["system_info"]["date"]);
+   output_list.append(" at " + capture["start_time"] + ". Time is in seconds from the first \n");
+   output_list.append("sample. Scroll over a chart to zoom, drag to pan and double-click to \n");
+   output_list.append("show the whole capture; all charts follow. Shaded regions are anomalies \n");
+   output_list.append("(red: spikes, orange: saturation). \n");
+   output_list.append("</P>\n");
+   if (sections is not None):
+      output_list.append("".join(sections));
+   # end if
+   for i in range(0, len(panels)):
+      if (i in headings):
+         output_list.append("<H3>" + headings[i] + "</H3> \n");
+      # end if
+      output_list.append("<canvas id=\"nfs_chart" + str(i) + "\" width=\"960\" height=\"180\"></canvas><BR> \n");
+   # end for
+   output_list.append("<script> \nvar NFS_DATA = ");
+   
+   html_filename = os.path.join(dirname, "report.html");
+   f = report_open(html_filename);
+   f.write("".join(output_list));
+   json.dump({"arrays": arrays, "panels": panels}, f, sort_keys=True);
+   f.write(";\n" + interactive_script + "</script> \n</BODY></HTML> \n");
+   report_close(f, html_filename);
+   
+# end def
+
+
+
+def follow_report(input_filename, iostat, combined_plots, dirname, workers,
+                  interval):
+   #
+   # Follow mode: tails a capture that nfsiostat is still writing and
+   # rewrites the report every interval seconds. Only the newly appended
+   # lines are parsed (the parser and per-mount state are kept between
+   # refreshes), only the new samples go through the anomaly detection and
+   # the min/max buckets (see follow_update()), and only the figures of
+   # file systems that received new samples are rendered again, from the
+   # bucketed samples (see follow_view()). Runs until interrupted.
+   #
+   input_file = open(input_filename, 'r');
+   capture = capture_new();
+   select = None;
+   if select_active(report_select):
+      select = report_select;
+   # end if
+   records = parse_nfsiostat(follow_lines(input_file), select);
+   fragments = {};
+   follow = follow_new();
+   while True:
+      capture_add(capture, records);        # returns at the current end of file
+      capture_timestamps(capture);          # converts only the new timestamps
+      nstamps = len(capture["timestamps"]);
+      
+      if ( (len(capture["dirty"]) > 0) and (nstamps > 0) ):
+         start = time.time();
+         anomalies = follow_update(follow, capture);
+         (view, x_seconds) = follow_view(follow, capture, combined_plots);
+         sections = [];
+         if (anomaly_params["enabled"] == 1):
+            sections.append(anomaly_html(anomalies));
+         # end if
+         fragments = render_report(input_filename, view, x_seconds, iostat,
+                                   combined_plots, dirname, workers, fragments,
+                                   capture["dirty"], sections, anomalies);
+         print("Report refreshed (%d samples, %d file systems changed) in %.2f s" % (nstamps,
+               len(capture["dirty"]), time.time() - start));
+         capture["dirty"] = set();
+      # end if
+      time.sleep(interval);
+   # end while
+   
+# end def
+
+
+
+def batch_inputs(pattern):
+   #
+   # Returns the sorted list of (host, capture file) of a batch run.
+   # pattern is a directory (every file in it) or a glob such as
+   # "/data/nfsiostat/*.out". The host name is the file name without its
+   # extension, or the name of the directory the file is in when the file
+   # names are the same (e.g. "/data/*/nfsiostat.out").
+   #
+   if os.path.isdir(pattern):
+      filenames = [os.path.join(pattern, name) for name in os.listdir(pattern)
+                   if not name.startswith(".")];
+   else:
+      filenames = glob.glob(pattern);
+   # end if
+   filenames = sorted([name for name in filenames if os.path.isfile(name)]);
+   
+   hosts = [os.path.splitext(os.path.basename(name))[0] for name in filenames];
+   if (len(set(hosts)) < len(hosts)):
+      hosts = [os.path.basename(os.path.dirname(os.path.abspath(name))) + "_" + host
+               for (name, host) in zip(filenames, hosts)];
+   # end if
+   return list(zip(hosts, filenames));
+   
+# end def
+
+
+
+def capture_summary(capture, stats):
+   #
+   # Returns the dictionary of values of a capture listed on the fleet
+   # index page
+   #
+   # stats = summary statistics of the capture (see summarize_capture())
+   #
+   timestamps = capture["timestamps"];
+   summary = {};
+   summary["system_info"] = capture["system_info"];
+   summary["start_time"] = capture["start_time"];
+   summary["mounts"] = len(capture["fs_data_list"]);
+   summary["samples"] = len(timestamps);
+   summary["duration"] = 0.0;
+   if (len(timestamps) > 1):
+      summary["duration"] = float(timestamps[-1] - timestamps[0]);
+   # end if
+   for name in ["rMB_svr", "wMB_svr", "ops"]:
+      peak = 0.0;
+      for item in capture["fs_data_list"]:
+         if (item["count"] > 0):
+            peak = max(peak, float(numpy.max(item[name])));
+         # end if
+      # end for
+      summary[name] = peak;
+      # Statistics of all file systems together, merged again over all
+      # hosts for the fleet row of the index
+      host_stats = stats_new();
+      for fs in stats["fs"]:
+         stats_merge(host_stats, stats["stats"][fs][name]);
+      # end for
+      summary["stats_" + name] = host_stats;
+   # end for
+   return summary;
+   
+# end def
+
+
+
+def batch_host(job):
+   #
+   # Batch worker: writes the report of one host to its own directory and
+   # returns the host's summary (see capture_summary()). The report is
+   # only rendered again when the capture (capture_key()) or the options
+   # changed since the last run; the summary is kept in summary.json next
+   # to the report for that check and for the fleet index.
+   #
+   # job = (host, capture file, host directory, options, cache_dir, use_cache)
+   #   options = dictionary of the options that change the report
+   #
+   (host, input_filename, host_dir, options, cache_dir, use_cache) = job;
+   summary_filename = os.path.join(host_dir, "summary.json");
+   try:
+      key = capture_key(input_filename);
+      if ( os.path.isfile(summary_filename) and
+           os.path.isfile(os.path.join(host_dir, "report.html")) ):
+         summary_file = open(summary_filename, 'r');
+         summary = json.load(summary_file);
+         summary_file.close();
+         if ( (summary.get("key") == key) and (summary.get("options") == options) ):
+            summary["skipped"] = 1;
+            return summary;
+         # end if
+      # end if
+      
+      start = time.time();
+      if not os.path.exists(host_dir):
+         os.makedirs(host_dir);
+      # end if
+      capture = load_or_parse(input_filename, os.path.join(cache_dir, host), use_cache,
+                              report_select);
+      x_seconds = capture["timestamps"];
+      if (len(x_seconds) > 0):
+         x_seconds = x_seconds - x_seconds[0];
+      # end if
+      stats = summarize_capture(capture);
+      write_summary(host_dir, stats);
+      sections = [summary_html(stats)];
+      anomalies = detect_anomalies(capture, x_seconds);
+      if (anomaly_params["enabled"] == 1):
+         sections.append(anomaly_html(anomalies));
+      # end if
+      render_report(input_filename, capture, x_seconds, None, options["combined_plots"],
+                    host_dir, 1, sections=sections, anomalies=anomalies);
+      
+      summary = capture_summary(capture, stats);
+      summary["host"] = host;
+      summary["file"] = input_filename;
+      summary["key"] = key;
+      summary["options"] = options;
+      summary["seconds"] = time.time() - start;
+      summary_file = open(summary_filename, 'w');
+      json.dump(summary, summary_file);
+      summary_file.close();
+      summary["skipped"] = 0;
+   except Exception as e:
+      # One bad capture should not stop the rest of the fleet
+      summary = {"host": host, "file": input_filename, "error": str(e)};
+   # end try
+   return summary;
+   
+# end def
+
+
+
+def write_fleet_index(dirname, summaries):
+   #
+   # Writes dirname/index.html: one row per host with a link to its report
+   #
+   output_list = ["<H2>\n"];
+   output_list.append("NFSIOSTAT Fleet Report (" + str(len(summaries)) + " hosts) \n");
+   output_list.append("</H2>\n");
+   output_list.append(" \n");
+   output_list.append("<P>\n");
+   output_list.append("Peak values are the largest value of any NFS mount of the host. \n");
+   output_list.append("Generated " + time.strftime("%Y-%m-%d %H:%M:%S") + ". \n");
+   output_list.append("</P>\n");
+   output_list.append("<TABLE border=\"1\"> \n");
+   output_list.append("<TR><TH>Host</TH><TH>Start</TH><TH>Duration (s)</TH>");
+   output_list.append("<TH>Mounts</TH><TH>Samples</TH><TH>Peak NFS read MB/s</TH>");
+   output_list.append("<TH>Peak NFS write MB/s</TH><TH>Peak ops/s</TH>");
+   output_list.append("<TH>p95 NFS read MB/s</TH><TH>p95 NFS write MB/s</TH><TH>p95 ops/s</TH></TR> \n");
+   fleet_stats = dict([(name, stats_new()) for name in ["rMB_svr", "wMB_svr", "ops"]]);
+   for summary in summaries:
+      host = summary["host"];
+      if ("error" in summary):
+         output_list.append("<TR><TD>" + host + "</TD><TD colspan=\"10\">Error: ");
+         output_list.append(summary["error"] + "</TD></TR> \n");
+         continue;
+      # end if
+      output_list.append("<TR><TD><a href=\"" + host + "/report.html\">" + host + "</a></TD>");
+      output_list.append("<TD>" + summary["start_time"] + "</TD>");
+      output_list.append("<TD>%.0f</TD>" % summary["duration"]);
+      output_list.append("<TD>%d</TD><TD>%d</TD>" % (summary["mounts"], summary["samples"]));
+      output_list.append("<TD>%.2f</TD><TD>%.2f</TD><TD>%.1f</TD>" % (
+                   summary["rMB_svr"], summary["wMB_svr"], summary["ops"]));
+      for name in ["rMB_svr", "wMB_svr", "ops"]:
+         if (("stats_" + name) in summary):
+            stats_merge(fleet_stats[name], summary["stats_" + name]);
+            output_list.append("<TD>%.2f</TD>" % stats_quantile(summary["stats_" + name], 0.95));
+         else:
+            output_list.append("<TD>-</TD>");
+         # end if
+      # end for
+      output_list.append("</TR> \n");
+   # end for
+   output_list.append("<TR><TD><B>All hosts</B></TD><TD colspan=\"7\"></TD>");
+   for name in ["rMB_svr", "wMB_svr", "ops"]:
+      output_list.append("<TD>%.2f</TD>" % stats_quantile(fleet_stats[name], 0.95));
+   # end for
+   output_list.append("</TR> \n");
+   output_list.append("</TABLE> \n");
+   
+   f = open(os.path.join(dirname, "index.html"), 'w');
+   f.write("".join(output_list));
+   f.close();
+   
+# end def
+
+
+
+def batch_report(pattern, combined_plots, dirname, workers, cache_dir, use_cache):
+   #
+   # Batch mode: writes the report of every capture matching pattern (see
+   # batch_inputs()) to dirname/<host>/report.html and a fleet index to
+   # dirname/index.html. Hosts are processed by a pool of worker
+   # processes, one host per task, so the run time is bounded by the
+   # number of cores rather than the number of hosts.
+   #
+   inputs = batch_inputs(pattern);
+   if (len(inputs) == 0):
+      print("No nfsiostat captures match ",pattern);
+      return;
+   # end if
+   options = {"combined_plots": combined_plots};
+   options.update(plot_reduce);
+   options["anomaly_params"] = anomaly_params;
+   options["report_format"] = report_format;
+   options["report_images"] = report_images;
+   options["report_select"] = report_select;
+   jobs = [(host, input_filename, os.path.join(dirname, host), options,
+            cache_dir, use_cache) for (host, input_filename) in inputs];
+   data = {};
+   data["figure_timing_hook"] = figure_timing_hook;
+   data["plot_reduce"] = plot_reduce;
+   data["anomaly_params"] = anomaly_params;
+   data["report_images"] = report_images;
+   data["report_select"] = report_select;
+   data["parse_tokenizer"] = parse_tokenizer;
+   
+   print("Processing ",len(jobs)," captures with ",workers," workers");
+   summaries = [];
+   if ( (workers > 1) and (multiprocessing_success == 1) and (len(jobs) > 1) ):
+      # New worker processes now and then keep memory from creeping up
+      pool = multiprocessing.Pool(min(workers, len(jobs)), plot_worker_init, (data,), 16);
+      try:
+         for summary in pool.imap_unordered(batch_host, jobs):
+            summaries.append(summary);
+            print("   Host ",summary["host"]," done (",len(summaries)," of ",len(jobs),")");
+         # end for
+      finally:
+         pool.close();
+         pool.join();
+      # end try
+   else:
+      plot_worker_init(data);
+      for job in jobs:
+         summaries.append(batch_host(job));
+      # end for
+   # end if
+   
+   summaries.sort(key=lambda summary: summary["host"]);
+   nskipped = len([1 for summary in summaries if summary.get("skipped") == 1]);
+   nerrors = len([1 for summary in summaries if "error" in summary]);
+   for summary in summaries:
+      if ("error" in summary):
+         print("Error in ",summary["file"],": ",summary["error"]);
+      # end if
+   # end for
+   write_fleet_index(dirname, summaries);
+   print("%d hosts: %d rendered, %d unchanged, %d failed" % (len(summaries),
+         len(summaries) - nskipped - nerrors, nskipped, nerrors));
+   
+# end def
+
+
+
+def option_parser():
+   #
+   # Returns the parser of the command line options. The options of
+   # earlier versions ("-c", "-r2000", "-z6", "-nocache", ...) are kept;
+   # "-j", "-f" and "-align" take an optional value, attached ("-j8",
+   # "-align=linear") or as the next argument ("-j 8").
+   #
+   parser = argparse.ArgumentParser(prog="nfsiostat_plotter_v4.py", add_help=False,
+                                    description="HTML report of nfsiostat output");
+   parser.add_argument("input", nargs="?", default=None,
+                       help="nfsiostat output file, \"-\" for standard input or a capture " +
+                            "directory (with -b: a directory or glob of files; with " +
+                            "--collect: the capture directory to write, default " +
+                            "./nfsiostat_capture)");
+   parser.add_argument("--collect", type=float, default=0.0, metavar="SECONDS",
+                       help="sample --mountstats every SECONDS seconds instead of reading " +
+                            "nfsiostat output");
+   parser.add_argument("--count", type=int, default=0,
+                       help="number of --collect snapshots (default: until Ctrl-C)");
+   parser.add_argument("--mountstats", default="/proc/self/mountstats",
+                       help="mountstats file, or a directory of recorded snapshots, for " +
+                            "--collect (default /proc/self/mountstats)");
+   parser.add_argument("-o", "--output", default="./HTML_REPORT",
+                       help="report directory (default ./HTML_REPORT)");
+   parser.add_argument("--format", choices=["png", "svg", "interactive"], default="png",
+                       help="figure image format, or an interactive report (default png)");
+   parser.add_argument("--dpi", type=int, default=0,
+                       help="resolution of the figures (default: matplotlib's)");
+   parser.add_argument("--figures", default="",
+                       help="figures to draw, comma separated: " +
+                            ", ".join(sorted(figure_choices)) + " (default all)");
+   parser.add_argument("--start", type=float, default=None,
+                       help="first second to report, from the start of the capture");
+   parser.add_argument("--end", type=float, default=None,
+                       help="last second to report, from the start of the capture");
+   parser.add_argument("--mount", action="append", default=[],
+                       help="only report file systems matching this pattern, e.g. " +
+                            "\"server1:*\" (may be repeated or comma separated)");
+   parser.add_argument("-j", "--workers", type=int, nargs="?", const=0, default=None,
+                       help="number of worker processes (\"-j\" alone or 0: one per " +
+                            "core; default 1, or one per core with -b)");
+   parser.add_argument("-b", "--batch", action="store_true",
+                       help="one report per capture of a directory or glob");
+   parser.add_argument("-c", "--combined", action="store_true",
+                       help="combine the file systems in each figure");
+   parser.add_argument("-i", "--interactive", action="store_true",
+                       help="same as --format interactive");
+   parser.add_argument("-f", "--follow", type=float, nargs="?", const=10.0, default=0.0,
+                       help="follow a capture that is still written, refreshing every " +
+                            "FOLLOW seconds (\"-f\" alone: 10)");
+   parser.add_argument("-align", "--align", choices=["nearest", "linear"], nargs="?",
+                       const="nearest", default="",
+                       help="align the iostat CPU data with the nfsiostat time stamps " +
+                            "(\"-align\" alone: nearest)");
+   parser.add_argument("--iostat", default="./iostat_file.pickle",
+                       help="iostat_plotter.py pickle or iostat_data directory " +
+                            "(default ./iostat_file.pickle)");
+   parser.add_argument("--cache-dir", default="./NFSIOSTAT_CACHE",
+                       help="directory of the parsed captures (default ./NFSIOSTAT_CACHE)");
+   parser.add_argument("-nocache", "--no-cache", action="store_true",
+                       help="do not read or write the parsed-capture cache");
+   parser.add_argument("--tokenizer", choices=["numpy", "python"], default="numpy",
+                       help="convert the data rows in blocks with numpy (default) " +
+                            "or row by row in Python");
+   parser.add_argument("-r", "--reduce", type=int, default=0,
+                       help="maximum number of points per line (default all)");
+   parser.add_argument("-lttb", "--lttb", action="store_true",
+                       help="reduce with largest-triangle-three-buckets");
+   parser.add_argument("-s", "--keep-spikes", action="store_true",
+                       help="keep the min and max of each bucket with -lttb");
+   parser.add_argument("-z", "--spike-z", type=float, default=None,
+                       help="spike threshold in standard deviations (default 4)");
+   parser.add_argument("-noanomaly", "--no-anomaly", action="store_true",
+                       help="do not detect anomalies");
+   parser.add_argument("-t", "--timing", action="store_true",
+                       help="print the time spent on each figure");
+   parser.add_argument("-h", "-H", "--help", action="store_true",
+                       help="print the help text");
+   return parser;
+   
+# end def
+
+
+
+def parse_options(argv):
+   #
+   # Parses the command line arguments argv (without the program name) and
+   # returns the options (see option_parser())
+   #
+   parser = option_parser();
+   options = parser.parse_args(argv);
+   figures = [name.strip() for name in options.figures.split(",") if len(name.strip()) > 0];
+   for name in figures:
+      if name not in figure_choices:
+         parser.error("unknown figure \"" + name + "\" (choose from " +
+                      ", ".join(sorted(figure_choices)) + ")");
+      # end if
+   # end for
+   options.figures = figures;
+   options.mount = [pattern for item in options.mount for pattern in item.split(",")
+                    if len(pattern) > 0];
+   if ( (options.start is not None) and (options.end is not None) and
+        (options.start > options.end) ):
+      parser.error("--start is after --end");
+   # end if
+   if ( (options.batch or (options.follow > 0)) and (options.input in [None, "-"]) ):
+      parser.error("-b and -f need a file name");
+   # end if
+   if ( (options.collect > 0) and (options.batch or (options.follow > 0)) ):
+      parser.error("--collect cannot be used with -b or -f");
+   # end if
+   if ( (options.collect < 0) or (options.count < 0) ):
+      parser.error("--collect and --count cannot be negative");
+   # end if
+   return options;
+   
+# end def
+
+
+
+
+
+
+
+
+
+# ===================
+# Main Python section
+# ===================
+
+if __name__ == '__main__':
+   
+   # Get the command line inputs
+   options = parse_options(sys.argv[1:]);
+   if ( options.help or ((options.input is None) and (options.collect == 0) and
+                         sys.stdin.isatty()) ):
+      help_out();
+      sys.exit();
+   # end if
+   input_filename = options.input or "-";
+   combined_plots = int(options.combined);
+   batch_flag = int(options.batch);
+   follow_interval = options.follow;
+   use_cache = 1 - int(options.no_cache);
+   align_method = options.align;
+   cache_dir = options.cache_dir;
+   parse_tokenizer = options.tokenizer;
+   dirname = options.output;
+   plot_reduce["max_points"] = options.reduce;
+   if options.lttb:
+      plot_reduce["method"] = "lttb";
+   # end if
+   if options.keep_spikes:
+      plot_reduce["keep_spikes"] = 1;
+   # end if
+   if ( options.interactive or (options.format == "interactive") ):
+      report_format = "interactive";
+   else:
+      report_images["format"] = options.format;
+   # end if
+   report_images["dpi"] = options.dpi;
+   if options.no_anomaly:
+      anomaly_params["enabled"] = 0;
+   # end if
+   if (options.spike_z is not None):
+      anomaly_params["z"] = options.spike_z;
+   # end if
+   if options.timing:
+      figure_timing_hook = print_figure_time;
+   # end if
+   report_select["mounts"] = options.mount;
+   report_select["start"] = options.start;
+   report_select["end"] = options.end;
+   report_select["figures"] = options.figures;
+   workers = options.workers;
+   if (workers is None):
+      # Batch mode uses every core unless -j says otherwise
+      workers = 1;
+      if ( (batch_flag == 1) and (multiprocessing_success == 1) ):
+         workers = multiprocessing.cpu_count();
+      # end if
+   elif (workers == 0):
+      workers = 1;
+      if (multiprocessing_success == 1):
+         workers = multiprocessing.cpu_count();
+      # end if
+   # end if
+   
+   if (options.collect > 0):
+      # Native collector: the samples go straight into a capture directory,
+      # which is then reported like any other capture
+      input_filename = options.input or "./nfsiostat_capture";
+      print("collecting ",options.mountstats," every ",options.collect," s (Ctrl-C to stop) ... ");
+      capture = collect_mountstats(options.mountstats, options.collect, options.count);
+      save_capture(input_filename, capture);
+      print("Saved ",len(capture["timestamps"])," samples of ",len(capture["fs_data_list"]),
+            " NFS mounted file systems in ",input_filename);
+   # end if
+   
+   if (batch_flag == 1):
+      print("nfsiostat plotting script (batch mode)");
+      print(" ");
+      print("input: ",input_filename);
+      if not os.path.exists(dirname):
+         os.makedirs(dirname);
+      # end if
+      batch_report(input_filename, combined_plots, dirname, workers, cache_dir, use_cache);
+      print("Finished. Please open the document ",os.path.join(dirname, "index.html")," in a browser.");
+      sys.exit();
+   # end if
+   
+   print("nfsiostat plotting script (includes iostat data)");
+   print(" ");
+   print("input filename: ",input_filename);
+   
+   # Look for iostat data: the columnar iostat_data directory, or else the
+   # iostat_file.pickle of iostat_plotter.py, which is converted to
+   # iostat_data (next to it) so later runs don't need to unpickle it, and
+   # again whenever the pickle changes (its size and mtime are kept with
+   # the converted data)
+   iostat = None;
+   iostat_path = os.path.normpath(options.iostat);
+   if os.path.isdir(iostat_path):
+      iostat_dir = iostat_path;
+   else:
+      iostat_dir = os.path.join(os.path.dirname(iostat_path), "iostat_data");
+      if ( os.path.isfile(iostat_path) and (pickle_success > 0) ):
+         source = iostat_source(iostat_path);
+         if (iostat_current(iostat_dir, source) == 0):
+            print("Converting ",iostat_path," to ",iostat_dir);
+            pickle_file = open(iostat_path, 'rb');
+            save_iostat(iostat_dir, load_pickle(pickle_file), source);
+            pickle_file.close();
+         # end if
+      # end if
+   # end if
+   if os.path.isdir(iostat_dir):
+      print("Reading ",iostat_dir);
+      iostat = load_iostat(iostat_dir);
+   # end if
+   
+   # Define fixed variables
+   fsize = 8;
+   
+   # HTML Report initialization
+   #    Write all data files to the output directory (HTML_REPORT)
+   #    File is report.html
+   if not os.path.exists(dirname):
+      os.makedirs(dirname);
+   # end if
+   
+   if (follow_interval > 0):
+      # Follow mode: keep plots bounded so refreshes take the same time
+      if (plot_reduce["max_points"] == 0):
+         plot_reduce["max_points"] = 2000;
+      # end if
+      print(" ");
+      print("following nfsiostat output file (refresh every ",follow_interval," s, Ctrl-C to stop) ... ");
+      try:
+         follow_report(input_filename, iostat, combined_plots, dirname, workers,
+                       follow_interval);
+      except KeyboardInterrupt:
+         print(" ");
+         print("Stopped. The report is in ",os.path.join(dirname, "report.html"));
+      # end try
+      sys.exit();
+   # end if
+   
+   # Use the parsed data from an earlier run on the same capture if there
+   # is one, otherwise parse the input file and save it for the next run
+   print(" ");
+   capture = load_or_parse(input_filename, cache_dir, use_cache, report_select);
+   capture_dir = os.path.dirname(os.path.abspath(input_filename));
+   if (input_filename == "-"):
+      input_filename = "standard input";
+      capture_dir = os.getcwd();
+   # end if
+   
+   fs_data_list = capture["fs_data_list"];
+   icount = len(capture["timestamps"]);
+   print("Finished reading ",icount," data points for ",len(fs_data_list)," NFS mounted file systems.");
+   print("Creating plots and HTML report");
+   
+   # Create time list for x-axis data (seconds from the first timestamp)
+   x_seconds = capture["timestamps"];
+   if (len(x_seconds) > 0):
+      x_seconds = x_seconds - x_seconds[0];
+   # end if
+   
+   # Without -align the CPU data keeps its own time axis; limit it to the
+   # same time window as the nfsiostat data
+   if ( (iostat is not None) and (len(align_method) == 0) and
+        ((report_select["start"] is not None) or (report_select["end"] is not None)) ):
+      window_start = report_select["start"] or 0.0;
+      window_end = report_select["end"];
+      if (window_end is None):
+         window_end = numpy.inf;
+      # end if
+      keep = (iostat["x_seconds"] >= window_start) & (iostat["x_seconds"] <= window_end);
+      iostat = dict(iostat);
+      iostat["x_seconds"] = numpy.asarray(iostat["x_seconds"])[keep] - window_start;
+      iostat["time_sum_list"] = numpy.asarray(iostat["time_sum_list"])[keep];
+   # end if
+   
+   # Align the iostat CPU data with the nfsiostat samples: the CPU plots
+   # then share the nfsiostat time axis and the report gets correlations
+   sections = [];
+   if ( (iostat is not None) and (len(align_method) > 0) ):
+      joined = join_iostat(capture, iostat, align_method);
+      if (len(joined["t"]) > 0):
+         print("Aligned iostat and nfsiostat on ",len(joined["t"])," time points");
+         iostat = dict(iostat);
+         iostat["x_seconds"] = joined["t"] - capture["timestamps"][0];
+         iostat["time_sum_list"] = joined["cpu"];
+         sections.append(correlation_html(joined));
+      else:
+         print("iostat and nfsiostat captures do not overlap in time - not aligned");
+      # end if
+   # end if
+   
+   # Summary statistics of each file system, in the report and in
+   # stats.json / stats.csv
+   summary = summarize_capture(capture);
+   write_summary(dirname, summary);
+   sections.insert(0, summary_html(summary));
+   
+   # Spikes and saturation, listed in the report and shaded in the figures
+   anomalies = detect_anomalies(capture, x_seconds);
+   if (anomaly_params["enabled"] == 1):
+      sections.insert(1, anomaly_html(anomalies));
+   # end if
+   
+   # Actually create the plots!!
+   render_report(input_filename, capture, x_seconds, iostat, combined_plots, dirname,
+                 workers, sections=sections, anomalies=anomalies);
+   
+   
+   # Save the nfsiostat data for other tools next to the capture (in the
+   # current directory for standard input; same layout as the cache, see
+   # save_capture())
+   save_capture(os.path.join(capture_dir, "nfsiostat_data"), capture);
+   print("Finished. Please open the document ",os.path.join(dirname, "report.html")," in a browser.");
    
 # end
@@ -14,6 +14,13 @@
     ## Not implemented
     - Add podpora pro dalsi username mimo SYS, napr. SYSTEM, DBSNMP
 
+    ## 2026-10-18
+    - Add parallel mode s omezenym poctem workeru (-j) a limitem na host (--max-per-host)
+    - Change run_db vraci vysledky (ORA- chyby s cislem radku, exit status, cas)
+    - Add --stream cteni vystupu sqlplus po radcich a --abort-on-error
+    - Add INFP lookup pres jednu session pro vsechny databaze a cache na disku
+      (--infp-cache-ttl, --refresh-infp)
+
     ## 2019-06-18
     - Change Oracle version to 19.3
 
@@ -37,13 +44,18 @@ from __future__ import unicode_literals
 from __future__ import print_function
 
 import argparse
+import json
 import logging
 import os
 import sys
 import re
+import time
 import multiprocessing
+import queue
 from subprocess import Popen, PIPE
-from collections import Counter
+from tempfile import TemporaryFile
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import requests
 from requests.auth import HTTPBasicAuth
@@ -95,11 +107,34 @@ ORACLE_ERRORS = (
     'SP2-'
 )
 
+# --stream: buffer pro zapis logu, vystup sqlplus se necte cely do pameti
+LOG_BUFFER_SIZE = 1024 * 1024
+
 # INFP Rest API
+# cache_file/cache_ttl: cache connect_descriptor, env_status a app_name na disku
+# na cache_ttl sekund, 0 = bez cache; workers = soucasne INFP requesty
 INFP_REST_OPTIONS = {
     'url': 'https://oem12.vs.csin.cz:1528/ords/api/v1/db',
     'user': '',
-    'pass': ''
+    'pass': '',
+    'cache_file': os.path.join(
+        os.path.expanduser('~'), '.cache', 'oracle-ci-deploy', 'infp.json'),
+    'cache_ttl': 3600,
+    'workers': 8
+    }
+
+# INFP polozky, ktere se ukladaji do cache
+INFP_CACHE_FIELDS = (
+    'connect_descriptor',
+    'env_status',
+    'app_name'
+)
+
+# Parallel mode: max. number of databases deployed at once and max. number
+# of them on one host (RAC cluster SCAN address), 0 = no per host limit
+PARALLEL_OPTIONS = {
+    'workers': 8,
+    'per_host': 0
     }
 
 # JIRA Rest API
@@ -113,6 +148,9 @@ JIRA_REST_OPTIONS = {
 # global timestamp pro vsechny generovane logy
 TIMESTAMP = datetime.now().strftime("%Y%m%d_%H%M%S")
 
+# INFP session, jedna pro kazdy proces (pid)
+INFP_SESSION = {}
+
 class OracleCIError(Exception):
   """Jenkins Oracle CI Exception"""
   pass
@@ -236,7 +274,23 @@ def read_yaml_config(config_file):
     raise
 
 
-def get_db_info(infp_rest_options, dbname):
+def get_infp_session(infp_rest_options):
+  """Pooled requests.Session for INFP, one per process"""
+
+  # po fork() nepouzivat spojeni rodice
+  session = INFP_SESSION.get(os.getpid())
+  if session is None:
+    INFP_SESSION.clear()
+    session = requests.Session()
+    session.auth = HTTPBasicAuth(
+        infp_rest_options['user'], infp_rest_options['pass'])
+    session.mount('https://', requests.adapters.HTTPAdapter(
+        pool_maxsize=infp_rest_options['workers']))
+    INFP_SESSION[os.getpid()] = session
+  return session
+
+
+def fetch_db_info(infp_rest_options, dbname):
   """Rest API call to INFP"""
 
   # CA cert file - nepoužívá se
@@ -245,10 +299,8 @@ def get_db_info(infp_rest_options, dbname):
   else:
     verify = False
 
-  resp = requests.get(
+  resp = get_infp_session(infp_rest_options).get(
       '/'.join([infp_rest_options['url'], dbname]),
-      auth=HTTPBasicAuth(
-          infp_rest_options['user'], infp_rest_options['pass']),
       verify=False
   )
   try:
@@ -259,6 +311,109 @@ def get_db_info(infp_rest_options, dbname):
         .format(dbname))
 
 
+def read_infp_cache(infp_rest_options):
+  """Read INFP cache file, {url/dbname: {'time': ..., <INFP_CACHE_FIELDS>}}"""
+  try:
+    with open(infp_rest_options['cache_file'], 'r') as fd:
+      return json.load(fd)
+  except (IOError, ValueError):
+    return {}
+
+
+def write_infp_cache(infp_rest_options, cache):
+  """Write INFP cache file (atomic replace)"""
+  cache_file = infp_rest_options['cache_file']
+  try:
+    os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+    with open(cache_file + '.' + str(os.getpid()), 'w') as fd:
+      json.dump(cache, fd, indent=1, sort_keys=True)
+    os.replace(cache_file + '.' + str(os.getpid()), cache_file)
+  except OSError as exc:
+    logging.warning('INFP cache %s not written: %s', cache_file, exc)
+
+
+def invalidate_db_info(infp_rest_options, dbnames=None):
+  """Remove dbnames (None = all) from the INFP cache"""
+  # cache vypnuta (cache_ttl 0), soubor nemenit
+  if infp_rest_options['cache_ttl'] <= 0:
+    return
+  cache = read_infp_cache(infp_rest_options)
+  if dbnames is None:
+    cache = {}
+  else:
+    for dbname in dbnames:
+      cache.pop('/'.join([infp_rest_options['url'], dbname]), None)
+  write_infp_cache(infp_rest_options, cache)
+
+
+def get_db_infos(infp_rest_options, dbnames, use_cache=True):
+  """
+  INFP info for all dbnames at once
+
+  Databases in the disk cache younger than cache_ttl come from there, the
+  others are fetched concurrently over one pooled session and cached.
+  use_cache=False fetches all of them (--check-prod must not trust a
+  cached env_status), the cache is still updated.
+
+  :return: dict dbname: dbinfo, or the exception of a failed lookup
+  """
+
+  ttl = infp_rest_options['cache_ttl']
+  cache = read_infp_cache(infp_rest_options) if ttl > 0 else {}
+  now = time.time()
+
+  dbinfos = {}
+  for dbname in (dbnames if use_cache else []):
+    entry = cache.get('/'.join([infp_rest_options['url'], dbname]))
+    if entry and now - entry['time'] < ttl:
+      dbinfos[dbname] = dict((key, entry[key]) for key in INFP_CACHE_FIELDS)
+
+  def lookup(dbname):
+    try:
+      return fetch_db_info(infp_rest_options, dbname)
+    except (ValueError, requests.RequestException) as exc:
+      return exc
+
+  missing = [dbname for dbname in OrderedDict.fromkeys(dbnames)
+             if dbname not in dbinfos]
+  logging.info('INFP: %d databases cached, %d to fetch',
+               len(dbinfos), len(missing))
+
+  if missing:
+    with ThreadPoolExecutor(min(infp_rest_options['workers'], len(missing))) as pool:
+      for dbname, dbinfo in zip(missing, pool.map(lookup, missing)):
+        dbinfos[dbname] = dbinfo
+        # do cache jen kompletni odpovedi
+        if (ttl > 0 and isinstance(dbinfo, dict)
+            and all(key in dbinfo for key in INFP_CACHE_FIELDS)):
+          entry = dict((key, dbinfo[key]) for key in INFP_CACHE_FIELDS)
+          entry['time'] = now
+          cache['/'.join([infp_rest_options['url'], dbname])] = entry
+
+    if ttl > 0:
+      write_infp_cache(infp_rest_options, cache)
+
+  return dbinfos
+
+
+def get_db_info(infp_rest_options, dbname, use_cache=True):
+  """INFP info for dbname (cached)"""
+  dbinfo = get_db_infos(infp_rest_options, [dbname], use_cache)[dbname]
+  if isinstance(dbinfo, Exception):
+    raise dbinfo
+  return dbinfo
+
+
+def get_db_host(connect_descriptor):
+  """Host (for RAC the cluster SCAN address) from a connect descriptor"""
+
+  # (DESCRIPTION=...(HOST=...)...) or EZConnect host[:port][/service]
+  match = re.search(r'\(HOST\s*=\s*([^)\s]+)', connect_descriptor, re.IGNORECASE)
+  if match:
+    return match.group(1).lower()
+  return re.split(r'[:/]', connect_descriptor.lstrip('/'))[0].lower()
+
+
 def check_for_app(db_app, app):
   """Kontrola, zda je databaze registrovana v OLI pro danou APP"""
   if app.upper() not in db_app:
@@ -284,89 +439,161 @@ def check_for_restricted_sql(script):
               'Restricted SQL: {} found on line {}'.format(sql, line))
 
 
-def check_for_error(log_file):
-  """ Kontrola na ORA- a SP- chyby"""
+def execute_sql_script(dbname, connect_string, sql_script, log_file,
+                       print_line, stream=False, abort_on_error=False):
+  """
+  Run SQL script with connect description
+
+  With stream the sqlplus output is read and logged line by line as it
+  comes, a connection error kills the session at once and with
+  abort_on_error so does the first ORA- / SP2- error.
+
+  :return: dict script, log_file, ora_errors [(log line number, line)],
+           returncode, duration, aborted - (log line number, line) of the
+           error that stopped the script with abort_on_error, else None
+  """
 
+  # parse ORA errors
   ora_errors = []
+  aborted = None
+  start = time.time()
 
-  with open(log_file, 'r') as fd:
-    for line in fd:
-      # parse ORA- errors
-      if line.rstrip().startswith(ORACLE_ERRORS):
-        ora_errors.append(line)
+  # stream: STDERR do souboru, plna pipe by zablokovala sqlplus
+  stderr_fd = TemporaryFile('w+') if stream else PIPE
+
+  try:
+    session = Popen(connect_string.split(),
+                    stdin=PIPE,
+                    stdout=PIPE,
+                    stderr=stderr_fd,
+                    universal_newlines=True)
+    session.stdin.write('''
+      select
+        '|'
+        || to_char(sysdate, 'YYYY-MM-DD"T"HH24:MI:SS') ||'|'
+        || name ||'|'
+        || SYS_CONTEXT ('USERENV', 'SESSION_USER')
+        || '|'
+          as "|timestamp|database_name|user|"
+        from v$database;
+      ''' + os.linesep)
+    session.stdin.write('@"{}"'.format(sql_script))
+
+    if stream:
+      session.stdin.close()
+      output = (line.rstrip('\n') for line in session.stdout)
+    else:
+      (stdout, stderr) = session.communicate()
+
+      # FIXME: sqlplus pri chybe nevraci STDERR !
+      if stderr:
+        raise ValueError('SQL script {} failed with error: {}'.format(
+            sql_script, stderr))
+
+      output = stdout.splitlines()
+
+    # sqlplus dobehl (nebo byl ukoncen)
+    finished = False
+
+    if stream or output:
+      with open(log_file, 'w', buffering=LOG_BUFFER_SIZE) as logfile_fd:
+        try:
+          # print and save sqlplus results with newlines
+          for line_no, line in enumerate(output):
+
+            # SERIAL mode: print line on STDOUT
+            if print_line:
+              print(line, flush=stream)
+
+            # and save to file
+            logfile_fd.write(line + '\n\n')
+
+            # SQLcl: nutno provest strip na Error Message =
+            if line.strip().strip('Error Message = ').startswith(ORACLE_EXCEPTIONS):
+              raise OracleCIError('connection failed to {}'.format(dbname))
+
+            # parse ORA- errors, kazdy radek je v logu s prazdnym radkem navic
+            if line.rstrip().startswith(ORACLE_ERRORS):
+              ora_errors.append((2 * line_no + 1, line))
+
+              if abort_on_error:
+                logging.warning('%s: %s, aborting %s', dbname, line, sql_script)
+                aborted = ora_errors[-1]
+                break
+          else:
+            finished = True
+        finally:
+          # stream: ukonci sqlplus pri chybe
+          if stream and not finished:
+            session.kill()
+            session.wait()
+
+    if stream:
+      session.wait()
+      stderr_fd.seek(0)
+      stderr = stderr_fd.read()
+
+      # po abort je vysledkem ORA- chyba, ne STDERR ukonceneho sqlplus
+      if stderr and aborted:
+        logging.warning('%s: %s stderr: %s', dbname, sql_script, stderr)
+      elif stderr:
+        raise ValueError('SQL script {} failed with error: {}'.format(
+            sql_script, stderr))
+  finally:
+    # stream: TemporaryFile zavrit i pri vyjimce
+    if stream:
+      stderr_fd.close()
 
-  return ora_errors
+  # logging.debug('ora_errors: {}'.format(ora_errors))
+  return {
+      'script': sql_script,
+      'log_file': log_file,
+      'ora_errors': ora_errors,
+      'returncode': session.returncode,
+      'duration': time.time() - start,
+      'aborted': aborted}
 
 
-def execute_sql_script(dbname, connect_string, sql_script, log_file,
-                       print_line):
+def db_result(dbname, error=None):
   """
-  Run SQL script with connect description
+  Empty result of run_db, error = why the deploy failed
 
-  :return: ora_errors
+  aborted is the script result stopped by --abort-on-error and skipped
+  the scripts that did not run after it.
   """
+  return {
+      'dbname': dbname,
+      'scripts': [],
+      'duration': 0.0,
+      'error': error,
+      'aborted': None,
+      'skipped': []}
 
-  # parse ORA errors
-  ora_errors = []
 
-  session = Popen(connect_string.split(),
-                  stdin=PIPE,
-                  stdout=PIPE,
-                  stderr=PIPE,
-                  universal_newlines=True)
-  session.stdin.write('''
-    select
-      '|'
-      || to_char(sysdate, 'YYYY-MM-DD"T"HH24:MI:SS') ||'|'
-      || name ||'|'
-      || SYS_CONTEXT ('USERENV', 'SESSION_USER')
-      || '|'
-        as "|timestamp|database_name|user|"
-      from v$database;
-    ''' + os.linesep)
-  session.stdin.write('@"{}"'.format(sql_script))
-
-  (stdout, stderr) = session.communicate()
-
-  # FIXME: sqlplus pri chybe nevraci STDERR !
-  if stderr:
-    raise ValueError('SQL script {} failed with error: {}'.format(
-        sql_script, stderr))
-
-  if stdout:
-    with open(log_file, 'w') as logfile_fd:
-      # print and save sqlplus results with newlines
-      for line in stdout.splitlines():
-
-        # SERIAL mode: print line on STDOUT
-        if print_line:
-          print(line)
-
-        # and save to file
-        print(line + '\n', file=logfile_fd)
-        # fd.write(line + '\n')
-
-        # SQLcl: nutno provest strip na Error Message =
-        if line.strip().strip('Error Message = ').startswith(ORACLE_EXCEPTIONS):
-          raise OracleCIError('connection failed to {}'.format(dbname))
-
-        # parse ORA- errors
-        if line.rstrip().startswith(ORACLE_ERRORS):
-          ora_errors.append(line)
+def skip_databases(databases, aborted):
+  """Results for databases not started after aborted (--abort-on-error)"""
+  error = 'not started, {} aborted'.format(aborted['dbname'])
+  return [db_result(dbname, error) for dbname in databases]
 
-  # logging.debug('ora_errors: {}'.format(ora_errors))
-  return ora_errors
 
+def run_db(dbname, cfg, check_prod, print_line, dbinfo=None):
+  """
+  Execute SQL againt dbname
 
-def run_db(dbname, cfg, check_prod, print_line):
-  """Execute SQL againt dbname"""
+  :return: db_result() with the results of execute_sql_script()
+  """
 
-  ora_errors = []
+  result = db_result(dbname)
+  start = time.time()
 
   logging.info('user: %s', cfg['variables']['user'])
   logging.info('dbname: %s', dbname)
 
-  dbinfo = get_db_info(INFP_REST_OPTIONS, dbname)
+  # dbinfo uz muze byt nactene (get_db_infos pro vsechny databaze)
+  if dbinfo is None:
+    dbinfo = get_db_info(INFP_REST_OPTIONS, dbname, use_cache=not check_prod)
+  elif isinstance(dbinfo, Exception):
+    raise dbinfo
   logging.debug('dbinfo: %s', dbinfo)
 
   # check for production env
@@ -382,22 +609,175 @@ def run_db(dbname, cfg, check_prod, print_line):
   if 'SYS' in cfg['variables']['user'].upper():
     connect_string += ' AS SYSDBA'
 
-  for sql_script in convert_to_dict(cfg['script']):
+  scripts = convert_to_dict(cfg['script'])
+  for (index, sql_script) in enumerate(scripts):
     # generate log_file pro zapis
     log_file = get_logfile(sql_script, dbname)
 
-    ora_error = execute_sql_script(
-        dbname, connect_string, sql_script, log_file, print_line)
-
-    # extend ora_error
-    if ora_error:
-      ora_errors.extend(ora_error)
+    script = execute_sql_script(
+        dbname, connect_string, sql_script, log_file, print_line,
+        cfg['stream'], cfg['abort_on_error'])
+    result['scripts'].append(script)
 
     # upload attachment to JIRA ticket
     if cfg['jira']:
       jira_upload_attachment(cfg['jira'], log_file)
 
-  return ora_errors
+    # --abort-on-error: dalsi skripty na teto databazi uz nespoustet
+    if script['aborted']:
+      result['aborted'] = script
+      result['skipped'] = scripts[index + 1:]
+      break
+
+  result['duration'] = time.time() - start
+  return result
+
+
+def run_parallel(databases, dbinfos, cfg, check_prod, workers, per_host):
+  """
+  Run run_db() for databases in a bounded pool of worker processes
+
+  At most `workers` databases run at once and at most `per_host` of them
+  on one host, 0 = no per host limit. The next waiting database starts as
+  soon as one finishes; results come back through a queue.
+
+  A database aborted by --abort-on-error stops the scheduling: the ones
+  still waiting are not started and get a result with 'error' set.
+
+  :return: list of run_db() results in the order of databases, a failed
+           database has the exception text in 'error'
+  """
+
+  if workers < 1 or per_host < 0:
+    raise ValueError('workers must be >= 1 and per_host >= 0, got {} and {}'
+                     .format(workers, per_host))
+
+  results = []
+
+  # per host queue of databases waiting for a free slot (host from INFP
+  # dbinfos), without a per host limit every database is its own queue
+  pending = OrderedDict()
+  for dbname in databases:
+    if isinstance(dbinfos[dbname], Exception):
+      results.append(db_result(dbname, str(dbinfos[dbname])))
+      continue
+    host = dbname
+    if per_host and 'connect_descriptor' in dbinfos[dbname]:
+      host = get_db_host(dbinfos[dbname]['connect_descriptor'])
+    pending.setdefault(host, deque()).append(dbname)
+
+  logging.info('parallel: %d databases, %d workers, %s per host',
+               len(databases), workers, per_host or 'no limit')
+
+  # result channel, filled by the pool callbacks
+  channel = queue.Queue()
+  running = Counter()
+  active = 0
+
+  with multiprocessing.Pool(max(1, min(workers, len(databases)))) as pool:
+    while pending or active:
+      # start waiting databases while there are free slots
+      for host in list(pending):
+        while (active < workers and pending[host]
+               and (not per_host or running[host] < per_host)):
+          dbname = pending[host].popleft()
+          pool.apply_async(
+              run_db, (dbname, cfg, check_prod, False, dbinfos[dbname]),
+              callback=lambda res, h=host: channel.put((h, res)),
+              error_callback=lambda exc, db=dbname, h=host: channel.put(
+                  (h, db_result(db, str(exc)))))
+          running[host] += 1
+          active += 1
+        if not pending[host]:
+          del pending[host]
+
+      if not active:
+        break
+
+      # wait for one database to finish
+      (host, result) = channel.get()
+      running[host] -= 1
+      active -= 1
+      results.append(result)
+
+      # --abort-on-error: dalsi databaze uz nespoustet, bezici dobehnou
+      if result['aborted'] and pending:
+        waiting = [dbname for host in pending for dbname in pending[host]]
+        logging.warning('%s aborted, not starting %s',
+                        result['dbname'], ', '.join(waiting))
+        results.extend(skip_databases(waiting, result))
+        pending.clear()
+
+  # kazda databaze musi mit vysledek, jinak by deploy "prosel" bez behu
+  missing = set(databases) - set(result['dbname'] for result in results)
+  if missing:
+    raise OracleCIError('no result for {}'.format(', '.join(sorted(missing))))
+
+  return sorted(results, key=lambda result: databases.index(result['dbname']))
+
+
+def report_results(results):
+  """
+  Log summary per database and print counted ORA- / SP2- errors
+
+  :return: list of failed databases (exception, --abort-on-error or
+           non-zero sqlplus exit)
+  """
+
+  ora_errors = []
+  # kde se chyba vyskytla poprve, log_file:line
+  first_seen = {}
+  failed = []
+
+  for result in results:
+    if result['error']:
+      logging.error('%s: %s', result['dbname'], result['error'])
+      failed.append(result['dbname'])
+      continue
+
+    for script in result['scripts']:
+      for (line_no, line) in script['ora_errors']:
+        ora_errors.append(line)
+        first_seen.setdefault(line, '{}:{}'.format(script['log_file'], line_no))
+
+    returncodes = [script['returncode'] for script in result['scripts']]
+    logging.info('%s: %d scripts, %d ORA- errors, exit status %s, %.1f s',
+                 result['dbname'], len(result['scripts']),
+                 sum(len(script['ora_errors']) for script in result['scripts']),
+                 ','.join(str(code) for code in returncodes), result['duration'])
+    if result['aborted']:
+      (line_no, line) = result['aborted']['aborted']
+      logging.error('%s: %s aborted on %s (%s:%d), skipped: %s',
+                    result['dbname'], result['aborted']['script'], line,
+                    result['aborted']['log_file'], line_no,
+                    ', '.join(result['skipped']) or '-')
+      failed.append(result['dbname'])
+    elif any(returncodes):
+      failed.append(result['dbname'])
+
+  # vypis ORA- / SP- errors
+  if ora_errors:
+    logging.warning('ORA- errors found')
+    for key, value in counter(ora_errors).most_common():
+      print("{}x : {} ({})".format(value, key, first_seen[key]))
+
+  return failed
+
+
+def positive_int(value):
+  """argparse type: integer >= 1"""
+  number = int(value)
+  if number < 1:
+    raise argparse.ArgumentTypeError('{} is not >= 1'.format(value))
+  return number
+
+
+def non_negative_int(value):
+  """argparse type: integer >= 0"""
+  number = int(value)
+  if number < 0:
+    raise argparse.ArgumentTypeError('{} is not >= 0'.format(value))
+  return number
 
 
 def main(args):
@@ -414,12 +794,14 @@ def main(args):
           'user': 'SYS'},
       'stage': ['deploy'],
       'script': [],
+      'stream': False,
+      'abort_on_error': False,
       'jira': None}
 
   logging.debug('args: %s', args)
 
-  # zachyceni ORA- a SP- errors
-  ora_errors = []
+  # vysledky run_db() pro vsechny databaze
+  results = []
 
   # override cfg with config file
   if args.config_file:
@@ -472,6 +854,12 @@ def main(args):
   if args.script:
     cfg['script'] = [' '.join(args.script)]
 
+  # cteni vystupu sqlplus po radcich, --abort-on-error vyzaduje --stream
+  if args.abort_on_error:
+    cfg['abort_on_error'] = True
+  if args.stream or cfg['abort_on_error']:
+    cfg['stream'] = True
+
   # print SQL skript to run
   logging.info('sql script file: %s', cfg['script'])
 
@@ -502,48 +890,36 @@ def main(args):
   # iterate over ALL databases
   databases = convert_to_dict(cfg['variables']['database'])
 
+  # INFP info pro vsechny databaze najednou
+  INFP_REST_OPTIONS['cache_ttl'] = args.infp_cache_ttl
+  if args.refresh_infp:
+    invalidate_db_info(INFP_REST_OPTIONS, databases)
+  # --check-prod: env_status vzdy aktualni z INFP, ne z cache
+  dbinfos = get_db_infos(INFP_REST_OPTIONS, databases,
+                         use_cache=not args.check_prod)
+
   if args.parallel:
     # parallel multiprocessing
     # print_lines=False
-    # ora_errors - ziska se dodatecne z logu
-    all_processes = [multiprocessing.Process(target=run_db, args=(
-        dbname, cfg, args.check_prod, False)) for dbname in databases]
-
-    # start
-    for p in all_processes:
-      p.start()
-
-    # wait for finish
-    for p in all_processes:
-      p.join()
-
-    # check for errors from in parallel mode z vytvorenych log_file's
-    for dbname in databases:
-      for sql_script in convert_to_dict(cfg['script']):
-        # generate log_file pro zapis
-        log_file = get_logfile(sql_script, dbname)
-
-        # kontrola a zapis do ora_errors[]
-        ora_error = check_for_error(log_file)
-        if ora_error:
-          ora_errors.extend(ora_error)
+    # vysledky vraci workery pres result queue
+    results = run_parallel(
+        databases, dbinfos, cfg, args.check_prod, args.workers, args.per_host)
 
   else:
     # SERIAL mode
     # print_line=True - vypisuje vystup ze sqlplus na STDOUT
-    for dbname in databases:
-      ora_error = run_db(dbname, cfg, args.check_prod, print_line=True)
+    for (index, dbname) in enumerate(databases):
+      results.append(run_db(dbname, cfg, args.check_prod, print_line=True,
+                            dbinfo=dbinfos[dbname]))
 
-      # poznamenej si rovnou ora_error
-      if ora_error:
-        ora_errors.extend(ora_error)
+      # --abort-on-error: dalsi databaze uz nespoustet
+      if results[-1]['aborted']:
+        results.extend(skip_databases(databases[index + 1:], results[-1]))
+        break
 
-  # vypis ORA- / SP- errors
-  if ora_errors:
-    logging.warning('ORA- errors found')
-    # logging.debug('ora_errors: %s', ora_errors)
-    for key, value in counter(ora_errors).most_common():
-      print("{}x : {} ".format(value, key))
+  failed = report_results(results)
+  if failed:
+    raise OracleCIError('deploy failed on {}'.format(', '.join(failed)))
 
 
 if __name__ == "__main__":
@@ -555,6 +931,14 @@ if __name__ == "__main__":
                       help="Username to connect")
   parser.add_argument('-p', '--parallel', action="store_true", dest="parallel",
                       help="parallel processing")
+  parser.add_argument('-j', '--jobs', action="store", dest="workers", type=positive_int,
+                      default=PARALLEL_OPTIONS['workers'],
+                      help="max. databases at once in parallel mode (default %(default)s)")
+  parser.add_argument('--max-per-host', action="store", dest="per_host",
+                      type=non_negative_int,
+                      default=PARALLEL_OPTIONS['per_host'],
+                      help="max. databases at once on one host/cluster in parallel "
+                           "mode (default %(default)s = no limit)")
   parser.add_argument('--app', action="store", dest="app",
                       help="SAS App name")
   parser.add_argument('--config', action="store", dest="config_file",
@@ -565,6 +949,17 @@ if __name__ == "__main__":
                       help="do not check for restricted SQL")
   parser.add_argument('--check-prod', action="store_true", dest="check_prod",
                       help="check for prod env")
+  parser.add_argument('--infp-cache-ttl', action="store", dest="infp_cache_ttl",
+                      type=int, default=INFP_REST_OPTIONS['cache_ttl'],
+                      help="seconds to reuse cached INFP info, 0 = no cache "
+                           "(default %(default)s)")
+  parser.add_argument('--refresh-infp', action="store_true", dest="refresh_infp",
+                      help="drop the cached INFP info of the databases first")
+  parser.add_argument('--stream', action="store_true", dest="stream",
+                      help="read and log sqlplus output line by line")
+  parser.add_argument('--abort-on-error', action="store_true", dest="abort_on_error",
+                      help="stop the script at the first ORA- / SP2- error "
+                           "(implies --stream)")
   parser.add_argument('script', metavar='sql filename', type=str, nargs='*',
                       default=None, help='SQL script to execute')
   arguments = parser.parse_args()
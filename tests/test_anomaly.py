@@ -0,0 +1,92 @@
+#
+# Tests of the spike and saturation detection of nfsiostat_plotter_v4.py
+# (detect_series(), detect_add() through follow_update()) and of the
+# shading of the regions on the figures
+#
+import os
+import sys
+
+import pytest
+
+numpy = pytest.importorskip("numpy");
+pytest.importorskip("matplotlib");
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))));
+import nfsiostat_plotter_v4 as nfsiostat
+
+
+
+def series():
+   # noise around 10, a spike at 200 and a plateau at 50 over 300 .. 359
+   rng = numpy.random.RandomState(5);
+   y = 10.0 + rng.normal(0.0, 1.0, 400);
+   y[200] = 100.0;
+   y[300:360] = 50.0 + rng.normal(0.0, 0.1, 60);
+   return y;
+
+# end def
+
+
+
+def test_detect_series():
+   y = series();
+   (spike, score, plateau) = nfsiostat.detect_series(y, nfsiostat.anomaly_params);
+   assert spike[200];
+   assert score[200] > 50.0;
+   assert not spike[0:200].any();
+   assert not spike[201:300].any();
+   assert nfsiostat.mask_runs(plateau) == [(300, 360)];
+
+   # an idle mount has neither
+   (spike, score, plateau) = nfsiostat.detect_series(numpy.zeros(500), nfsiostat.anomaly_params);
+   assert not spike.any();
+   assert not plateau.any();
+
+# end def
+
+
+
+def test_follow_detection():
+   # the regions found as the samples arrive in chunks of various sizes
+   y = series();
+   item = nfsiostat.fs_new("server1:/a", capacity=4);
+   capture = {"fs_data_list": [item]};
+   follow = nfsiostat.follow_new();
+   start = 0;
+   for stop in [1, 7, 150, 201, 230, 310, 345, 346, 400]:
+      for i in range(start, stop):
+         nfsiostat.fs_append(item, ["%.17g" % y[i]] * 9);
+      # end for
+      capture["timestamps"] = 1000.0 + 2.0 * numpy.arange(stop);
+      anomalies = nfsiostat.follow_update(follow, capture);
+      start = stop;
+   # end for
+
+   for name in nfsiostat.anomaly_fields:
+      regions = [region for region in anomalies["server1:/a"] if region["series"] == name];
+      spikes = [(region["start"], region["stop"]) for region in regions
+                if region["kind"] == "spike"];
+      assert (200, 201) in spikes;
+      assert [(region["start"], region["stop"], region["x0"]) for region in regions
+              if region["kind"] == "saturation"] == [(300, 360, 599.0)];
+   # end for
+
+# end def
+
+
+
+def test_shading_removed(tmp_path):
+   # the shading of one figure is not left on the template for the next
+   x = numpy.arange(100.0);
+   args = (x, x, x, x, "Time", "a", "b", "a", "b", 8, 7);
+   nfsiostat.Two_Chart(*(args + (str(tmp_path / "one"), 1.0)),
+                       spans=[(10.0, 20.0, "red"), (40.0, 45.0, "orange")]);
+   (fig, lines) = list(nfsiostat.chart_templates.values())[-1];
+   for ax in fig.axes:
+      assert len(ax.patches) == 0;
+   # end for
+   nfsiostat.Two_Chart(*(args + (str(tmp_path / "two"), 1.0)));
+   assert os.path.isfile(str(tmp_path / "one.png"));
+   assert os.path.isfile(str(tmp_path / "two.png"));
+
+# end def
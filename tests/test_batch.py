@@ -0,0 +1,85 @@
+#
+# Tests of the batch (fleet) mode of nfsiostat_plotter_v4.py
+# (batch_inputs(), batch_host() and batch_report())
+#
+import os
+import sys
+
+import pytest
+
+numpy = pytest.importorskip("numpy");
+pytest.importorskip("matplotlib");
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))));
+import nfsiostat_plotter_v4 as nfsiostat
+
+header = ("Filesystem:           rMB_nor/s    wMB_nor/s    rMB_dir/s    wMB_dir/s    " +
+          "rMB_svr/s    wMB_svr/s     ops/s    rops/s    wops/s");
+
+
+
+def write_capture(path, nsamples, peak):
+   lines = ["Linux 3.10.0-123.el7.x86_64 (testhost) 04/10/2014 _x86_64_ (8 CPU)", ""];
+   for i in range(nsamples):
+      value = peak if (i == nsamples // 2) else 1;
+      lines = lines + ["04/10/2014 10:00:%02d AM" % i, header, "server1:/a",
+                       "   " + " ".join(["%d.00" % value] * 9), ""];
+   # end for
+   out = open(path, "w");
+   out.write("\n".join(lines) + "\n");
+   out.close();
+
+# end def
+
+
+
+def test_batch_inputs(tmp_path):
+   for host in ["web1", "web2"]:
+      os.makedirs(str(tmp_path / host));
+      write_capture(str(tmp_path / host / "nfsiostat.out"), 3, 1);
+   # end for
+   write_capture(str(tmp_path / "web1" / ".hidden"), 3, 1);
+
+   # a directory: every file in it, host = file name without extension
+   assert nfsiostat.batch_inputs(str(tmp_path / "web1")) == \
+          [("nfsiostat", str(tmp_path / "web1" / "nfsiostat.out"))];
+   # a glob with the same file name everywhere: host = directory
+   inputs = nfsiostat.batch_inputs(str(tmp_path / "*" / "nfsiostat.out"));
+   assert [host for (host, filename) in inputs] == ["web1_nfsiostat", "web2_nfsiostat"];
+
+# end def
+
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_batch_report(tmp_path, capsys, workers):
+   inputs = tmp_path / "captures";
+   os.makedirs(str(inputs));
+   write_capture(str(inputs / "hostA.out"), 10, 50);
+   write_capture(str(inputs / "hostB.out"), 20, 70);
+   open(str(inputs / "broken.out"), "w").write("garbage\n04/10/2014 xx\nFilesystem: x\n");
+   dirname = str(tmp_path / "HTML_REPORT");
+   cache_dir = str(tmp_path / "cache");
+
+   nfsiostat.batch_report(str(inputs), 0, dirname, workers, cache_dir, 1);
+   assert "3 hosts: 2 rendered, 0 unchanged, 1 failed" in capsys.readouterr()[0];
+   for host in ["hostA", "hostB"]:
+      assert os.path.isfile(os.path.join(dirname, host, "report.html"));
+      assert os.path.isfile(os.path.join(dirname, host, "summary.json"));
+   # end for
+   index = open(os.path.join(dirname, "index.html")).read();
+   assert index.index("broken") < index.index("hostA") < index.index("hostB");
+   assert "Error: " in index;
+   assert "70.00" in index;
+
+   # unchanged hosts are skipped, a changed capture is rendered again
+   write_capture(str(inputs / "hostB.out"), 20, 90);
+   nfsiostat.batch_report(str(inputs), 0, dirname, workers, cache_dir, 1);
+   assert "3 hosts: 1 rendered, 1 unchanged, 1 failed" in capsys.readouterr()[0];
+   assert "90.00" in open(os.path.join(dirname, "index.html")).read();
+
+   # so is every host when an option that changes the report is different
+   nfsiostat.batch_report(str(inputs), 1, dirname, workers, cache_dir, 1);
+   assert "3 hosts: 2 rendered, 0 unchanged, 1 failed" in capsys.readouterr()[0];
+
+# end def
@@ -0,0 +1,73 @@
+#
+# Tests of nfsiostat_bench.py: the synthetic captures (both clock formats)
+# and the stages timed by bench_case()
+#
+import io
+import os
+import sys
+
+import pytest
+
+numpy = pytest.importorskip("numpy");
+pytest.importorskip("matplotlib");
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))));
+import nfsiostat_plotter_v4 as nfsiostat
+import nfsiostat_bench
+
+
+
+def parse(text):
+   capture = nfsiostat.read_nfsiostat(io.StringIO(text));
+   nfsiostat.capture_timestamps(capture);
+   return capture;
+
+# end def
+
+
+
+def test_clock_formats():
+   # the en_US and C locale time stamps of a capture across noon are the
+   # same instants, one second apart
+   n = 12 * 3600 + 5;
+   ampm = parse(nfsiostat_bench.synthetic_capture(2, n, "ampm"));
+   h24 = parse(nfsiostat_bench.synthetic_capture(2, n, "24h"));
+   assert [item["count"] for item in h24["fs_data_list"]] == [n, n];
+   assert h24["meridian_list"][0] == "";
+   numpy.testing.assert_array_equal(h24["timestamps"], ampm["timestamps"]);
+   numpy.testing.assert_array_equal(numpy.diff(h24["timestamps"]), 1.0);
+   assert nfsiostat.timestamp_seconds("04/10/14", "12:00:00", "") - \
+          nfsiostat.timestamp_seconds("04/10/14", "00:00:00", "") == 12 * 3600;
+
+# end def
+
+
+
+def test_bench_case():
+   results = nfsiostat_bench.bench_case(2, 30, "24h");
+   stages = dict([(result["stage"], result) for result in results]);
+   for stage in ["parse", "timestamps", "summary", "anomalies", "figure html",
+                 "combined html"]:
+      assert stage in stages;
+   # end for
+   # every figure kind is timed, the combined line figures too
+   for kind in nfsiostat_bench.figure_kinds:
+      assert stages["figure " + kind]["seconds"] > 0.0;
+      assert stages["combined " + kind]["seconds"] > 0.0;
+      assert stages["combined " + kind]["count"] == 60;
+   # end for
+   assert stages["parse"]["count"] == 60;
+
+# end def
+
+
+
+def test_compare(capsys):
+   results = [{"stage": "parse", "seconds": 1.5, "count": 10, "unit": "rows", "rss": 1.0},
+              {"stage": "summary", "seconds": 1.0, "count": 10, "unit": "rows", "rss": 1.0}];
+   baseline = {"parse": 1.0, "summary": 1.0};
+   assert nfsiostat_bench.print_results( (1, 10), results, baseline, 20.0) == 1;
+   assert "SLOWER" in capsys.readouterr()[0];
+   assert nfsiostat_bench.print_results( (1, 10), results, None, 20.0) == 0;
+
+# end def
@@ -0,0 +1,132 @@
+#
+# Tests of the on-disk cache of parsed captures of nfsiostat_plotter_v4.py
+# (capture_key(), cache_path(), cache_prune(), save_capture() and
+# load_capture())
+#
+import io
+import json
+import os
+import sys
+
+import pytest
+
+numpy = pytest.importorskip("numpy");
+pytest.importorskip("matplotlib");
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))));
+import nfsiostat_plotter_v4 as nfsiostat
+
+header = ("Filesystem:           rMB_nor/s    wMB_nor/s    rMB_dir/s    wMB_dir/s    " +
+          "rMB_svr/s    wMB_svr/s     ops/s    rops/s    wops/s");
+
+
+
+def write_capture(path, nsamples, value=1):
+   # writes a capture of nsamples sections with two mounts
+   lines = ["Linux 3.10.0-123.el7.x86_64 (testhost) 04/10/2014 _x86_64_ (8 CPU)", ""];
+   for i in range(nsamples):
+      lines.append("04/10/2014 10:%02d:%02d AM" % (i // 60 % 60, i % 60));
+      lines.append(header);
+      for fs in ["server1:/export/home", "server2:/data"]:
+         lines.append(fs);
+         lines.append("   " + " ".join(["%d.00" % value] * 9));
+      # end for
+      lines.append("");
+   # end for
+   out = open(path, "w");
+   out.write("\n".join(lines) + "\n");
+   out.close();
+
+# end def
+
+
+
+def parse(path):
+   capture = nfsiostat.read_nfsiostat(io.open(path, "r"));
+   nfsiostat.capture_timestamps(capture);
+   return capture;
+
+# end def
+
+
+
+def test_save_load(tmp_path):
+   path = str(tmp_path / "capture.out");
+   write_capture(path, 20);
+   capture = parse(path);
+   cache = nfsiostat.cache_path(str(tmp_path / "cache"), path);
+   os.makedirs(str(tmp_path / "cache"));
+   nfsiostat.save_capture(cache, capture);
+
+   loaded = nfsiostat.load_capture(cache);
+   assert loaded["system_info"] == capture["system_info"];
+   assert loaded["start_time"] == capture["start_time"];
+   numpy.testing.assert_array_equal(loaded["timestamps"], capture["timestamps"]);
+   for (item, loaded_item) in zip(capture["fs_data_list"], loaded["fs_data_list"]):
+      assert loaded["fs_index"][item["fs"]] is loaded_item;
+      assert loaded_item["count"] == item["count"] == 20;
+      numpy.testing.assert_array_equal(loaded_item["wops"], item["wops"]);
+   # end for
+   assert isinstance(loaded["timestamps"], numpy.memmap);
+
+   # a cache of another version is not used
+   meta = json.load(open(os.path.join(cache, "meta.json")));
+   meta["version"] = -1;
+   json.dump(meta, open(os.path.join(cache, "meta.json"), "w"));
+   assert nfsiostat.load_capture(cache) is None;
+
+# end def
+
+
+
+def test_key_covers_whole_file(tmp_path):
+   # a change in the middle of a large capture, with the same size and
+   # mtime, gives a new key
+   path = str(tmp_path / "capture.out");
+   write_capture(path, 12000);
+   assert os.path.getsize(path) > 3 * 1048576;
+   key = nfsiostat.capture_key(path);
+   st = os.stat(path);
+   data = bytearray(open(path, "rb").read());
+   middle = data.index(b"1.00", len(data) // 2);
+   data[middle] = ord("2");
+   out = open(path, "wb");
+   out.write(data);
+   out.close();
+   os.utime(path, (st.st_atime, st.st_mtime));
+   assert os.path.getsize(path) == st.st_size;
+   assert nfsiostat.capture_key(path) != key;
+
+# end def
+
+
+
+def test_cache_replaced(tmp_path):
+   # a new version of a capture replaces its old cache; a capture with the
+   # same file name in another directory has its own
+   cache_dir = str(tmp_path / "cache");
+   os.makedirs(cache_dir);
+   paths = [];
+   for sub in ["a", "b"]:
+      os.makedirs(str(tmp_path / sub));
+      paths.append(str(tmp_path / sub / "capture.out"));
+      write_capture(paths[-1], 5);
+      nfsiostat.save_capture(nfsiostat.cache_path(cache_dir, paths[-1]), parse(paths[-1]));
+   # end for
+   assert len(os.listdir(cache_dir)) == 2;
+   assert nfsiostat.cache_prefix(paths[0]) != nfsiostat.cache_prefix(paths[1]);
+
+   old = nfsiostat.cache_path(cache_dir, paths[0]);
+   write_capture(paths[0], 6, value=2);
+   new = nfsiostat.cache_path(cache_dir, paths[0]);
+   assert new != old;
+   assert nfsiostat.load_capture(new) is None;
+   nfsiostat.save_capture(new, parse(paths[0]));
+   assert len(os.listdir(cache_dir)) == 3;
+   nfsiostat.cache_prune(cache_dir, paths[0], new);
+   other = nfsiostat.cache_path(cache_dir, paths[1]);
+   assert sorted(os.listdir(cache_dir)) == sorted([os.path.basename(new),
+                                                   os.path.basename(other)]);
+   assert nfsiostat.load_capture(new)["fs_data_list"][0]["count"] == 6;
+
+# end def
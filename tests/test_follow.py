@@ -0,0 +1,140 @@
+#
+# Tests of follow mode of nfsiostat_plotter_v4.py: tailing a capture that
+# is still written (follow_lines(), capture_add()) and the min/max buckets
+# the refreshed figures are drawn from (follow_update(), follow_view())
+#
+import os
+import sys
+
+import pytest
+
+numpy = pytest.importorskip("numpy");
+pytest.importorskip("matplotlib");
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))));
+import nfsiostat_plotter_v4 as nfsiostat
+
+header = ("Filesystem:           rMB_nor/s    wMB_nor/s    rMB_dir/s    wMB_dir/s    " +
+          "rMB_svr/s    wMB_svr/s     ops/s    rops/s    wops/s");
+
+
+
+def section(i, mounts):
+   lines = ["04/10/2014 10:%02d:%02d AM" % (i // 60, i % 60), header];
+   for fs in mounts:
+      lines.append(fs);
+      lines.append("   " + " ".join(["%d" % (i + j) for j in range(9)]));
+   # end for
+   return "\n".join(lines) + "\n\n";
+
+# end def
+
+
+
+def test_follow_appended_lines(tmp_path):
+   # each capture_add() returns at the current end of the file and picks
+   # up what was appended since, also a section written in two parts
+   path = str(tmp_path / "capture.out");
+   out = open(path, "w");
+   out.write("Linux 3.10.0-123.el7.x86_64 (testhost) 04/10/2014 _x86_64_ (8 CPU)\n\n");
+   out.write(section(0, ["server1:/a", "server2:/b"]));
+   out.flush();
+
+   capture = nfsiostat.capture_new();
+   records = nfsiostat.parse_nfsiostat(nfsiostat.follow_lines(open(path, "r"), 16));
+   nfsiostat.capture_add(capture, records);
+   assert capture["dirty"] == set(["server1:/a", "server2:/b"]);
+   assert [item["count"] for item in capture["fs_data_list"]] == [1, 1];
+
+   capture["dirty"] = set();
+   text = section(1, ["server2:/b"]);
+   out.write(text[0:40]);
+   out.flush();
+   nfsiostat.capture_add(capture, records);
+   out.write(text[40:]);
+   out.flush();
+   nfsiostat.capture_add(capture, records);
+   assert capture["dirty"] == set(["server2:/b"]);
+   assert capture["fs_index"]["server2:/b"]["count"] == 2;
+   assert capture["time_list"] == ["10:00:00", "10:00:01"];
+   out.close();
+
+# end def
+
+
+
+def test_buckets_match_samples(monkeypatch):
+   # buckets filled over several refreshes (with merges in between) hold
+   # the min, max and sum of their samples
+   monkeypatch.setitem(nfsiostat.plot_reduce, "max_points", 64);
+   rng = numpy.random.RandomState(3);
+   item = nfsiostat.fs_new("server1:/a", capacity=4);
+   capture = {"fs_data_list": [item]};
+   follow = nfsiostat.follow_new();
+   for step in [1, 5, 30, 2, 100, 333, 529]:
+      for i in range(step):
+         nfsiostat.fs_append(item, ["%.3f" % v for v in rng.exponential(10.0, 9)]);
+      # end for
+      capture["timestamps"] = numpy.arange(item["count"], dtype=float);
+      nfsiostat.follow_update(follow, capture);
+   # end for
+   n = item["count"];
+   size = follow["size"];
+   b = follow["buckets"]["server1:/a"];
+   assert b["n"] == n;
+   assert b["sum"].shape[1] == -(-n // size) <= 32;
+   data = item["data"][:, 0:n];
+   for j in range(b["sum"].shape[1]):
+      bucket = data[:, j*size:(j+1)*size];
+      numpy.testing.assert_array_equal(b["vmin"][:,j], bucket.min(axis=1));
+      numpy.testing.assert_array_equal(b["vmax"][:,j], bucket.max(axis=1));
+      numpy.testing.assert_allclose(b["sum"][:,j], bucket.sum(axis=1));
+      for k in range(data.shape[0]):
+         assert data[k, b["imin"][k,j]] == b["vmin"][k,j];
+         assert data[k, b["imax"][k,j]] == b["vmax"][k,j];
+      # end for
+   # end for
+
+# end def
+
+
+
+@pytest.mark.parametrize("combined_plots", [0, 1])
+def test_follow_view(monkeypatch, combined_plots):
+   monkeypatch.setitem(nfsiostat.plot_reduce, "max_points", 40);
+   capture = nfsiostat.capture_new();
+   a = nfsiostat.fs_new("server1:/a");
+   b = nfsiostat.fs_new("server2:/b");
+   for i in range(1000):
+      nfsiostat.fs_append(a, ["%d" % ((i * 7) % 101)] * 9);
+      if (i < 900):
+         nfsiostat.fs_append(b, ["%d" % (i % 13)] * 9);
+      # end if
+   # end for
+   capture["fs_data_list"] = [a, b];
+   capture["timestamps"] = 1000.0 + 2.0 * numpy.arange(1000);
+   follow = nfsiostat.follow_new();
+   nfsiostat.follow_update(follow, capture);
+   (view, x_seconds) = nfsiostat.follow_view(follow, capture, combined_plots);
+
+   assert [item["fs"] for item in view["fs_data_list"]] == ["server1:/a", "server2:/b"];
+   assert view["fs_index"]["server2:/b"] is view["fs_data_list"][1];
+   for (item, new_item) in zip(capture["fs_data_list"], view["fs_data_list"]):
+      nfsiostat.fs_views(item);
+      assert new_item["count"] <= 40 * len(view["fs_data_list"]);
+      assert new_item["rMB_nor"].max() == item["rMB_nor"].max();
+      assert new_item["rMB_nor"].min() == item["rMB_nor"].min();
+   # end for
+   if (combined_plots == 0):
+      # each file system with its own samples
+      for new_item in view["fs_data_list"]:
+         assert len(new_item["x_seconds"]) == new_item["count"];
+         assert new_item["x_seconds"][0] == 0.0;
+      # end for
+   else:
+      # the common samples, up to the shortest file system
+      assert x_seconds.max() < 2.0 * 900;
+      assert view["fs_data_list"][0]["count"] == len(x_seconds);
+   # end if
+
+# end def
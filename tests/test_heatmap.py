@@ -0,0 +1,96 @@
+#
+# Tests of the heatmaps of nfsiostat_plotter_v4.py, drawn for combined
+# figures with many file systems (heatmap_matrix(), plot_heatmap() and the
+# bucket means follow_view() gives them)
+#
+import os
+import sys
+
+import pytest
+
+numpy = pytest.importorskip("numpy");
+pytest.importorskip("matplotlib");
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))));
+import nfsiostat_plotter_v4 as nfsiostat
+
+
+
+def make_capture(nmounts, n):
+   # mount k carries k+1 times the load of mount 0
+   capture = nfsiostat.capture_new();
+   capture["timestamps"] = 1000.0 + 2.0 * numpy.arange(n);
+   for k in range(nmounts):
+      item = nfsiostat.fs_new("server%d:/a" % k);
+      for i in range(n):
+         nfsiostat.fs_append(item, ["%d" % ((k + 1) * (i % 7))] * 9);
+      # end for
+      nfsiostat.fs_views(item);
+      capture["fs_data_list"].append(item);
+      capture["fs_index"][item["fs"]] = item;
+   # end for
+   return capture;
+
+# end def
+
+
+
+def test_heatmap_matrix():
+   capture = make_capture(3, 10);
+   x_seconds = numpy.arange(10.0);
+   (matrix, edges) = nfsiostat.heatmap_matrix(x_seconds, capture["fs_data_list"], "ops", 4);
+   assert matrix.shape == (3, 4);
+   for k in range(3):
+      y = numpy.asarray(capture["fs_data_list"][k]["ops"], dtype=float);
+      numpy.testing.assert_allclose(matrix[k], [y[0:2].mean(), y[2:5].mean(),
+                                                y[5:7].mean(), y[7:10].mean()]);
+   # end for
+   numpy.testing.assert_array_equal(edges, [0.0, 2.0, 5.0, 7.0, 9.0]);
+
+   # never more columns than samples
+   (matrix, edges) = nfsiostat.heatmap_matrix(x_seconds, capture["fs_data_list"], "ops", 800);
+   assert matrix.shape == (3, 10);
+
+# end def
+
+
+
+def test_combined_heatmap_figures(tmp_path):
+   # above combined_max_lines mounts the combined figures are heatmaps
+   capture = make_capture(nfsiostat.combined_max_lines + 2, 50);
+   fs_data_list = capture["fs_data_list"];
+   jobs = [("", name, 1, i + 1, len(fs_data_list) - 1)
+           for (i, name) in enumerate(["plot1a", "plot2a", "plot3a", "plot4"])];
+   data = {"combined_plots": 1, "dirname": str(tmp_path), "x_seconds": numpy.arange(50.0),
+           "fs_data_list": fs_data_list, "line_list": ["bo-", "g^--", "rs-.", "c*-"],
+           "figure_timing_hook": None, "plot_reduce": nfsiostat.plot_reduce};
+   results = nfsiostat.render_plots(jobs, data, 1);
+   assert len(results) == 4;
+   for (image, fragment) in results:
+      assert os.path.getsize(image) > 0;
+      assert nfsiostat.heatmap_note in fragment;
+   # end for
+
+# end def
+
+
+
+def test_follow_heatmap_means(monkeypatch):
+   # follow mode gives the heatmaps the mean of each bucket
+   monkeypatch.setitem(nfsiostat.plot_reduce, "max_points", 16);
+   capture = make_capture(nfsiostat.combined_max_lines + 1, 100);
+   follow = nfsiostat.follow_new();
+   nfsiostat.follow_update(follow, capture);
+   size = follow["size"];
+   assert size == 16;
+
+   (view, x_seconds) = nfsiostat.follow_view(follow, capture, 1);
+   assert len(x_seconds) == 7;
+   for (item, new_item) in zip(capture["fs_data_list"], view["fs_data_list"]):
+      y = numpy.asarray(item["ops"], dtype=float);
+      means = [y[j:j + size].mean() for j in range(0, 100, size)];
+      numpy.testing.assert_allclose(new_item["ops"], means);
+      assert view["fs_index"][item["fs"]] is new_item;
+   # end for
+
+# end def
@@ -0,0 +1,106 @@
+#
+# Tests of the interactive report of nfsiostat_plotter_v4.py
+# (encode_series(), write_interactive_report() and the samples follow_view()
+# gives it)
+#
+import base64
+import json
+import os
+import sys
+
+import pytest
+
+numpy = pytest.importorskip("numpy");
+pytest.importorskip("matplotlib");
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))));
+import nfsiostat_plotter_v4 as nfsiostat
+
+
+
+def make_capture(mounts, n):
+   capture = nfsiostat.capture_new();
+   capture["system_info"] = {"system_name": "testhost", "date": "04/10/2014"};
+   capture["start_time"] = "10:00:00";
+   capture["timestamps"] = 1000.0 + 2.0 * numpy.arange(n);
+   for (k, fs) in enumerate(mounts):
+      item = nfsiostat.fs_new(fs);
+      for i in range(n):
+         nfsiostat.fs_append(item, ["%d.25" % (100 * k + i + j) for j in range(9)]);
+      # end for
+      capture["fs_data_list"].append(item);
+      capture["fs_index"][fs] = item;
+   # end for
+   return capture;
+
+# end def
+
+
+
+def read_data(dirname):
+   # the NFS_DATA object embedded in report.html, arrays decoded
+   text = open(os.path.join(dirname, "report.html")).read();
+   start = text.index("var NFS_DATA = ") + len("var NFS_DATA = ");
+   data = json.loads(text[start:text.index(";\n", start)]);
+   for key in data["arrays"]:
+      data["arrays"][key] = numpy.frombuffer(base64.b64decode(data["arrays"][key]), dtype="<f4");
+   # end for
+   return data;
+
+# end def
+
+
+
+@pytest.mark.parametrize("combined_plots", [0, 1])
+def test_report_data(tmp_path, combined_plots):
+   capture = make_capture(["server1:/a", "server2:/b"], 50);
+   x_seconds = capture["timestamps"] - capture["timestamps"][0];
+   anomalies = {"server2:/b": [{"x0": 9.0, "x1": 13.0, "kind": "spike"}]};
+   nfsiostat.write_interactive_report("capture.out", capture, x_seconds, None, combined_plots,
+                                      str(tmp_path), ["<P>section</P>\n"], anomalies);
+   assert "<P>section</P>" in open(str(tmp_path / "report.html")).read();
+
+   data = read_data(str(tmp_path));
+   numpy.testing.assert_array_equal(data["arrays"]["x"], x_seconds);
+   for (k, item) in enumerate(capture["fs_data_list"]):
+      for name in nfsiostat.fs_fields:
+         numpy.testing.assert_array_equal(data["arrays"]["fs%d_%s" % (k, name)], item[name]);
+      # end for
+   # end for
+
+   # every line refers to an array; the regions of a mount are on its panels
+   panels = data["panels"];
+   assert len(panels) == len(nfsiostat.interactive_panels) * (2 - combined_plots);
+   for panel in panels:
+      for line in panel["lines"]:
+         assert line["x"] in data["arrays"] and line["y"] in data["arrays"];
+      # end for
+   # end for
+   mounts = [set(line["y"][0:3] for line in panel["lines"]) for panel in panels];
+   for (panel, members) in zip(panels, mounts):
+      assert (panel["regions"] == [[9.0, 13.0, "spike"]]) == ("fs1" in members);
+   # end for
+
+# end def
+
+
+
+def test_follow_view_shared_samples(monkeypatch):
+   # the interactive report draws all mounts on one time axis, so follow
+   # mode gives it the same samples for every mount
+   monkeypatch.setitem(nfsiostat.plot_reduce, "max_points", 16);
+   capture = make_capture(["server1:/a", "server2:/b"], 200);
+   follow = nfsiostat.follow_new();
+   nfsiostat.follow_update(follow, capture);
+
+   (view, x_seconds) = nfsiostat.follow_view(follow, capture, 0);
+   assert "x_seconds" in view["fs_data_list"][0];
+
+   monkeypatch.setattr(nfsiostat, "report_format", "interactive");
+   (view, x_seconds) = nfsiostat.follow_view(follow, capture, 0);
+   for item in view["fs_data_list"]:
+      assert "x_seconds" not in item;
+      assert item["count"] == len(x_seconds);
+   # end for
+
+# end def
@@ -0,0 +1,134 @@
+#
+# Tests of the iostat/nfsiostat data exchange of nfsiostat_plotter_v4.py:
+# the conversion of iostat_file.pickle to iostat_data (save_iostat(),
+# load_iostat(), iostat_current()) and the nfsiostat_data written by a run
+#
+import os
+import pickle
+import subprocess
+import sys
+
+import pytest
+
+numpy = pytest.importorskip("numpy");
+pytest.importorskip("matplotlib");
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))));
+import nfsiostat_plotter_v4 as nfsiostat
+
+script = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                      "nfsiostat_plotter_v4.py");
+
+header = ("Filesystem:           rMB_nor/s    wMB_nor/s    rMB_dir/s    wMB_dir/s    " +
+          "rMB_svr/s    wMB_svr/s     ops/s    rops/s    wops/s");
+
+
+
+def iostat_dict(n, user):
+   # the dictionary iostat_plotter.py pickles, n samples
+   cpu_data = {"cpu_labels": []};
+   for name in ["user", "nice", "system", "iowait", "steal", "idle", "time_sum"]:
+      cpu_data[name + "_list"] = [0.0] * n;
+   # end for
+   cpu_data["user_list"] = [user] * n;
+   cpu_data["system_list"] = [float(i) for i in range(n)];
+   return {"system_info": {"system_name": "testhost", "kernel": "k", "date": "04/10/2014",
+                           "CPU": "_x86_64_", "cores": "8"},
+           "x_seconds": [float(i) for i in range(n)],
+           "cpu_data": cpu_data,
+           "time_data": {"date_list": ["04 10 2014"] * n,
+                         "time_list": ["10:00:%02d" % i for i in range(n)],
+                         "meridian_list": ["AM"] * n},
+           "device_data_list": [{"device": "sda", "rMB_list": [1.0] * n}]};
+
+# end def
+
+
+
+def write_pickle(path, n, user):
+   pickle_file = open(path, "wb");
+   pickle.dump(iostat_dict(n, user), pickle_file, 0);
+   pickle_file.close();
+
+# end def
+
+
+
+def test_save_load_iostat(tmp_path):
+   path = str(tmp_path / "iostat_data");
+   source = {"size": 100, "mtime": 1400000000.25};
+   nfsiostat.save_iostat(path, iostat_dict(5, 10.0), source);
+   iostat = nfsiostat.load_iostat(path);
+   numpy.testing.assert_array_equal(iostat["time_sum_list"], [10.0, 11.0, 12.0, 13.0, 14.0]);
+   numpy.testing.assert_array_equal(iostat["x_seconds"], [0.0, 1.0, 2.0, 3.0, 4.0]);
+   assert iostat["timestamps"][4] - iostat["timestamps"][0] == 4.0;
+   assert os.path.isfile(os.path.join(path, "device0_rMB_list.npy"));
+
+   # the converted data is only current for the same pickle
+   assert nfsiostat.iostat_current(path, source) == 1;
+   assert nfsiostat.iostat_current(path, {"size": 100, "mtime": 1400000001.25}) == 0;
+   assert nfsiostat.iostat_current(path, {"size": 101, "mtime": 1400000000.25}) == 0;
+   assert nfsiostat.iostat_current(str(tmp_path / "missing"), source) == 0;
+
+# end def
+
+
+
+def run(cwd, capture):
+   env = dict(os.environ);
+   env["MPLBACKEND"] = "Agg";
+   output = subprocess.check_output([sys.executable, script, "-nocache", capture], cwd=cwd,
+                                    env=env, stderr=subprocess.STDOUT);
+   return output.decode("utf-8", "replace");
+
+# end def
+
+
+
+def test_pickle_reconverted(tmp_path):
+   # a run converts iostat_file.pickle; a later run reuses the conversion
+   # until the pickle is written again
+   run_dir = tmp_path / "run";
+   capture_dir = tmp_path / "captures";
+   os.makedirs(str(run_dir));
+   os.makedirs(str(capture_dir));
+   lines = ["Linux 3.10.0-123.el7.x86_64 (testhost) 04/10/2014 _x86_64_ (8 CPU)", ""];
+   for i in range(5):
+      lines = lines + ["04/10/2014 10:00:%02d AM" % i, header, "server1:/a",
+                       "   1 2 3 4 5 6 7 8 9", ""];
+   # end for
+   capture = str(capture_dir / "capture.out");
+   open(capture, "w").write("\n".join(lines) + "\n");
+
+   write_pickle(str(run_dir / "iostat_file.pickle"), 5, 10.0);
+   assert "Converting" in run(str(run_dir), capture);
+   assert "Converting" not in run(str(run_dir), capture);
+   iostat = nfsiostat.load_iostat(str(run_dir / "iostat_data"));
+   assert iostat["time_sum_list"][0] == 10.0;
+
+   write_pickle(str(run_dir / "iostat_file.pickle"), 6, 20.0);
+   os.utime(str(run_dir / "iostat_file.pickle"), (1500000000, 1500000000));
+   assert "Converting" in run(str(run_dir), capture);
+   iostat = nfsiostat.load_iostat(str(run_dir / "iostat_data"));
+   assert len(iostat["time_sum_list"]) == 6;
+   assert iostat["time_sum_list"][0] == 20.0;
+
+   # the nfsiostat data is written next to the capture
+   saved = nfsiostat.load_capture(str(capture_dir / "nfsiostat_data"));
+   assert saved["fs_data_list"][0]["fs"] == "server1:/a";
+   assert saved["fs_data_list"][0]["count"] == 5;
+   assert not os.path.exists(str(run_dir / "nfsiostat_data"));
+
+# end def
+
+
+
+def test_nfsiostat_data_without_iostat(tmp_path):
+   lines = ["Linux 3.10.0-123.el7.x86_64 (testhost) 04/10/2014 _x86_64_ (8 CPU)", "",
+            "04/10/2014 10:00:00 AM", header, "server1:/a", "   1 2 3 4 5 6 7 8 9", ""];
+   capture = str(tmp_path / "capture.out");
+   open(capture, "w").write("\n".join(lines) + "\n");
+   run(str(tmp_path), "capture.out");
+   assert nfsiostat.load_capture(str(tmp_path / "nfsiostat_data"))["rows"] == 1;
+
+# end def
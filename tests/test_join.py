@@ -0,0 +1,68 @@
+#
+# Tests of the join of iostat CPU and nfsiostat samples in
+# nfsiostat_plotter_v4.py (align_series(), join_iostat() and
+# correlation_html())
+#
+import os
+import sys
+
+import pytest
+
+numpy = pytest.importorskip("numpy");
+pytest.importorskip("matplotlib");
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))));
+import nfsiostat_plotter_v4 as nfsiostat
+
+
+
+def test_align_nearest_and_linear():
+   t_src = [0.0, 10.0, 20.0, 50.0];
+   y_src = [0.0, 1.0, 2.0, 5.0];
+   t_grid = numpy.array([0.0, 4.0, 6.0, 20.0, 35.0, 49.0, 70.0]);
+   nearest = nfsiostat.align_series(t_src, y_src, t_grid, "nearest", 10.0);
+   numpy.testing.assert_array_equal(nearest, [0.0, 0.0, 1.0, 2.0, numpy.nan, 5.0, numpy.nan]);
+   linear = nfsiostat.align_series(t_src, y_src, t_grid, "linear", 10.0);
+   numpy.testing.assert_allclose(linear, [0.0, 0.4, 0.6, 2.0, numpy.nan, 4.9, numpy.nan]);
+
+   # source samples out of order (a capture across midnight without dates)
+   unsorted = nfsiostat.align_series([20.0, 0.0, 10.0], [2.0, 0.0, 1.0], t_grid[0:4],
+                                     "nearest", 10.0);
+   numpy.testing.assert_array_equal(unsorted, [0.0, 0.0, 1.0, 2.0]);
+
+   # no source samples at all
+   assert numpy.isnan(nfsiostat.align_series([], [], t_grid, "nearest", 10.0)).all();
+
+# end def
+
+
+
+def test_join_iostat():
+   # nfsiostat every 2 s from t = 100, iostat every second from t = 95
+   capture = nfsiostat.capture_new();
+   capture["timestamps"] = 100.0 + 2.0 * numpy.arange(50);
+   item = nfsiostat.fs_new("server1:/a");
+   for i in range(50):
+      nfsiostat.fs_append(item, ["%d" % i] * 9);
+   # end for
+   nfsiostat.fs_views(item);
+   capture["fs_data_list"] = [item];
+   iostat = {"timestamps": 95.0 + numpy.arange(60),
+             "time_sum_list": 2.0 * (95.0 + numpy.arange(60))};
+
+   joined = nfsiostat.join_iostat(capture, iostat, "nearest");
+   # the overlap (100 .. 154) with the median nfsiostat step
+   numpy.testing.assert_array_equal(joined["t"], 100.0 + 2.0 * numpy.arange(28));
+   numpy.testing.assert_array_equal(joined["cpu"], 2.0 * joined["t"]);
+   records = joined["records"]["server1:/a"];
+   assert records.dtype.names == tuple(["t", "cpu"] + nfsiostat.fs_fields);
+   numpy.testing.assert_array_equal(records["ops"], numpy.arange(28));
+
+   # CPU and the series rise together
+   assert nfsiostat.correlation_html(joined).count("<TD>1.00</TD>") == len(nfsiostat.fs_fields);
+
+   # captures that do not overlap
+   iostat["timestamps"] = iostat["timestamps"] + 1000.0;
+   assert len(nfsiostat.join_iostat(capture, iostat, "nearest")["t"]) == 0;
+
+# end def
@@ -0,0 +1,126 @@
+#
+# Tests of the native mountstats collector of nfsiostat_plotter_v4.py
+# (read_mountstats() and collect_mountstats()) on recorded
+# /proc/self/mountstats snapshots in fixtures/mountstats:
+#
+#   snap.0000  server1:/export/home (NFSv4.2, nconnect=2, also mounted a
+#              second time on /mnt/home2), server2:/data (NFSv3 over udp)
+#              and some local file systems
+#   snap.0001  10 s later: traffic on both NFS mounts
+#   snap.0002  20 s later: more READs on server1, server2:/data mounted
+#              again (counters back near zero), server3:/scratch new
+#
+import os
+import shutil
+import sys
+
+import pytest
+
+numpy = pytest.importorskip("numpy");
+pytest.importorskip("matplotlib");
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))));
+import nfsiostat_plotter_v4 as nfsiostat
+
+fixture_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "mountstats");
+
+MB = 1048576.0;
+
+# Time of each snapshot (seconds), set as the file mtime
+snapshot_times = [1000.0, 1010.0, 1030.0];
+
+
+
+@pytest.fixture
+def snapshots(tmp_path):
+   #
+   # Copies the snapshots to a temporary directory with the mtimes of
+   # snapshot_times (the collector takes the sample time from there)
+   #
+   for (i, t) in enumerate(snapshot_times):
+      name = "snap.%04d" % i;
+      shutil.copy(os.path.join(fixture_dir, name), str(tmp_path / name));
+      os.utime(str(tmp_path / name), (t, t));
+   # end for
+   return str(tmp_path);
+
+# end def
+
+
+
+def read_snapshot(name):
+   snapshot_file = open(os.path.join(fixture_dir, name), 'r');
+   counters = nfsiostat.read_mountstats(snapshot_file);
+   snapshot_file.close();
+   return counters;
+
+# end def
+
+
+
+def series(capture, fs):
+   #
+   # Returns the (len(fs_fields) x samples) data of file system fs
+   #
+   item = capture["fs_index"][fs];
+   return item["data"][:, 0:item["count"]];
+
+# end def
+
+
+
+def test_read_mountstats_counters():
+   counters = read_snapshot("snap.0001");
+   # only NFS mounts, the second mount of server1:/export/home is ignored
+   assert sorted(counters) == ["server1:/export/home", "server2:/data"];
+   numpy.testing.assert_allclose(counters["server1:/export/home"],
+                                 [1050*MB, 520*MB, 110*MB, 0.0, 1160*MB, 520*MB,
+                                  103000 + 52000, 20600, 10200]);
+   # udp transport: sends is the third counter
+   numpy.testing.assert_allclose(counters["server2:/data"],
+                                 [10*MB, 0.0, 0.0, 0.0, 10*MB, 0.0, 110, 100, 0]);
+
+# end def
+
+
+
+def test_collect_mountstats_rates(snapshots):
+   capture = nfsiostat.collect_mountstats(snapshots, 10.0, 0);
+
+   # three snapshots give two samples, at the time of the later snapshot
+   numpy.testing.assert_allclose(capture["timestamps"], snapshot_times[1:]);
+   assert ([item["fs"] for item in capture["fs_data_list"]] ==
+           ["server1:/export/home", "server2:/data", "server3:/scratch"]);
+   assert capture["rows"] == 2 + 3;
+
+   # fs_fields: rMB_nor/s wMB_nor/s rMB_dir/s wMB_dir/s rMB_svr/s wMB_svr/s
+   #            ops/s rops/s wops/s
+   # first sample, 10 s: 50 MB normal read, 20 MB normal write, 10 MB
+   # O_DIRECT read, 60 MB server read, 20 MB server write, 3000 + 2000 RPC
+   # sends on the two connections, 600 READs, 200 WRITEs
+   # second sample, 20 s: 400 READs
+   numpy.testing.assert_allclose(series(capture, "server1:/export/home").T,
+                                 [[5.0, 2.0, 1.0, 0.0, 6.0, 2.0, 500.0, 60.0, 20.0],
+                                  [0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 20.0, 0.0]]);
+
+   # second sample: counters went back (mounted again), clamped to zero
+   numpy.testing.assert_allclose(series(capture, "server2:/data").T,
+                                 [[1.0, 0.0, 0.0, 0.0, 1.0, 0.0, 10.0, 10.0, 0.0],
+                                  [0.0]*9]);
+
+   # new mount: zeros before it appeared and for its first snapshot
+   numpy.testing.assert_allclose(series(capture, "server3:/scratch"),
+                                 numpy.zeros( (len(nfsiostat.fs_fields), 2) ));
+
+# end def
+
+
+
+def test_collect_mountstats_count(snapshots):
+   # count limits the number of snapshots read
+   capture = nfsiostat.collect_mountstats(snapshots, 10.0, 2);
+   assert len(capture["timestamps"]) == 1;
+   assert ([item["fs"] for item in capture["fs_data_list"]] ==
+           ["server1:/export/home", "server2:/data"]);
+
+# end def
@@ -0,0 +1,66 @@
+#
+# Tests of the command line of nfsiostat_plotter_v4.py (option_parser() and
+# parse_options())
+#
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("numpy");
+pytest.importorskip("matplotlib");
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))));
+import nfsiostat_plotter_v4 as nfsiostat
+
+
+
+@pytest.mark.parametrize("argv", [["-j8", "capture.out"], ["-j", "8", "capture.out"],
+                                  ["--workers=8", "capture.out"],
+                                  ["capture.out", "--workers", "8"]])
+def test_workers(argv):
+   options = nfsiostat.parse_options(argv);
+   assert options.workers == 8;
+   assert options.input == "capture.out";
+
+# end def
+
+
+
+def test_optional_values():
+   # without a value: one worker per core, a refresh every 10 s, nearest
+   options = nfsiostat.parse_options(["capture.out", "-j", "-f", "-align"]);
+   assert (options.workers, options.follow, options.align) == (0, 10.0, "nearest");
+   options = nfsiostat.parse_options(["-j", "-c", "-f", "-i", "capture.out"]);
+   assert (options.workers, options.follow, options.combined) == (0, 10.0, True);
+   assert options.input == "capture.out";
+
+   # not given at all
+   options = nfsiostat.parse_options(["capture.out"]);
+   assert (options.workers, options.follow, options.align) == (None, 0.0, "");
+
+   # with a value, attached or not
+   for argv in [["-f30", "capture.out"], ["-f", "30", "capture.out"],
+                ["--follow=30", "capture.out"], ["--follow", "30", "capture.out"]]:
+      assert nfsiostat.parse_options(argv).follow == 30.0;
+   # end for
+   for argv in [["-align=linear", "capture.out"], ["-align", "linear", "capture.out"],
+                ["--align=linear", "capture.out"], ["--align", "linear", "capture.out"]]:
+      assert nfsiostat.parse_options(argv).align == "linear";
+   # end for
+
+# end def
+
+
+
+def test_bad_values(capsys):
+   # a plain -j right before the file name takes it as its value
+   for argv in [["-j", "capture.out"], ["-f", "capture.out"], ["-align=cubic", "capture.out"],
+                ["--figures", "rw,bogus", "capture.out"], ["--start", "10", "--end", "5"]]:
+      with pytest.raises(SystemExit):
+         nfsiostat.parse_options(argv);
+      # end with
+   # end for
+   assert "invalid int value" in capsys.readouterr()[1];
+
+# end def
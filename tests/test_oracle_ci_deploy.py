@@ -0,0 +1,230 @@
+#
+# Tests of oracle-ci-deploy.py (execute_sql_script(), run_parallel(),
+# report_results()) with a fake sqlplus in place of cfg['sqlcl'] and of
+# the INFP cache with a fake fetch_db_info()
+#
+import argparse
+import importlib.util
+import os
+import stat
+import sys
+import time
+
+import pytest
+
+pytest.importorskip("requests")
+pytest.importorskip("yaml")
+
+path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                    "oracle-ci-deploy.py")
+spec = importlib.util.spec_from_file_location("oracle_ci_deploy", path)
+deploy = importlib.util.module_from_spec(spec)
+# the pool pickles run_db() by module name
+sys.modules["oracle_ci_deploy"] = deploy
+spec.loader.exec_module(deploy)
+
+# fake sqlplus: the database is the last part of the connect string, its
+# host the first; every running session leaves a file in $RUNNING
+FAKE_SQLPLUS = """#!/bin/bash
+for a in "$@"; do case "$a" in /@//*) db="${a##*/}"; host="${a#/@//}"; host="${host%%:*}";; esac; done
+cat > /dev/null
+touch "$RUNNING/$host.$db"
+ls "$RUNNING" | grep -c "^$host\\." >> "$RUNNING/../$host.count"
+echo "|timestamp|database_name|user|"
+echo "ORA-00955: name is already used by an existing object"
+case "$db" in
+  fail) echo "SP2-0310: unable to open file";;
+  slow) sleep 5;;
+  conn) echo "ORA-01017: invalid username/password; logon denied"; sleep 5;;
+  err) echo "to stderr" >&2;;
+esac
+sleep 0.3
+rm "$RUNNING/$host.$db"
+[ "$db" = fail ] && exit 3
+echo "done"
+"""
+
+
+def fake_db_info(infp_rest_options, dbname):
+  """fetch_db_info() without INFP: two databases per host"""
+  return {'connect_descriptor': 'host{}:1521/{}'.format(len(dbname) % 2, dbname),
+          'env_status': 'Test', 'app_name': ['APP']}
+
+
+@pytest.fixture
+def cfg(tmp_path, monkeypatch):
+  sqlplus = tmp_path / "sqlplus"
+  sqlplus.write_text(FAKE_SQLPLUS)
+  sqlplus.chmod(sqlplus.stat().st_mode | stat.S_IEXEC)
+  (tmp_path / "running").mkdir()
+  (tmp_path / "deploy.sql").write_text("select 1 from dual;\n")
+  monkeypatch.setenv("RUNNING", str(tmp_path / "running"))
+  monkeypatch.chdir(tmp_path)
+  monkeypatch.setattr(deploy, "fetch_db_info", fake_db_info)
+  monkeypatch.setitem(deploy.INFP_REST_OPTIONS, "cache_file", str(tmp_path / "infp.json"))
+  return {'variables': {'user': 'SYS', 'app': None},
+          'sqlcl': str(sqlplus), 'script': ['deploy.sql'], 'jira': None,
+          'stream': False, 'abort_on_error': False}
+
+
+def db_infos(databases):
+  return dict((dbname, fake_db_info(None, dbname)) for dbname in databases)
+
+
+def max_running(tmp_path, host):
+  with open(str(tmp_path / "{}.count".format(host))) as fd:
+    return max(int(line) for line in fd)
+
+
+def test_per_host(cfg, tmp_path):
+  databases = ['a', 'bb', 'c', 'dd', 'e', 'ff']
+  results = deploy.run_parallel(databases, db_infos(databases), cfg, False, 4, 1)
+  assert [result['dbname'] for result in results] == databases
+  assert max_running(tmp_path, 'host0') == 1
+  assert max_running(tmp_path, 'host1') == 1
+  for result in results:
+    assert result['error'] is None
+    [script] = result['scripts']
+    assert script['log_file'] == deploy.get_logfile('deploy.sql', result['dbname'])
+    assert os.path.isfile(script['log_file'])
+    assert script['returncode'] == 0
+
+
+def test_failed(cfg, tmp_path, capsys):
+  databases = ['a', 'fail', 'c']
+  results = deploy.run_parallel(databases, db_infos(databases), cfg, False, 2, 0)
+  assert max_running(tmp_path, 'host1') <= 2
+  [script] = results[1]['scripts']
+  assert script['returncode'] == 3
+  # kazdy radek sqlplus je v logu s prazdnym radkem navic
+  assert [line_no for (line_no, line) in script['ora_errors']] == [3, 5]
+  with open(script['log_file']) as fd:
+    assert fd.readlines()[4].startswith('SP2-0310')
+
+  assert deploy.report_results(results) == ['fail']
+  out = capsys.readouterr()[0]
+  assert '3x : ORA-00955' in out
+  assert '1x : SP2-0310' in out
+  assert '({}:5)'.format(script['log_file']) in out
+
+
+def test_error_result(cfg, monkeypatch):
+  def no_db_info(infp_rest_options, dbname):
+    raise ValueError('no INFP record for {}'.format(dbname))
+  monkeypatch.setattr(deploy, 'fetch_db_info', no_db_info)
+  dbinfos = deploy.get_db_infos(deploy.INFP_REST_OPTIONS, ['a', 'bb'])
+  results = deploy.run_parallel(['a', 'bb'], dbinfos, cfg, False, 2, 1)
+  assert [result['error'] for result in results] == [
+      'no INFP record for a', 'no INFP record for bb']
+  assert deploy.report_results(results) == ['a', 'bb']
+
+
+def test_limits(cfg):
+  with pytest.raises(ValueError):
+    deploy.run_parallel(['a'], db_infos(['a']), cfg, False, 0, 0)
+  with pytest.raises(ValueError):
+    deploy.run_parallel(['a'], db_infos(['a']), cfg, False, 1, -1)
+  assert deploy.positive_int('3') == 3
+  assert deploy.non_negative_int('0') == 0
+  with pytest.raises(argparse.ArgumentTypeError):
+    deploy.positive_int('0')
+  with pytest.raises(argparse.ArgumentTypeError):
+    deploy.non_negative_int('-1')
+
+
+def execute(cfg, dbname, stream, abort_on_error=False):
+  return deploy.execute_sql_script(
+      dbname, cfg['sqlcl'] + ' /@//host0:1521/' + dbname, 'deploy.sql',
+      '{}.{}.log'.format(dbname, stream), False, stream, abort_on_error)
+
+
+def test_stream(cfg):
+  # the same log and errors as with communicate()
+  results = [execute(cfg, 'fail', stream) for stream in (False, True)]
+  for result in results:
+    assert result['returncode'] == 3
+    assert result['aborted'] is None
+  assert results[0]['ora_errors'] == results[1]['ora_errors']
+  with open(results[0]['log_file']) as fd0, open(results[1]['log_file']) as fd1:
+    assert fd0.read() == fd1.read()
+
+  # a connection error stops the session at once
+  start = time.time()
+  with pytest.raises(deploy.OracleCIError):
+    execute(cfg, 'conn', True)
+  assert time.time() - start < 4
+
+  with pytest.raises(ValueError):
+    execute(cfg, 'err', True)
+
+
+def test_abort(cfg):
+  start = time.time()
+  result = execute(cfg, 'slow', True, True)
+  assert time.time() - start < 4
+  assert result['aborted'] == (3, 'ORA-00955: name is already used by an existing object')
+  assert result['returncode'] != 0
+
+
+def test_abort_skips(cfg, tmp_path, capsys):
+  (tmp_path / "second.sql").write_text("select 2 from dual;\n")
+  cfg.update({'stream': True, 'abort_on_error': True,
+              'script': ['deploy.sql', 'second.sql']})
+
+  # the other scripts of the database do not run
+  result = deploy.run_db('a', cfg, False, False)
+  assert [script['script'] for script in result['scripts']] == ['deploy.sql']
+  assert result['skipped'] == ['second.sql']
+  assert result['aborted']['aborted'][1].startswith('ORA-00955')
+  assert not os.path.exists(deploy.get_logfile('second.sql', 'a'))
+
+  # and the waiting databases do not start
+  databases = ['c', 'e', 'g']
+  results = deploy.run_parallel(databases, db_infos(databases), cfg, False, 1, 0)
+  assert results[0]['aborted']
+  assert [result['error'] for result in results[1:]] == ['not started, c aborted'] * 2
+  assert not os.path.exists(deploy.get_logfile('deploy.sql', 'e'))
+  assert deploy.report_results(results) == ['c', 'e', 'g']
+  assert '1x : ORA-00955' in capsys.readouterr()[0]
+
+
+def test_infp_cache(cfg, monkeypatch, tmp_path):
+  fetched = []
+  def counted_db_info(infp_rest_options, dbname):
+    fetched.append(dbname)
+    return fake_db_info(infp_rest_options, dbname)
+  monkeypatch.setattr(deploy, 'fetch_db_info', counted_db_info)
+  options = deploy.INFP_REST_OPTIONS
+
+  dbinfos = deploy.get_db_infos(options, ['a', 'bb'])
+  assert dbinfos == db_infos(['a', 'bb'])
+  assert deploy.get_db_info(options, 'a') == dbinfos['a']
+  assert fetched == ['a', 'bb']
+
+  deploy.invalidate_db_info(options, ['a'])
+  deploy.get_db_infos(options, ['a', 'bb'])
+  assert fetched == ['a', 'bb', 'a']
+
+  # TTL 0: always fetched, the cache file is left alone
+  monkeypatch.setitem(options, 'cache_ttl', 0)
+  cache = (tmp_path / "infp.json").read_text()
+  deploy.get_db_infos(options, ['a'])
+  deploy.invalidate_db_info(options)
+  assert fetched == ['a', 'bb', 'a', 'a']
+  assert (tmp_path / "infp.json").read_text() == cache
+
+
+def test_check_prod_stale_cache(cfg, monkeypatch):
+  # a database cached as Test, in INFP now Production
+  deploy.get_db_infos(deploy.INFP_REST_OPTIONS, ['a'])
+  def prod_db_info(infp_rest_options, dbname):
+    return dict(fake_db_info(infp_rest_options, dbname), env_status='Production')
+  monkeypatch.setattr(deploy, 'fetch_db_info', prod_db_info)
+  assert deploy.get_db_info(deploy.INFP_REST_OPTIONS, 'a')['env_status'] == 'Test'
+
+  # the production guard ignores the cache entry
+  with pytest.raises(AssertionError):
+    deploy.run_db('a', cfg, True, False)
+  dbinfos = deploy.get_db_infos(deploy.INFP_REST_OPTIONS, ['a'], use_cache=False)
+  assert dbinfos['a']['env_status'] == 'Production'
+  assert not os.path.exists(deploy.get_logfile('deploy.sql', 'a'))
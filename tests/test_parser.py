@@ -0,0 +1,156 @@
+#
+# Tests of the nfsiostat parser of nfsiostat_plotter_v4.py (read_lines()
+# and parse_nfsiostat()) on a small capture with two NFS mounts
+#
+import io
+import os
+import sys
+
+import pytest
+
+numpy = pytest.importorskip("numpy");
+pytest.importorskip("matplotlib");
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))));
+import nfsiostat_plotter_v4 as nfsiostat
+
+header = ("Filesystem:           rMB_nor/s    wMB_nor/s    rMB_dir/s    wMB_dir/s    " +
+          "rMB_svr/s    wMB_svr/s     ops/s    rops/s    wops/s");
+
+capture_text = "\n".join([
+   "Linux 3.10.0-123.el7.x86_64 (testhost) 04/10/2014 _x86_64_ (8 CPU)",
+   "",
+   "04/10/2014 11:59:59 AM",
+   header,
+   "server1:/export/home",
+   "                          1.00  2.00  3.00  4.00  5.00  6.00  7.00  8.00  9.00",
+   "server2:/data",
+   "                          0.50  0.00  0.00  0.00  0.50  0.00  10.00  10.00  0.00",
+   "",
+   "04/10/2014 01:00:00 PM",
+   header,
+   "server1:/export/home",
+   "                          2.00  2.00  3.00  4.00  5.00  6.00  7.00  8.00  9.00",
+   "server2:/data",
+   "                          1.50  0.00  0.00  0.00  0.50  0.00  10.00  10.00  0.00",
+   ""]) + "\n";
+
+
+
+def test_read_lines_chunks():
+   # lines split across chunks come out whole, a last line without a
+   # newline is kept
+   text = "first line\nsecond\n\nlast without newline";
+   for chunk_size in [1, 3, 7, 1048576]:
+      lines = list(nfsiostat.read_lines(io.StringIO(text), chunk_size));
+      assert lines == ["first line", "second", "", "last without newline"];
+   # end for
+
+# end def
+
+
+
+def test_parse_records(monkeypatch):
+   monkeypatch.setattr(nfsiostat, "parse_tokenizer", "python");
+   records = list(nfsiostat.parse_nfsiostat(capture_text.split("\n")));
+   assert [record[0] for record in records] == ["system", "time", "header", "sample", "sample",
+                                               "time", "header", "sample", "sample"];
+
+   system_info = records[0][1];
+   assert system_info["system_name"] == "testhost";
+   assert system_info["kernel"] == "3.10.0-123.el7.x86_64";
+   assert system_info["cores"] == "8";
+
+   # timestamps as captured (see convert_timestamps())
+   assert records[1][1:] == ("04/10/2014", "11:59:59", "AM");
+   assert records[5][1:] == ("04/10/2014", "01:00:00", "PM");
+
+   # several file systems per section
+   assert [record[1] for record in records if record[0] == "sample"] == \
+          ["server1:/export/home", "server2:/data"] * 2;
+   assert records[3][2] == ["1.00", "2.00", "3.00", "4.00", "5.00", "6.00", "7.00", "8.00", "9.00"];
+
+# end def
+
+
+
+def test_parse_blocks(monkeypatch):
+   # the numpy tokenizer gives the data rows in blocks, cut at
+   # parse_block_rows rows and at the end of the input
+   monkeypatch.setattr(nfsiostat, "parse_block_rows", 3);
+   records = list(nfsiostat.parse_nfsiostat(capture_text.split("\n")));
+   assert [record[0] for record in records] == ["system", "time", "header", "time", "header",
+                                               "rows", "rows"];
+   assert records[5][1] == ["server1:/export/home", "server2:/data", "server1:/export/home"];
+   assert records[6][1] == ["server2:/data"];
+   numpy.testing.assert_array_equal(records[5][2][1], [0.5, 0, 0, 0, 0.5, 0, 10, 10, 0]);
+   assert records[6][2].shape == (1, 9);
+
+# end def
+
+
+
+def test_rows_array():
+   rows = ["  1 2 3 4 5 6 7 8 9", "1.5 0 0 0 0 0 0 0 2.5"];
+   values = nfsiostat.rows_array(rows);
+   assert values.shape == (2, 9);
+   numpy.testing.assert_array_equal(values[1], [1.5, 0, 0, 0, 0, 0, 0, 0, 2.5]);
+
+   # extra columns: converted row by row, the first 9 values of each kept
+   values = nfsiostat.rows_array(["1 2 3 4 5 6 7 8 9 10", "1 1 1 1 1 1 1 1 1"]);
+   numpy.testing.assert_array_equal(values[0], numpy.arange(1.0, 10.0));
+   numpy.testing.assert_array_equal(values[1], numpy.ones(9));
+
+   # a short row or a value that is not a number is an error, as with the
+   # python tokenizer
+   for rows in [["1 2 3 4 5 6 7 8", "1 1 1 1 1 1 1 1 1"], ["1 2 3 4 5 6 7 8 x"]]:
+      with pytest.raises(ValueError):
+         nfsiostat.rows_array(rows);
+      # end with
+   # end for
+
+# end def
+
+
+
+@pytest.mark.parametrize("tokenizer", ["numpy", "python"])
+def test_tokenizers_agree(monkeypatch, tokenizer):
+   monkeypatch.setattr(nfsiostat, "parse_block_rows", 3);
+   monkeypatch.setattr(nfsiostat, "parse_tokenizer", tokenizer);
+   capture = nfsiostat.read_nfsiostat(io.StringIO(capture_text));
+   assert capture["rows"] == 4;
+   assert [item["fs"] for item in capture["fs_data_list"]] == ["server1:/export/home",
+                                                               "server2:/data"];
+   numpy.testing.assert_array_equal(capture["fs_index"]["server1:/export/home"]["rMB_nor"],
+                                    [1.0, 2.0]);
+   numpy.testing.assert_array_equal(capture["fs_index"]["server2:/data"]["ops"], [10.0, 10.0]);
+
+# end def
+
+
+
+def test_capture_index():
+   capture = nfsiostat.read_nfsiostat(io.StringIO(capture_text));
+   assert capture["rows"] == 4;
+   assert capture["time_list"] == ["11:59:59", "01:00:00"];
+   assert capture["meridian_list"] == ["AM", "PM"];
+
+   # one store per file system, in order of first appearance, found
+   # through fs_index
+   names = [item["fs"] for item in capture["fs_data_list"]];
+   assert names == ["server1:/export/home", "server2:/data"];
+   for item in capture["fs_data_list"]:
+      assert capture["fs_index"][item["fs"]] is item;
+      assert item["count"] == 2;
+   # end for
+   numpy.testing.assert_array_equal(capture["fs_index"]["server2:/data"]["rMB_nor"], [0.5, 1.5]);
+
+   # a mount that appears later (in another capture) gets its own store
+   more = "\n".join([capture_text.split("\n")[0], "", "04/10/2014 01:00:01 PM", header,
+                     "server3:/scratch",
+                     "   1 1 1 1 1 1 1 1 1", ""]) + "\n";
+   nfsiostat.capture_add(capture, nfsiostat.parse_nfsiostat(more.split("\n")));
+   assert capture["fs_index"]["server3:/scratch"]["count"] == 1;
+   assert capture["fs_data_list"][-1] is capture["fs_index"]["server3:/scratch"];
+
+# end def
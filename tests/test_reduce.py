@@ -0,0 +1,83 @@
+#
+# Tests of the reduction of long series before plotting in
+# nfsiostat_plotter_v4.py (reduce_minmax(), reduce_lttb() and
+# reduce_series())
+#
+import os
+import sys
+
+import pytest
+
+numpy = pytest.importorskip("numpy");
+pytest.importorskip("matplotlib");
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))));
+import nfsiostat_plotter_v4 as nfsiostat
+
+
+
+def series(n):
+   # a noisy series with one short spike and one dip
+   rng = numpy.random.RandomState(1);
+   x = numpy.arange(n, dtype=float);
+   y = 10.0 + rng.uniform(-1.0, 1.0, n);
+   y[n // 3] = 100.0;
+   y[2 * n // 3] = -50.0;
+   return (x, y);
+
+# end def
+
+
+
+def test_minmax_keeps_extremes():
+   (x, y) = series(10001);
+   keep = nfsiostat.reduce_minmax(x, y, 200);
+   assert len(keep) <= 200;
+   assert list(keep) == sorted(keep);
+   # the min and max of every bucket are kept
+   size = -(-len(y) // 100);
+   for start in range(0, len(y), size):
+      bucket = y[start:start+size];
+      assert start + numpy.argmin(bucket) in keep;
+      assert start + numpy.argmax(bucket) in keep;
+   # end for
+
+# end def
+
+
+
+@pytest.mark.parametrize("keep_spikes", [0, 1])
+def test_lttb(keep_spikes):
+   (x, y) = series(5000);
+   keep = nfsiostat.reduce_lttb(x, y, 100, keep_spikes);
+   assert keep[0] == 0;
+   assert keep[-1] == len(y) - 1;
+   assert list(keep) == sorted(set(keep));
+   if (keep_spikes == 0):
+      assert len(keep) == 100;
+   # end if
+   # the spike and the dip form the largest triangles of their buckets
+   assert len(y) // 3 in keep;
+   assert 2 * len(y) // 3 in keep;
+
+# end def
+
+
+
+def test_reduce_series(monkeypatch):
+   (x, y) = series(1000);
+   monkeypatch.setitem(nfsiostat.plot_reduce, "max_points", 0);
+   assert nfsiostat.reduce_series(x, y)[1] is y;
+
+   monkeypatch.setitem(nfsiostat.plot_reduce, "max_points", 50);
+   (xr, yr) = nfsiostat.reduce_series(x, y);
+   assert len(xr) == len(yr) <= 50;
+   assert yr.max() == 100.0;
+   assert yr.min() == -50.0;
+
+   # series shorter than max_points, or with x and y of other lengths,
+   # are plotted as they are
+   assert len(nfsiostat.reduce_series(x[0:40], y[0:40])[1]) == 40;
+   assert len(nfsiostat.reduce_series(x[0:999], y)[1]) == 1000;
+
+# end def
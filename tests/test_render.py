@@ -0,0 +1,119 @@
+#
+# Tests of the figure rendering of nfsiostat_plotter_v4.py (plot_job() and
+# render_plots()) on a small synthetic capture
+#
+import io
+import os
+import sys
+
+import pytest
+
+numpy = pytest.importorskip("numpy");
+pytest.importorskip("matplotlib");
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))));
+import nfsiostat_plotter_v4 as nfsiostat
+
+header = ("Filesystem:           rMB_nor/s    wMB_nor/s    rMB_dir/s    wMB_dir/s    " +
+          "rMB_svr/s    wMB_svr/s     ops/s    rops/s    wops/s");
+
+
+
+def make_capture(nsamples, mounts):
+   #
+   # Returns a capture of nsamples sections with the given mounts
+   #
+   lines = ["Linux 3.10.0-123.el7.x86_64 (testhost) 04/10/2014 _x86_64_ (8 CPU)", ""];
+   for i in range(nsamples):
+      lines.append("04/10/2014 10:%02d:%02d AM" % (i // 60, i % 60));
+      lines.append(header);
+      for (k, fs) in enumerate(mounts):
+         lines.append(fs);
+         lines.append("   " + " ".join(["%.2f" % ((i*(k+1) + j) % 17) for j in range(9)]));
+      # end for
+      lines.append("");
+   # end for
+   return nfsiostat.read_nfsiostat(io.StringIO("\n".join(lines) + "\n"));
+
+# end def
+
+
+
+def plot_setup(capture, combined_plots, dirname):
+   #
+   # Returns (jobs, data) for render_plots() without iostat data, as the
+   # main section builds them
+   #
+   fs_data_list = capture["fs_data_list"];
+   jobs = [];
+   iplot = 0;
+   names = ["plot1a", "plot2a", "plot3a", "plot4"];
+   if (combined_plots == 0):
+      for ifs in range(len(fs_data_list)):
+         for name in names:
+            iplot = iplot + 1;
+            jobs.append( ("", name, ifs, iplot, ifs) );
+         # end for
+      # end for
+   else:
+      for name in names:
+         iplot = iplot + 1;
+         jobs.append( ("", name, 1, iplot, len(fs_data_list)-1) );
+      # end for
+   # end if
+   data = {};
+   data["combined_plots"] = combined_plots;
+   data["dirname"] = dirname;
+   data["x_seconds"] = numpy.arange(len(capture["time_list"]), dtype=float);
+   data["fs_data_list"] = fs_data_list;
+   data["line_list"] = ["bo-", "g^--", "rs-.", "c*-"];
+   data["figure_timing_hook"] = None;
+   data["plot_reduce"] = nfsiostat.plot_reduce;
+   return (jobs, data);
+
+# end def
+
+
+
+@pytest.mark.parametrize("combined_plots", [0, 1])
+def test_render_pool_same_as_serial(tmp_path, combined_plots):
+   capture = make_capture(30, ["server1:/export/home", "server2:/data"]);
+   results = {};
+   for workers in [1, 2]:
+      dirname = str(tmp_path / ("w%d" % workers));
+      os.mkdir(dirname);
+      (jobs, data) = plot_setup(capture, combined_plots, dirname);
+      results[workers] = nfsiostat.render_plots(jobs, data, workers);
+      # one image per figure, in the order of jobs
+      assert len(results[workers]) == len(jobs);
+      for (image, fragment) in results[workers]:
+         assert os.path.getsize(image) > 0;
+         assert os.path.basename(image) in fragment;
+      # end for
+   # end for
+   assert [fragment for (image, fragment) in results[1]] == \
+          [fragment for (image, fragment) in results[2]];
+   assert [os.path.basename(image) for (image, fragment) in results[1]] == \
+          [os.path.basename(image) for (image, fragment) in results[2]];
+
+# end def
+
+
+
+def test_combined_figures_timed(tmp_path, monkeypatch):
+   # the combined plots are built on their own Figure, not through pyplot,
+   # and each one is reported to figure_timing_hook
+   plt = pytest.importorskip("matplotlib.pyplot");
+   plt.close("all");
+   timings = [];
+   monkeypatch.setattr(nfsiostat, "figure_timing_hook",
+                       lambda filename, seconds: timings.append(filename));
+   capture = make_capture(10, ["server1:/export/home", "server2:/data", "server3:/scratch"]);
+   (jobs, data) = plot_setup(capture, 1, str(tmp_path));
+   results = nfsiostat.render_plots(jobs, data, 1);
+   assert len(timings) == len(jobs);
+   assert [os.path.basename(image) for (image, fragment) in results] == \
+          [os.path.basename(filename) + ".png" for filename in timings];
+   assert plt.get_fignums() == [];
+
+# end def
@@ -0,0 +1,78 @@
+#
+# Tests of the figure sections cached in HTML_REPORT/sections by
+# render_report() of nfsiostat_plotter_v4.py
+#
+import io
+import os
+import sys
+
+import pytest
+
+numpy = pytest.importorskip("numpy");
+pytest.importorskip("matplotlib");
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))));
+import nfsiostat_plotter_v4 as nfsiostat
+
+header = ("Filesystem:           rMB_nor/s    wMB_nor/s    rMB_dir/s    wMB_dir/s    " +
+          "rMB_svr/s    wMB_svr/s     ops/s    rops/s    wops/s");
+
+
+
+def make_capture(nsamples, mounts):
+   lines = ["Linux 3.10.0-123.el7.x86_64 (testhost) 04/10/2014 _x86_64_ (8 CPU)", ""];
+   for i in range(nsamples):
+      lines.append("04/10/2014 10:%02d:%02d AM" % (i // 60, i % 60));
+      lines.append(header);
+      for (k, fs) in enumerate(mounts):
+         lines.append(fs);
+         lines.append("   " + " ".join(["%.2f" % ((i*(k+1) + j) % 17) for j in range(9)]));
+      # end for
+      lines.append("");
+   # end for
+   capture = nfsiostat.read_nfsiostat(io.StringIO("\n".join(lines) + "\n"));
+   nfsiostat.capture_timestamps(capture);
+   return capture;
+
+# end def
+
+
+
+def test_sections_reused(tmp_path, monkeypatch):
+   timings = [];
+   monkeypatch.setattr(nfsiostat, "figure_timing_hook",
+                       lambda filename, seconds: timings.append(os.path.basename(filename)));
+   dirname = str(tmp_path / "HTML_REPORT");
+   os.makedirs(dirname);
+
+   def render(capture):
+      del timings[:];
+      x_seconds = capture["timestamps"] - capture["timestamps"][0];
+      nfsiostat.render_report("capture.out", capture, x_seconds, None, 0, dirname, 1);
+      return sorted(timings);
+   # end def
+
+   capture = make_capture(20, ["server1:/a", "server2:/b"]);
+   assert len(render(capture)) == 8;
+   report = open(os.path.join(dirname, "report.html")).read();
+   names = os.listdir(os.path.join(dirname, "sections"));
+   assert len([name for name in names if name.endswith(".html")]) == 8;
+   assert len([name for name in names if name.endswith(".image")]) == 8;
+
+   # nothing changed: every section is reused, the report is the same
+   assert render(capture) == [];
+   assert open(os.path.join(dirname, "report.html")).read() == report;
+
+   # an image written since (e.g. by follow mode) is drawn again
+   image = sorted(name for name in os.listdir(dirname) if name.endswith(".png"))[0];
+   st = os.stat(os.path.join(dirname, image));
+   os.utime(os.path.join(dirname, image), (st.st_atime, st.st_mtime + 10));
+   assert render(capture) == [image[:-len(".png")]];
+
+   # new data for one mount redraws only its figures; old sections go
+   capture = make_capture(20, ["server1:/a", "server2:/b"]);
+   capture["fs_data_list"][1]["data"][:, 3] = 99.0;
+   assert len(render(capture)) == 4;
+   assert len(os.listdir(os.path.join(dirname, "sections"))) == 16;
+
+# end def
@@ -0,0 +1,113 @@
+#
+# Tests of the summary statistics of nfsiostat_plotter_v4.py (stats_add(),
+# stats_merge(), stats_quantile() and summarize_capture())
+#
+import os
+import sys
+
+import pytest
+
+numpy = pytest.importorskip("numpy");
+pytest.importorskip("matplotlib");
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))));
+import nfsiostat_plotter_v4 as nfsiostat
+
+
+
+def sample(n, seed):
+   # lognormal values with some zeros, as in an idle mount
+   rng = numpy.random.RandomState(seed);
+   values = rng.lognormal(1.0, 2.0, n);
+   values[rng.uniform(size=n) < 0.1] = 0.0;
+   return values;
+
+# end def
+
+
+
+def test_merge_matches_single_pass():
+   values = sample(10000, 1);
+   dt = numpy.full(len(values), 2.0);
+   whole = nfsiostat.stats_add(nfsiostat.stats_new(), values, dt);
+
+   # chunks of uneven size, merged pairwise as chunks, mounts or hosts are
+   parts = [];
+   for (start, stop) in [(0, 1), (1, 1000), (1000, 1000), (1000, 6543), (6543, 10000)]:
+      parts.append(nfsiostat.stats_add(nfsiostat.stats_new(), values[start:stop], dt[start:stop]));
+   # end for
+   merged = nfsiostat.stats_merge(nfsiostat.stats_merge(parts[0], parts[1]),
+                                  nfsiostat.stats_merge(parts[2],
+                                                        nfsiostat.stats_merge(parts[3], parts[4])));
+   for stats in [whole, merged]:
+      assert stats["count"] == len(values);
+      assert stats["min"] == values.min();
+      assert stats["max"] == values.max();
+      assert stats["mean"] == pytest.approx(values.mean(), rel=1e-12);
+      assert stats["total"] == pytest.approx(2.0 * values.sum(), rel=1e-12);
+      assert stats["zero"] == numpy.count_nonzero(values == 0.0);
+      result = nfsiostat.stats_result(stats);
+      assert result["std"] == pytest.approx(values.std(), rel=1e-9);
+   # end for
+   assert merged["bins"] == whole["bins"];
+
+# end def
+
+
+
+@pytest.mark.parametrize("q", [0.0, 0.05, 0.1, 0.5, 0.95, 0.99, 1.0])
+def test_quantile_accuracy(q):
+   values = numpy.concatenate( (sample(50000, 2), sample(50000, 3)) );
+   stats = nfsiostat.stats_merge(nfsiostat.stats_add(nfsiostat.stats_new(), values[0:50000],
+                                                     numpy.ones(50000)),
+                                 nfsiostat.stats_add(nfsiostat.stats_new(), values[50000:],
+                                                     numpy.ones(50000)));
+   exact = numpy.sort(values)[int(numpy.floor(q * (len(values) - 1)))];
+   estimate = nfsiostat.stats_quantile(stats, q);
+   assert abs(estimate - exact) <= nfsiostat.sketch_accuracy * exact;
+
+# end def
+
+
+
+def test_empty():
+   stats = nfsiostat.stats_add(nfsiostat.stats_new(), numpy.zeros(0), numpy.zeros(0));
+   assert stats["count"] == 0;
+   assert numpy.isnan(nfsiostat.stats_quantile(stats, 0.5));
+   assert nfsiostat.stats_result(stats)["std"] == 0.0;
+
+# end def
+
+
+
+def test_summarize_capture():
+   capture = nfsiostat.capture_new();
+   capture["timestamps"] = 1000.0 + 2.0 * numpy.arange(500);
+   item = nfsiostat.fs_new("server1:/a");
+   values = sample(500, 4);
+   for i in range(500):
+      nfsiostat.fs_append(item, ["%.17g" % values[i]] * 9);
+   # end for
+   capture["fs_data_list"] = [item];
+
+   # the same statistics whatever the chunk size
+   summary = nfsiostat.summarize_capture(capture, top_n=3, chunk_size=64);
+   single = nfsiostat.summarize_capture(capture, top_n=3);
+   assert summary["fs"] == ["server1:/a"];
+   for name in nfsiostat.fs_fields:
+      a = nfsiostat.stats_result(summary["stats"]["server1:/a"][name]);
+      b = nfsiostat.stats_result(single["stats"]["server1:/a"][name]);
+      for key in a:
+         assert a[key] == pytest.approx(b[key], rel=1e-9);
+      # end for
+   # end for
+   # MB moved = MB/s times the 2 s interval
+   assert summary["stats"]["server1:/a"]["rMB_svr"]["total"] == pytest.approx(2.0 * values.sum());
+
+   # the busiest intervals, busiest first
+   busiest = numpy.argsort(-values, kind="mergesort")[0:3];
+   assert [row[0] for row in summary["top"]["server1:/a"]] == \
+          [1000.0 + 2.0 * i for i in busiest];
+   assert summary["top"]["server1:/a"][0][1] == pytest.approx(2.0 * values.max());
+
+# end def
@@ -0,0 +1,41 @@
+#
+# Tests of the columnar file system store of nfsiostat_plotter_v4.py
+# (fs_new(), fs_append() and fs_views())
+#
+import os
+import sys
+
+import pytest
+
+numpy = pytest.importorskip("numpy");
+pytest.importorskip("matplotlib");
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))));
+import nfsiostat_plotter_v4 as nfsiostat
+
+
+
+def row(i):
+   # data row i: series k has the value 10*i + k
+   return ["%d" % (10*i + k) for k in range(len(nfsiostat.fs_fields))];
+
+# end def
+
+
+
+def test_store_grows():
+   item = nfsiostat.fs_new("server1:/export/home", capacity=2);
+   for i in range(5):
+      nfsiostat.fs_append(item, row(i));
+   # end for
+   assert item["count"] == 5;
+   assert item["data"].shape == (len(nfsiostat.fs_fields), 8);   # 2 -> 4 -> 8
+
+   # the named series are views of the filled part
+   nfsiostat.fs_views(item);
+   numpy.testing.assert_array_equal(item["rMB_nor"], [0.0, 10.0, 20.0, 30.0, 40.0]);
+   numpy.testing.assert_array_equal(item["wops"], [8.0, 18.0, 28.0, 38.0, 48.0]);
+   assert item["wops"].base is not None;
+
+# end def
+
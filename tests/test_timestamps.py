@@ -0,0 +1,58 @@
+#
+# Tests of the timestamp conversion of nfsiostat_plotter_v4.py
+# (convert_timestamps())
+#
+import os
+import sys
+import time
+
+import pytest
+
+numpy = pytest.importorskip("numpy");
+pytest.importorskip("matplotlib");
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))));
+import nfsiostat_plotter_v4 as nfsiostat
+
+
+
+def mktime(year, month, day, hour, minute, second):
+   return time.mktime( (year, month, day, hour, minute, second, 0, 0, -1) );
+
+# end def
+
+
+
+def test_12_hour_clock():
+   dates = ["04/10/2014"] * 5;
+   times = ["12:00:05", "01:30:00", "11:59:59", "12:00:00", "01:00:00"];
+   meridians = ["AM", "AM", "AM", "PM", "PM"];
+   seconds = nfsiostat.convert_timestamps(dates, times, meridians);
+   expected = [mktime(2014, 4, 10, 0, 0, 5),          # 12 AM is hour 0
+               mktime(2014, 4, 10, 1, 30, 0),
+               mktime(2014, 4, 10, 11, 59, 59),
+               mktime(2014, 4, 10, 12, 0, 0),         # 12 PM is noon
+               mktime(2014, 4, 10, 13, 0, 0)];
+   numpy.testing.assert_array_equal(seconds, expected);
+
+# end def
+
+
+
+def test_24_hour_clock_and_dates():
+   # no meridian, dates with spaces, a day change and times that are not
+   # fixed width
+   dates = ["12 31 2013", "12 31 2013", "01 01 2014"];
+   times = ["23:59:58", "23:59:59", "0:00:01"];
+   seconds = nfsiostat.convert_timestamps(dates, times, None);
+   numpy.testing.assert_array_equal(seconds - seconds[0], [0.0, 1.0, 3.0]);
+   assert seconds[2] == mktime(2014, 1, 1, 0, 0, 1);
+
+# end def
+
+
+
+def test_empty():
+   assert len(nfsiostat.convert_timestamps([], [], [])) == 0;
+
+# end def